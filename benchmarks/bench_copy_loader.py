@@ -0,0 +1,57 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Micro-benchmark of the client side of a DB write. Compares turning a batch of one-minute
+quotes into the dictionaries 'bulk_insert_mappings' needs against encoding it as a COPY
+payload, in CSV and in binary format. The server side can only be measured against a live DB.
+
+Run it with: python -m benchmarks.bench_copy_loader
+"""
+import copy
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import MetaData, Table
+
+from benchmarks.bench_json_parser import best_of
+from database.copy_loader import encode_binary, encode_csv
+from utils.dafault_columns import default_minutes
+
+
+def make_quotes(n_rows: int) -> pd.DataFrame:
+    """Build a one-minute quotes batch as StockExtractor returns it."""
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2023-01-02 09:30", periods=n_rows, freq="min", tz="America/New_York")
+    prices = rng.uniform(100, 200, size=(n_rows, 4))
+    _time = datetime.now()
+    return pd.DataFrame(
+        {
+            "open": prices[:, 0],
+            "high": prices[:, 1],
+            "low": prices[:, 2],
+            "close": prices[:, 3],
+            "volume": rng.integers(1, 10_000, size=n_rows).astype(float),
+            "timestamp": _time,
+            "timestamp_day": _time.strftime("%Y-%m-%d"),
+            "datetime": index,
+            "symbol": "AAPL",
+        },
+        index=index,
+    )
+
+
+def main() -> None:
+    table = Table("aapl_1min", MetaData(), *copy.deepcopy(default_minutes), schema="onemin_quotes")
+    columns = list(table.columns)
+    for n_rows in [10_000, 100_000, 1_000_000]:
+        df = make_quotes(n_rows)
+        records_time = best_of(lambda: df.to_dict(orient="records"), repeat=3)
+        csv_time = best_of(lambda: encode_csv(df, columns), repeat=3)
+        binary_time = best_of(lambda: encode_binary(df, columns, session_timezone="UTC"), repeat=3)
+        print(f"{n_rows:>9} rows | records {records_time * 1000:9.1f} ms | csv {csv_time * 1000:9.1f} ms "\
+              f"| binary {binary_time * 1000:9.1f} ms | speedup x{records_time / binary_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+End-to-end load benchmark of the storage path: per-symbol tables are created, one-minute quotes
+of many symbols are written through the pool of DB writers, and read back with 'load_quotes'.
+It runs against the DB in STOCKS_DATABASE_URL, and against an embedded SQLite file in a
+temporary directory when it is not set, so no DB server nor credentials are needed.
+
+Run it with: python -m benchmarks.bench_ingestion [--symbols 50] [--rows 20000] [--writers 4]
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+# The DB is picked when 'database.connection' is imported, so the URL must be set before
+os.environ.setdefault("STOCKS_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench_ingestion_')}/stocks.db")
+
+from benchmarks.bench_copy_loader import make_quotes
+from database.connection import backend, database_url
+from database.db_writer import DBWriterService
+from database.quote_reader import get_quote_cache
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_minutes
+
+
+def run(n_symbols: int, n_rows: int, n_writers: int) -> None:
+    utils_db = UtilsDB()
+    symbols = [f"BENCH{n:04d}" for n in range(n_symbols)]
+    quotes = make_quotes(n_rows)
+
+    start = time.perf_counter()
+    # deepcopy is needed so that no column is affected by previous tables
+    models = {symbol: utils_db.create_specific_model(class_name=f"{symbol}_1min", model_name=f"{symbol}_1min",
+                                                     schema_name="onemin_quotes",
+                                                     column_data=copy.deepcopy(default_minutes), check_exists=False)
+              for symbol in symbols}
+    created = utils_db.create_missing_models(list(models.values()))
+    create_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with DBWriterService(n_writers=n_writers) as writers:
+        for symbol in symbols:
+            writers.insert_df(quotes.assign(symbol=symbol), models[symbol])
+    write_time = time.perf_counter() - start
+
+    get_quote_cache().clear()
+    start = time.perf_counter()
+    loaded = utils_db.load_quotes(symbols, "1min", storage_layout="per_symbol", use_cache=False)
+    read_time = time.perf_counter() - start
+
+    total = n_symbols * n_rows
+    print(f"{backend.name} backend at {database_url()}")
+    print(f"create {created:>6} tables | {create_time * 1000:9.1f} ms")
+    print(f"write  {writers.counts['inserted']:>9} rows | {write_time:7.2f} s | {total / write_time:12,.0f} rows/s "\
+          f"| {n_writers} writers")
+    print(f"read   {len(loaded):>9} rows | {read_time:7.2f} s | {len(loaded) / read_time:12,.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load benchmark of quote ingestion into the DB.")
+    parser.add_argument("--symbols", type=int, default=50, help="Number of symbols, one table each.")
+    parser.add_argument("--rows", type=int, default=20_000, help="One-minute quotes per symbol.")
+    parser.add_argument("--writers", type=int, default=4, help="Number of concurrent DB writers.")
+    args = parser.parse_args()
+    run(args.symbols, args.rows, args.writers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Micro-benchmark of the AlphaVantage JSON to DataFrame conversion. Compares the former
+'pd.DataFrame(json).T' path against the columnar parser on a synthetic intraday payload.
+
+Run it with: python -m benchmarks.bench_json_parser
+"""
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from src.data_extractor.json_parser import parse_time_series
+
+
+def make_payload(n_rows: int) -> dict:
+    """Build an 'outputsize=full' like intraday payload, in descending datetime order."""
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2023-01-02 04:00", periods=n_rows, freq="min")[::-1]
+    prices = rng.uniform(100, 200, size=(n_rows, 4))
+    volumes = rng.integers(1, 10_000, size=n_rows)
+    return {
+        str(ts): {
+            "1. open": f"{row[0]:.4f}",
+            "2. high": f"{row[1]:.4f}",
+            "3. low": f"{row[2]:.4f}",
+            "4. close": f"{row[3]:.4f}",
+            "5. volume": str(volume),
+        }
+        for ts, row, volume in zip(index, prices, volumes)
+    }
+
+
+def legacy_transform(json_data: dict, start_date: str, end_date: str) -> pd.DataFrame:
+    """Conversion used by the extractors before the columnar parser."""
+    df = pd.DataFrame(json_data).T.sort_index()
+    df.index = pd.to_datetime(df.index)
+    df = df.apply(pd.to_numeric, errors="coerce")
+    df = df[df.index >= pd.to_datetime(f"{start_date} 00:00:00")]
+    df = df[df.index <= pd.to_datetime(f"{end_date} 23:59:59")]
+    return df
+
+
+def best_of(func: Callable, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    for n_rows in [1_000, 20_000, 100_000]:
+        payload = make_payload(n_rows)
+        start_date, end_date = "2023-01-01", "2030-01-01"
+        legacy = legacy_transform(payload, start_date, end_date)
+        columnar = parse_time_series(payload, start_date, end_date, sort=True)
+        pd.testing.assert_frame_equal(legacy, columnar, check_freq=False)
+        legacy_time = best_of(lambda: legacy_transform(payload, start_date, end_date))
+        columnar_time = best_of(lambda: parse_time_series(payload, start_date, end_date, sort=True))
+        print(f"{n_rows:>8} rows | legacy {legacy_time * 1000:9.1f} ms | columnar {columnar_time * 1000:9.1f} ms "\
+              f"| speedup x{legacy_time / columnar_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Micro-benchmark of building the rolling-window datasets of the predictive models. Compares
+stacking every window with np.vstack in a Python loop, as the datasets were built before,
+against the strided views of 'utils.windowing', and against copying those views into a
+contiguous array, as a model does once when it takes them as input.
+
+Run it with: python -m benchmarks.bench_windowing
+"""
+import numpy as np
+
+from benchmarks.bench_json_parser import best_of
+from utils.windowing import supervised_windows
+
+ROLLING_WINDOW = 60
+# Beyond this size the loop takes minutes, so it is timed on a prefix and extrapolated quadratically
+MAX_LOOP_ROWS = 20_000
+
+
+def vstack_windows(values: np.ndarray, window: int) -> np.ndarray:
+    x = np.empty((0, window))
+    for i in range(window, len(values)):
+        x = np.vstack((x, values[i - window : i, 0]))
+    return np.reshape(x, (x.shape[0], x.shape[1], 1))
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    for n_rows in [10_000, 100_000, 1_000_000]:
+        values = rng.uniform(size=(n_rows, 1))
+        loop_rows = min(n_rows, MAX_LOOP_ROWS)
+        loop_time = best_of(lambda: vstack_windows(values[:loop_rows], ROLLING_WINDOW), repeat=1)
+        loop_time *= (n_rows / loop_rows) ** 2
+        view_time = best_of(lambda: supervised_windows(values, ROLLING_WINDOW), repeat=5)
+        copy_time = best_of(lambda: np.ascontiguousarray(supervised_windows(values, ROLLING_WINDOW)[0]), repeat=3)
+        estimated = " (estimated)" if loop_rows < n_rows else ""
+        print(f"{n_rows:>9} rows | vstack loop {loop_time * 1000:12.1f} ms{estimated:12} "\
+              f"| strided view {view_time * 1000:7.3f} ms | copied {copy_time * 1000:8.1f} ms "\
+              f"| speedup x{loop_time / copy_time:,.0f} with the copy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Tunable settings for the ingestion pipeline. Every value can be overridden through an
+environment variable, in the same way LOGS_PATH is handed to the logger.
+"""
+import os
+
+# Number of symbols fetched concurrently by the ingestion pipeline
+MAX_WORKERS = int(os.environ.get("STOCKS_MAX_WORKERS", 8))
+
+# Number of tickers downloaded together in a single yfinance request
+BATCH_SIZE = int(os.environ.get("STOCKS_BATCH_SIZE", 50))
+
+# Maximum number of symbols fetched but not yet written to the DB
+MAX_IN_FLIGHT_SYMBOLS = int(os.environ.get("STOCKS_MAX_IN_FLIGHT_SYMBOLS", 200))
+
+# Only fetch quotes more recent than the latest ones already stored in each table
+INCREMENTAL = os.environ.get("STOCKS_INCREMENTAL", "1").lower() in ("1", "true", "yes")
+
+# Directory where local caches are kept between runs
+CACHE_PATH = os.environ.get("STOCKS_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache"))
+
+# Days an industry/sector entry remains valid, and workers used to resolve cache misses
+ENRICHMENT_TTL_DAYS = int(os.environ.get("STOCKS_ENRICHMENT_TTL_DAYS", 30))
+ENRICHMENT_WORKERS = int(os.environ.get("STOCKS_ENRICHMENT_WORKERS", 8))
+
+# AlphaVantage quota and HTTP connection pool shared by every extractor
+ALPHAVANTAGE_CALLS_PER_MINUTE = float(os.environ.get("ALPHAVANTAGE_CALLS_PER_MINUTE", 5))
+ALPHAVANTAGE_MAX_RETRIES = int(os.environ.get("ALPHAVANTAGE_MAX_RETRIES", 3))
+ALPHAVANTAGE_BACKOFF_SECONDS = float(os.environ.get("ALPHAVANTAGE_BACKOFF_SECONDS", 20))
+HTTP_POOL_SIZE = int(os.environ.get("STOCKS_HTTP_POOL_SIZE", 16))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("STOCKS_HTTP_TIMEOUT_SECONDS", 30))
+
+# Response cache for extractors: "off", "on" (read and write) or "replay" (cached responses only)
+RESPONSE_CACHE_MODE = os.environ.get("STOCKS_RESPONSE_CACHE", "off").lower()
+INTRADAY_CACHE_TTL_SECONDS = float(os.environ.get("STOCKS_INTRADAY_CACHE_TTL_SECONDS", 300))
+DAILY_CACHE_TTL_SECONDS = float(os.environ.get("STOCKS_DAILY_CACHE_TTL_SECONDS", 3600))
+
+# Maximum number of requests in flight for the asyncio extractors
+ASYNC_MAX_IN_FLIGHT = int(os.environ.get("STOCKS_ASYNC_MAX_IN_FLIGHT", 16))
+
+# Adaptive concurrency: calls to throttled upstreams start at AIMD_INITIAL_CONCURRENCY and grow by
+# one slot per window of successful calls, up to the worker count. Throttling halves the window.
+AIMD_INITIAL_CONCURRENCY = int(os.environ.get("STOCKS_AIMD_INITIAL_CONCURRENCY", 2))
+AIMD_DECREASE_FACTOR = float(os.environ.get("STOCKS_AIMD_DECREASE_FACTOR", 0.5))
+
+# Retries of throttled or failed upstream calls, with exponential backoff and jitter
+UPSTREAM_MAX_RETRIES = int(os.environ.get("STOCKS_UPSTREAM_MAX_RETRIES", 3))
+UPSTREAM_BACKOFF_SECONDS = float(os.environ.get("STOCKS_UPSTREAM_BACKOFF_SECONDS", 2))
+UPSTREAM_MAX_BACKOFF_SECONDS = float(os.environ.get("STOCKS_UPSTREAM_MAX_BACKOFF_SECONDS", 60))
+
+# Per-host circuit breaker: consecutive failures that open it, and seconds before a probe call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("STOCKS_CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("STOCKS_CIRCUIT_RESET_SECONDS", 60))
+
+# How quotes are written to the DB: "copy" (COPY FROM STDIN) or "orm" (executemany INSERT),
+# and the COPY payload format: "csv" or "binary"
+DB_WRITE_METHOD = os.environ.get("STOCKS_DB_WRITE_METHOD", "copy").lower()
+DB_COPY_FORMAT = os.environ.get("STOCKS_DB_COPY_FORMAT", "binary").lower()
+
+# Rows whose primary key is already stored are skipped ("ignore") or overwrite the stored ones ("update").
+# "none" inserts plainly, and a batch holding any stored key is then skipped as a whole
+DB_ON_CONFLICT = os.environ.get("STOCKS_DB_ON_CONFLICT", "ignore").lower()
+
+# Layout of the quote tables: "per_symbol" (one daily and one minute table per symbol) or
+# "partitioned" (one table per interval, range-partitioned by datetime)
+STORAGE_LAYOUT = os.environ.get("STOCKS_STORAGE_LAYOUT", "per_symbol").lower()
+# Number of hash sub-partitions by symbol of every time range. 0 disables sub-partitioning
+PARTITION_HASH_MODULUS = int(os.environ.get("STOCKS_PARTITION_HASH_MODULUS", 0))
+
+# URL of the DB, e.g. "sqlite:////tmp/stocks/stocks.db" for the embedded backend. If empty, the
+# PostgreSQL server in keys/postgres_keys.yaml is used
+DATABASE_URL = os.environ.get("STOCKS_DATABASE_URL", "")
+
+# Connection pool of the DB engine, and number of concurrent DB writers. Every writer holds at most
+# one connection, so DB_WRITERS should stay below DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.environ.get("STOCKS_DB_POOL_SIZE", 8))
+DB_MAX_OVERFLOW = int(os.environ.get("STOCKS_DB_MAX_OVERFLOW", 4))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("STOCKS_DB_POOL_TIMEOUT_SECONDS", 30))
+DB_WRITERS = int(os.environ.get("STOCKS_DB_WRITERS", 4))
+# Batches waiting for every writer. Producers block once a writer's queue is full
+DB_WRITER_QUEUE_SIZE = int(os.environ.get("STOCKS_DB_WRITER_QUEUE_SIZE", 8))
+
+# Maximum number of rows kept in memory by the cache of quotes loaded from the DB
+QUOTE_CACHE_MAX_ROWS = int(os.environ.get("STOCKS_QUOTE_CACHE_MAX_ROWS", 5_000_000))
+
+# Local Parquet copy of the stored quotes, written after every insert when enabled (requires pyarrow)
+PARQUET_MIRROR = os.environ.get("STOCKS_PARQUET_MIRROR", "0").lower() in ("1", "true", "yes")
+PARQUET_PATH = os.environ.get("STOCKS_PARQUET_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "parquet"))
+PARQUET_COMPRESSION = os.environ.get("STOCKS_PARQUET_COMPRESSION", "zstd").lower()
+# Partitions of the Parquet mirror holding at least this many files are compacted at the end of every run
+PARQUET_COMPACT_MIN_FILES = int(os.environ.get("STOCKS_PARQUET_COMPACT_MIN_FILES", 32))
+
+# Coarser bars rolled up from the one-minute quotes after every insert. Empty disables rollups
+ROLLUP_RESOLUTIONS = [resolution.strip() for resolution in
+                      os.environ.get("STOCKS_ROLLUP_RESOLUTIONS", "5min,15min,1h,1d").split(",") if resolution.strip()]
+
+# One-minute quotes older than this many days are moved from the DB into compressed Parquet archive
+# files at the end of every run. 0 keeps every quote in the DB
+INTRADAY_RETENTION_DAYS = int(os.environ.get("STOCKS_INTRADAY_RETENTION_DAYS", 0))
+ARCHIVE_PATH = os.environ.get("STOCKS_ARCHIVE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "archive"))
+
+# Write-ahead spool: fetched quotes are appended to compressed segment files on local disk, and
+# drainers replay them into the DB with retries, so a slow or unavailable DB never loses them
+SPOOL = os.environ.get("STOCKS_SPOOL", "0").lower() in ("1", "true", "yes")
+SPOOL_PATH = os.environ.get("STOCKS_SPOOL_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "spool"))
+# A segment is sealed, and can be drained, once it reaches this size or age
+SPOOL_SEGMENT_BYTES = int(os.environ.get("STOCKS_SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024))
+SPOOL_SEGMENT_SECONDS = float(os.environ.get("STOCKS_SPOOL_SEGMENT_SECONDS", 5))
+SPOOL_DRAINERS = int(os.environ.get("STOCKS_SPOOL_DRAINERS", 2))
@@ -0,0 +1,188 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Storage backends of the quote store. A backend holds what depends on the DB engine in use:
+how the engine is created, how schemas and existing tables are looked up, and how conflicting
+rows are resolved on insert. PostgreSQL is the production backend. SQLite is an embedded stand-in
+that needs no server nor credentials, for local runs, tests and benchmarks; every schema is an
+attached database file next to the main one.
+
+The backend is picked from the scheme of the DB URL, e.g.:
+    STOCKS_DATABASE_URL=sqlite:////tmp/stocks/stocks.db
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Type
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import DateTime
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import make_url
+
+from config.log_config import logger
+from config.pipeline_config import DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS
+from database.copy_loader import CONFLICT_POLICIES, conflict_insert
+
+
+class StorageBackend(ABC):
+    """Operations of the quote store that differ between DB engines."""
+
+    name = ""
+    # Whether quotes can be streamed with COPY FROM STDIN, see 'database.copy_loader'
+    supports_copy = False
+    # Whether tables can be partitioned by time range, see 'database.partitioning'
+    supports_partitioning = False
+
+    @abstractmethod
+    def create_engine(self, url: str) -> sqlalchemy.Engine:
+        """Engine of the DB at {url}."""
+
+    @abstractmethod
+    def create_schema(self, connection: sqlalchemy.Connection, schema_name: str) -> None:
+        """Create a schema, if missing."""
+
+    def ensure_schemas(self, connection: sqlalchemy.Connection, schemas: Iterable[str]) -> None:
+        """Make {schemas} usable on {connection} before their tables are looked up or created."""
+
+    @abstractmethod
+    def list_tables(self, connection: sqlalchemy.Connection, schemas: List[str]) -> List[Tuple[str, str]]:
+        """Schema and name of every existing table of {schemas}."""
+
+    def prepare_frame(self, df: pd.DataFrame, columns: List[sqlalchemy.Column]) -> pd.DataFrame:
+        """Convert the values of {df} that the DB driver would not take for {columns}."""
+        return df
+
+    @abstractmethod
+    def conflict_insert(self, table: sqlalchemy.Table, columns: List[sqlalchemy.Column],
+                        on_conflict: str) -> sqlalchemy.Insert:
+        """INSERT that resolves primary-key conflicts with {on_conflict} and returns one 'inserted' flag per
+           written row. See 'database.copy_loader.conflict_insert'."""
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL server, reached through psycopg2 with a connection pool sized for the DB writers."""
+
+    name = "postgresql"
+    supports_copy = True
+    supports_partitioning = True
+
+    def create_engine(self, url: str) -> sqlalchemy.Engine:
+        # The pool is sized for the concurrent DB writers; pre-ping discards connections dropped by the server
+        return sqlalchemy.create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                        pool_timeout=DB_POOL_TIMEOUT_SECONDS, pool_pre_ping=True)
+
+    def create_schema(self, connection: sqlalchemy.Connection, schema_name: str) -> None:
+        connection.execute(sqlalchemy.schema.CreateSchema(schema_name, if_not_exists=True))
+
+    def list_tables(self, connection: sqlalchemy.Connection, schemas: List[str]) -> List[Tuple[str, str]]:
+        query = sqlalchemy.text("SELECT schemaname, tablename FROM pg_catalog.pg_tables "\
+                                "WHERE schemaname IN :schemas").bindparams(sqlalchemy.bindparam("schemas", expanding=True))
+        return connection.execute(query, {"schemas": schemas}).all()
+
+    def conflict_insert(self, table: sqlalchemy.Table, columns: List[sqlalchemy.Column],
+                        on_conflict: str) -> sqlalchemy.Insert:
+        return conflict_insert(table, columns, on_conflict)
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite file. Schemas are attached databases, '<db name>.<schema>.db' next to the main file
+       (in memory for in-memory DBs), attached to every pooled connection as they are created.
+    """
+
+    name = "sqlite"
+
+    def __init__(self) -> None:
+        self.directory: Optional[Path] = None
+        self.stem = ""
+        self.schemas: Set[str] = set()
+
+    def create_engine(self, url: str) -> sqlalchemy.Engine:
+        database = make_url(url).database
+        if database and database != ":memory:":
+            path = Path(database)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.directory, self.stem = path.parent, path.stem
+            # Several writers share the file, so they wait for each other's locks instead of failing
+            engine = sqlalchemy.create_engine(url, connect_args={"timeout": DB_POOL_TIMEOUT_SECONDS,
+                                                                 "check_same_thread": False})
+        else:
+            # Every connection of an in-memory DB would see a DB of its own, so a single one is shared
+            engine = sqlalchemy.create_engine(url, connect_args={"check_same_thread": False},
+                                              poolclass=sqlalchemy.pool.StaticPool)
+        sqlalchemy.event.listen(engine, "checkout", self._attach_schemas)
+        return engine
+
+    def _schema_file(self, schema_name: str) -> str:
+        if self.directory is None:
+            return ":memory:"
+        return str(self.directory / f"{self.stem}.{schema_name}.db")
+
+    def _attach(self, dbapi_connection, attached: Set[str], schema_name: str) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"ATTACH DATABASE ? AS \"{schema_name}\"", (self._schema_file(schema_name),))
+            if self.directory is not None:
+                # Readers do not block the writer, nor the writer the readers
+                cursor.execute(f"PRAGMA \"{schema_name}\".journal_mode=WAL")
+        finally:
+            cursor.close()
+        attached.add(schema_name)
+
+    def _attach_schemas(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        attached = connection_record.info.setdefault("attached_schemas", set())
+        for schema_name in self.schemas - attached:
+            self._attach(dbapi_connection, attached, schema_name)
+
+    def create_schema(self, connection: sqlalchemy.Connection, schema_name: str) -> None:
+        self.ensure_schemas(connection, [schema_name])
+
+    def ensure_schemas(self, connection: sqlalchemy.Connection, schemas: Iterable[str]) -> None:
+        self.schemas.update(schemas)
+        attached = connection.connection.info.setdefault("attached_schemas", set())
+        for schema_name in sorted(self.schemas - attached):
+            self._attach(connection.connection.dbapi_connection, attached, schema_name)
+            logger.debug(f"SQLite schema '{schema_name}' attached from '{self._schema_file(schema_name)}'.")
+
+    def list_tables(self, connection: sqlalchemy.Connection, schemas: List[str]) -> List[Tuple[str, str]]:
+        self.ensure_schemas(connection, schemas)
+        tables = []
+        for schema_name in schemas:
+            query = sqlalchemy.text(f"SELECT name FROM \"{schema_name}\".sqlite_master WHERE type = 'table'")
+            tables.extend((schema_name, table_name) for table_name in connection.execute(query).scalars())
+        return tables
+
+    def prepare_frame(self, df: pd.DataFrame, columns: List[sqlalchemy.Column]) -> pd.DataFrame:
+        """Parse datetime strings, e.g. dates of 'timestamp_day', since SQLite only takes datetime objects."""
+        parsed = {column.name: pd.to_datetime(df[column.name]) for column in columns
+                  if isinstance(column.type, DateTime) and df[column.name].dtype == object}
+        return df.assign(**parsed) if parsed else df
+
+    def conflict_insert(self, table: sqlalchemy.Table, columns: List[sqlalchemy.Column],
+                        on_conflict: str) -> sqlalchemy.Insert:
+        """INSERT ... ON CONFLICT ... RETURNING. SQLite cannot tell inserted rows from updated ones, so
+           updated rows are reported as inserted."""
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"Argument 'on_conflict' must be one of these: {', '.join(CONFLICT_POLICIES)}.")
+        key = [column.name for column in table.primary_key.columns]
+        statement = sqlite.insert(table)
+        updated = {column.name: statement.excluded[column.name] for column in columns if column.name not in key}
+        if on_conflict == "update" and updated:
+            statement = statement.on_conflict_do_update(index_elements=key, set_=updated)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=key)
+        return statement.returning(sqlalchemy.literal_column("1").label("inserted"))
+
+
+BACKENDS: Dict[str, Type[StorageBackend]] = {
+    "postgresql": PostgresBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+def get_backend(url: str) -> StorageBackend:
+    """Backend of the DB at {url}, picked from its scheme, e.g. 'sqlite' for 'sqlite:///stocks.db'."""
+    backend_name = make_url(url).get_backend_name()
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unsupported DB URL scheme '{backend_name}'. Accepted: {', '.join(BACKENDS)}.")
+    return BACKENDS[backend_name]()
@@ -1,19 +1,31 @@
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import create_engine, MetaData
-from dependencies.authenticator import Settings
+from sqlalchemy import MetaData
+from config.pipeline_config import DATABASE_URL
+from database.backends import get_backend
 
-# create object for DB settings
-settings = Settings()
-# used to construct the database connection URL
-__DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:"\
-                              f"{settings.POSTGRES_PASSWORD}@"\
-                              f"{settings.POSTGRES_HOST}/"\
-                              f"{settings.POSTGRES_DATABASE}"
+
+def database_url() -> str:
+    """URL of the DB: STOCKS_DATABASE_URL if set, otherwise the PostgreSQL server of the key files."""
+    if DATABASE_URL:
+        return DATABASE_URL
+    # Credentials are only read when they are needed, so that embedded backends run without key files
+    from dependencies.authenticator import Settings
+    # create object for DB settings
+    settings = Settings()
+    # used to construct the database connection URL
+    return f"postgresql://{settings.POSTGRES_USER}:"\
+           f"{settings.POSTGRES_PASSWORD}@"\
+           f"{settings.POSTGRES_HOST}/"\
+           f"{settings.POSTGRES_DATABASE}"
+
+
+# dialect-specific operations of the DB (schemas, catalog, conflict handling)
+backend = get_backend(database_url())
 
 # used to create a database engine
 # the engine manages the database connection.
 # The echo=True argument is optional and is often used for debugging purposes (turned off)
-engine = create_engine(__DATABASE_URL)
+engine = backend.create_engine(database_url())
 
 # used to create a models (tables) based on an object-oriented approach
 Base = declarative_base()
@@ -23,5 +35,3 @@ metadata = MetaData()
 
 # used to manage database sessions for your application
 SessionLocal = sessionmaker(bind=engine)
-
-
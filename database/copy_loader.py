@@ -0,0 +1,346 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Bulk load dataframes into PostgreSQL with COPY FROM STDIN. Batches are encoded straight from
+the dataframe columns, either as CSV text or in PostgreSQL's binary COPY format, so rows never
+become Python dictionaries nor ORM objects on their way to the DB.
+"""
+import io
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import Column
+from sqlalchemy.dialects import postgresql
+
+COPY_FORMATS = ["csv", "binary"]
+CONFLICT_POLICIES = ["ignore", "update"]
+
+# Header of the binary COPY format: signature, flags field and header extension length
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+BINARY_TRAILER = b"\xff\xff"
+PG_EPOCH = np.datetime64("2000-01-01", "us")
+NULL_LENGTH = -1
+# Above this number of distinct row layouts, fields are scattered row by row instead
+MAX_LAYOUTS = 64
+
+
+def copy_columns(df: pd.DataFrame, table: sqlalchemy.Table) -> List[Column]:
+    """Columns of {table} that are present in {df}, in table order. Any other dataframe column is ignored."""
+    return [column for column in table.columns if column.name in df.columns]
+
+
+def wall_time(values: pd.Series) -> pd.Series:
+    """Datetimes as they are stored in a 'timestamp without time zone' column: timezone-aware values keep
+       their wall time, e.g. the exchange time of a quote, and drop their timezone. Every write path
+       stores them this way, so that rows never depend on the timezone of the DB session.
+    """
+    values = pd.to_datetime(values)
+    return values.dt.tz_localize(None) if values.dt.tz is not None else values
+
+
+def to_wall_time(df: pd.DataFrame, columns: List[Column]) -> pd.DataFrame:
+    """Convert the timezone-aware values of every 'timestamp without time zone' column of {columns} with
+       'wall_time'. DB drivers would otherwise send them as 'timestamp with time zone', which PostgreSQL
+       stores in the timezone of the session instead.
+    """
+    converted = {column.name: wall_time(df[column.name]) for column in columns
+                 if isinstance(column.type, sqlalchemy.DateTime) and not column.type.timezone
+                 and isinstance(df[column.name].dtype, pd.DatetimeTZDtype)}
+    return df.assign(**converted) if converted else df
+
+
+def copy_statement(table: sqlalchemy.Table, columns: List[Column], copy_format: str) -> str:
+    """COPY statement that loads {columns} of {table} from STDIN."""
+    preparer = postgresql.dialect().identifier_preparer
+    column_names = ", ".join(preparer.quote(column.name) for column in columns)
+    options = "FORMAT binary" if copy_format == "binary" else "FORMAT csv, NULL '\\N'"
+    return f"COPY {preparer.format_table(table)} ({column_names}) FROM STDIN WITH ({options})"
+
+
+def encode_csv(df: pd.DataFrame, columns: List[Column]) -> bytes:
+    """Encode the rows of {df} as CSV text. Missing values are written as unquoted '\\N', i.e. NULL."""
+    buffer = io.StringIO()
+    df[[column.name for column in columns]].to_csv(buffer, header=False, index=False, na_rep="\\N")
+    return buffer.getvalue().encode("utf-8")
+
+
+def encode_binary(df: pd.DataFrame, columns: List[Column], session_timezone: Optional[str] = None,
+                  header: bool = True, trailer: bool = True) -> bytes:
+    """Encode the rows of {df} in the binary COPY format. Every column is converted with numpy, and rows
+       sharing the same field lengths are laid out together as a (rows, bytes) array, so no Python
+       object is created per row or per field.
+
+    Args:
+        df (pd.DataFrame): Rows to be encoded.
+        columns (List[Column]): Table columns to be encoded, in COPY order.
+        session_timezone (str, optional): Timezone of the DB session, in which naive datetimes are read
+                                          for 'timestamp with time zone' columns, as they would be
+                                          from SQL literals. Defaults to None, i.e. UTC.
+        header (bool, optional): Prepend the header of the format. Defaults to True.
+        trailer (bool, optional): Append the trailer of the format. Defaults to True.
+
+    Raises:
+        TypeError: Raised if a column type has no binary encoding.
+
+    Returns:
+        bytes: Binary COPY payload.
+    """
+    n_rows = len(df)
+    if n_rows == 0 or not columns:
+        return (BINARY_HEADER if header else b"") + (BINARY_TRAILER if trailer else b"")
+    fields = [_encode_binary_field(df[column.name], column, session_timezone) for column in columns]
+    field_lengths = np.column_stack([lengths for lengths, _ in fields])
+    # COPY does not depend on row order, so rows that share a layout (same NULLs, same text lengths)
+    # are written together, each field being a plain column slice of the group
+    layout_codes, first_rows = _layout_codes(field_lengths)
+    layouts = field_lengths[first_rows]
+    if len(layouts) > MAX_LAYOUTS:
+        payload = _encode_scattered(fields, field_lengths)
+    elif len(layouts) == 1:
+        payload = _encode_layout(fields, None, layouts[0])
+    else:
+        order = np.argsort(layout_codes, kind="stable")
+        bounds = np.searchsorted(layout_codes[order], np.arange(len(layouts) + 1))
+        payload = b"".join(_encode_layout(fields, order[bounds[n] : bounds[n + 1]], layout)
+                           for n, layout in enumerate(layouts))
+    return (BINARY_HEADER if header else b"") + payload + (BINARY_TRAILER if trailer else b"")
+
+
+def _layout_codes(field_lengths: np.ndarray):
+    """Code of the layout of every row, numbered in order of appearance, and the first row of each layout."""
+    key = np.zeros(len(field_lengths), dtype=np.int64)
+    radix = 1
+    for lengths in field_lengths.T:
+        codes, uniques = pd.factorize(lengths)
+        radix *= len(uniques)
+        if radix > 2 ** 62:
+            # Too many combinations for a single key: every row is given its own layout
+            return np.arange(len(field_lengths)), np.arange(len(field_lengths))
+        key = key * len(uniques) + codes
+    layout_codes, _ = pd.factorize(key)
+    first_rows = np.unique(layout_codes, return_index=True)[1]
+    return layout_codes, first_rows
+
+
+def _encode_layout(fields: list, rows: Optional[np.ndarray], layout: np.ndarray) -> bytes:
+    """Encode the {rows} (all of them if None) whose fields have the lengths in {layout}."""
+    n_rows = len(fields[0][0]) if rows is None else len(rows)
+    data_lengths = np.where(layout == NULL_LENGTH, 0, layout)
+    encoded_rows = np.empty((n_rows, 2 + 4 * len(fields) + int(data_lengths.sum())), dtype=np.uint8)
+    encoded_rows[:, :2] = np.array([len(fields)], dtype=">i2").view(np.uint8)
+    position = 2
+    for (_, values), length, width in zip(fields, layout, data_lengths):
+        encoded_rows[:, position : position + 4] = np.array([length], dtype=">i4").view(np.uint8)
+        position += 4
+        if width:
+            encoded_rows[:, position : position + width] = _fixed_width(values, int(width), rows)
+            position += width
+    return encoded_rows.tobytes()
+
+
+def _encode_scattered(fields: list, field_lengths: np.ndarray) -> bytes:
+    """Encode rows of many different layouts, scattering every field at its own offset."""
+    n_rows = len(field_lengths)
+    data_lengths = np.where(field_lengths == NULL_LENGTH, 0, field_lengths)
+    row_lengths = 2 + 4 * len(fields) + data_lengths.sum(axis=1)
+    buffer = np.empty(int(row_lengths.sum()), dtype=np.uint8)
+    row_offsets = np.concatenate([[0], np.cumsum(row_lengths)[:-1]]).astype(np.int64)
+    _scatter(buffer, row_offsets, np.full(n_rows, len(fields), dtype=">i2").view(np.uint8).reshape(n_rows, 2))
+    field_offsets = row_offsets + 2
+    for n, (lengths, values) in enumerate(fields):
+        _scatter(buffer, field_offsets, lengths.astype(">i4").view(np.uint8).reshape(n_rows, 4))
+        if isinstance(values, np.ndarray):
+            valid = lengths != NULL_LENGTH
+            _scatter(buffer, field_offsets[valid] + 4, values[valid])
+        else:
+            _scatter_text(buffer, field_offsets + 4, values, data_lengths[:, n])
+        field_offsets = field_offsets + 4 + data_lengths[:, n]
+    return buffer.tobytes()
+
+
+def _encode_binary_field(series: pd.Series, column: Column, session_timezone: Optional[str]):
+    """Length of every field of a column (-1 for NULL) and its data: a (rows, width) uint8 array for
+       fixed-width types, or the distinct encoded values and the code of every row for text.
+    """
+    column_type = column.type
+    if isinstance(column_type, (sqlalchemy.String, sqlalchemy.Text)):
+        # Text columns repeat a few values (e.g. the symbol), so each distinct value is encoded once
+        codes, uniques = pd.factorize(series)
+        encoded = [str(value).encode("utf-8") for value in uniques]
+        unique_lengths = np.array([len(value) for value in encoded] + [NULL_LENGTH], dtype=np.int64)
+        return unique_lengths[codes], (encoded, codes)
+    if isinstance(column_type, sqlalchemy.DateTime):
+        values = pd.to_datetime(series)
+        if not column_type.timezone:
+            values = wall_time(values)
+        elif values.dt.tz is not None:
+            values = values.dt.tz_convert("UTC")
+        elif column_type.timezone and session_timezone is not None:
+            values = values.dt.tz_localize(session_timezone).dt.tz_convert("UTC")
+        if values.dt.tz is not None:
+            values = values.dt.tz_localize(None)
+        is_null = values.isna().to_numpy()
+        data = (values.to_numpy("datetime64[us]") - PG_EPOCH).astype(np.int64).astype(">i8")
+        width = 8
+    elif isinstance(column_type, sqlalchemy.Date):
+        values = pd.to_datetime(series)
+        is_null = values.isna().to_numpy()
+        data = (values.to_numpy("datetime64[D]") - PG_EPOCH.astype("datetime64[D]")).astype(np.int64).astype(">i4")
+        width = 4
+    elif isinstance(column_type, sqlalchemy.Float):
+        values = pd.to_numeric(series, errors="coerce")
+        is_null = values.isna().to_numpy()
+        data = values.to_numpy(dtype=np.float64, na_value=0).astype(">f8")
+        width = 8
+    elif isinstance(column_type, sqlalchemy.BigInteger):
+        is_null = series.isna().to_numpy()
+        data = series.fillna(0).to_numpy(dtype=np.int64).astype(">i8")
+        width = 8
+    elif isinstance(column_type, sqlalchemy.Integer):
+        is_null = series.isna().to_numpy()
+        data = series.fillna(0).to_numpy(dtype=np.int64).astype(">i4")
+        width = 4
+    elif isinstance(column_type, sqlalchemy.Boolean):
+        is_null = series.isna().to_numpy()
+        data = series.fillna(False).to_numpy(dtype=bool).astype(np.uint8)
+        width = 1
+    else:
+        raise TypeError(f"Column '{column.name}' of type {column_type} cannot be encoded in binary COPY format.")
+    lengths = np.where(is_null, NULL_LENGTH, width).astype(np.int64)
+    return lengths, np.ascontiguousarray(data).view(np.uint8).reshape(len(series), width)
+
+
+def _fixed_width(values, width: int, rows: Optional[np.ndarray]) -> np.ndarray:
+    """(rows, width) uint8 array of a field whose {rows} all take {width} bytes."""
+    if isinstance(values, np.ndarray):
+        return values if rows is None else values[rows]
+    encoded, codes = values
+    codes = codes if rows is None else codes[rows]
+    # Distinct values of other lengths are never picked, so truncating them is harmless
+    return np.array(encoded, dtype=f"S{width}").view(np.uint8).reshape(-1, width)[codes]
+
+
+def _scatter(buffer: np.ndarray, offsets: np.ndarray, values: np.ndarray) -> None:
+    """Write row {n} of the (rows, width) array {values} into {buffer} from {offsets[n]} onwards."""
+    for k in range(values.shape[1]):
+        buffer[offsets + k] = values[:, k]
+
+
+def _scatter_text(buffer: np.ndarray, offsets: np.ndarray, values, lengths: np.ndarray) -> None:
+    """Write the encoded text of row {n} into {buffer} from {offsets[n]} onwards. NULL rows have no length."""
+    encoded, codes = values
+    if not encoded:
+        return
+    source = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    unique_starts = np.concatenate([[0], np.cumsum([len(value) for value in encoded])[:-1]]).astype(np.int64)
+    row_sources = unique_starts[codes]
+    position_in_field = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    buffer[np.repeat(offsets, lengths) + position_in_field] = source[np.repeat(row_sources, lengths) + position_in_field]
+
+
+def copy_df(connection, df: pd.DataFrame, table: sqlalchemy.Table, copy_format: str = "csv",
+            session_timezone: Optional[str] = None, columns: Optional[List[Column]] = None) -> int:
+    """Load a dataframe into {table} with a single COPY statement. The transaction is left to the caller.
+
+    Args:
+        connection: DB-API connection of psycopg2, e.g. from 'engine.raw_connection()'.
+        df (pd.DataFrame): Rows to be loaded.
+        table (sqlalchemy.Table): Destination table.
+        copy_format (str, optional): "csv" or "binary". Defaults to "csv".
+        session_timezone (str, optional): Timezone of the DB session, only used by the binary format.
+                                          Defaults to None.
+        columns (List[Column], optional): Columns to be loaded, with the types they are encoded with.
+                                          Defaults to None, i.e. those of {table} present in {df}.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"Argument 'copy_format' must be one of these: {', '.join(COPY_FORMATS)}.")
+    columns = columns if columns is not None else copy_columns(df, table)
+    df = to_wall_time(df, columns)
+    if copy_format == "binary":
+        payload = encode_binary(df, columns, session_timezone)
+    else:
+        payload = encode_csv(df, columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(copy_statement(table, columns, copy_format), io.BytesIO(payload))
+    return len(df)
+
+
+def conflict_insert(table: sqlalchemy.Table, columns: List[Column], on_conflict: str,
+                    source: Optional[sqlalchemy.Select] = None) -> sqlalchemy.Insert:
+    """INSERT into {table} that resolves every primary-key conflict row by row, either skipping the
+       new row ("ignore") or overwriting the stored one ("update"). Each written row is returned with an
+       'inserted' flag, which is false for updated rows.
+
+    Args:
+        table (sqlalchemy.Table): Destination table.
+        columns (List[Column]): Columns that are written.
+        on_conflict (str): "ignore" or "update".
+        source (sqlalchemy.Select, optional): Rows to be inserted. If None, they are given as parameters
+                                              when the statement is executed. Defaults to None.
+
+    Returns:
+        sqlalchemy.Insert: INSERT ... ON CONFLICT ... RETURNING statement.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Argument 'on_conflict' must be one of these: {', '.join(CONFLICT_POLICIES)}.")
+    key = [column.name for column in table.primary_key.columns]
+    statement = postgresql.insert(table)
+    if source is not None:
+        statement = statement.from_select([column.name for column in columns], source)
+    updated = {column.name: statement.excluded[column.name] for column in columns if column.name not in key}
+    if on_conflict == "update" and updated:
+        statement = statement.on_conflict_do_update(index_elements=key, set_=updated)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=key)
+    # xmax is only set on row versions that replaced an existing one
+    return statement.returning(sqlalchemy.literal_column("xmax = 0").label("inserted"))
+
+
+def upsert_df(connection, df: pd.DataFrame, table: sqlalchemy.Table, on_conflict: str = "ignore",
+              copy_format: str = "csv", session_timezone: Optional[str] = None) -> Dict[str, int]:
+    """Load a dataframe into {table} resolving primary-key conflicts row by row. Rows are copied into
+       a temporary staging table and moved into {table} with a single INSERT ... ON CONFLICT. The
+       transaction is left to the caller, and the staging table is dropped when it commits.
+
+    Args:
+        connection: DB-API connection of psycopg2, e.g. from 'engine.raw_connection()'.
+        df (pd.DataFrame): Rows to be loaded.
+        table (sqlalchemy.Table): Destination table.
+        on_conflict (str, optional): "ignore" keeps stored rows, "update" overwrites them. Defaults to "ignore".
+        copy_format (str, optional): "csv" or "binary". Defaults to "csv".
+        session_timezone (str, optional): Timezone of the DB session, only used by the binary format.
+                                          Defaults to None.
+
+    Returns:
+        Dict[str, int]: Number of rows that were inserted, updated and skipped.
+    """
+    columns = copy_columns(df, table)
+    key = [column.name for column in table.primary_key.columns]
+    if not key or not set(key).issubset(column.name for column in columns):
+        raise ValueError(f"Rows for table '{table.name}' must hold all of its primary key columns: {', '.join(key)}.")
+    preparer = postgresql.dialect().identifier_preparer
+    staging_name = f"staging_{table.name}"[:63]
+    staging = sqlalchemy.table(staging_name, *[sqlalchemy.column(column.name) for column in columns])
+    source = sqlalchemy.select(*staging.c)
+    if on_conflict == "update":
+        # A row cannot be updated twice by the same statement, so duplicates within the batch are dropped.
+        # COPY appends rows to the staging table in order, so the last copy of a key has the highest ctid
+        key_columns = [staging.c[name] for name in key]
+        source = source.distinct(*key_columns).order_by(*key_columns, sqlalchemy.literal_column("ctid").desc())
+    written = conflict_insert(table, columns, on_conflict, source).cte("written")
+    counts = sqlalchemy.select(sqlalchemy.func.count().filter(written.c.inserted),
+                               sqlalchemy.func.count().filter(sqlalchemy.not_(written.c.inserted)))
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {preparer.quote(staging_name)} "\
+                       f"(LIKE {preparer.format_table(table)} INCLUDING DEFAULTS) ON COMMIT DROP")
+    copy_df(connection, df, staging, copy_format, session_timezone, columns=columns)
+    compiled = counts.compile(dialect=postgresql.dialect())
+    with connection.cursor() as cursor:
+        cursor.execute(str(compiled), compiled.params)
+        inserted, updated = cursor.fetchone()
+    return {"inserted": inserted, "updated": updated, "skipped": len(df) - inserted - updated}
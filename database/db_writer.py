@@ -0,0 +1,160 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Write dataframes into the DB through several writer threads, so that inserts run in parallel
+on separate pooled connections instead of one after the other on a single session. Every
+write is routed to a writer by its target table, so batches of the same table never compete
+for the same rows or locks, and each writer runs every batch in its own transaction.
+"""
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from config.log_config import logger
+from config.pipeline_config import DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_WRITER_QUEUE_SIZE, DB_WRITERS
+from database.utils_db import UtilsDB
+
+
+class DBWriterService:
+    """Pool of {n_writers} threads, each with its own UtilsDB, that run the writes submitted to them.
+       Writes of the same shard key (by default, the full name of the target table) always go to the
+       same writer and are run in submission order. Every writer has a queue of {queue_size} writes,
+       and 'submit' blocks while it is full, so producers slow down to the pace of the DB.
+
+       Usage:
+           with DBWriterService() as writers:
+               writers.insert_df(df, model)
+    """
+
+    def __init__(self, n_writers: int = DB_WRITERS, queue_size: int = DB_WRITER_QUEUE_SIZE,
+                 utils_db_factory: Callable[[], UtilsDB] = UtilsDB) -> None:
+        """Class initializer.
+
+        Args:
+            n_writers (int, optional): Number of concurrent writers. Defaults to the STOCKS_DB_WRITERS
+                                       environment variable (4).
+            queue_size (int, optional): Maximum number of writes waiting for each writer. Defaults to the
+                                        STOCKS_DB_WRITER_QUEUE_SIZE environment variable (8).
+            utils_db_factory (Callable[[], UtilsDB], optional): Builds the UtilsDB of every writer.
+                                                                Defaults to UtilsDB.
+        """
+        if n_writers < 1:
+            raise ValueError("Argument 'n_writers' must be higher than 0.")
+        if n_writers > DB_POOL_SIZE + DB_MAX_OVERFLOW:
+            logger.warning(f"{n_writers} DB writers share a pool of {DB_POOL_SIZE + DB_MAX_OVERFLOW} connections. "\
+                           f"Some of them will wait for a free connection.")
+        self.n_writers = n_writers
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(n_writers)]
+        self.writers = [utils_db_factory() for _ in range(n_writers)]
+        self.threads: List[threading.Thread] = []
+        self.counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        self.failed_writes = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "DBWriterService":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start the writer threads."""
+        if self.threads:
+            return
+        self.threads = [threading.Thread(target=self._run_writer, args=(n,), name=f"db-writer-{n}")
+                        for n in range(self.n_writers)]
+        for thread in self.threads:
+            thread.start()
+
+    def shard(self, key: str) -> int:
+        """Writer that handles a shard key. The hash is stable, unlike 'hash' on strings."""
+        return zlib.crc32(key.encode()) % self.n_writers
+
+    def submit(self, key: str, write: Callable[[UtilsDB], Optional[Dict[str, int]]]) -> Future:
+        """Queue a write on the writer of {key}, waiting while its queue is full.
+
+        Args:
+            key (str): Shard key, such as the full name of the target table.
+            write (Callable[[UtilsDB], Optional[Dict[str, int]]]): Write to run with the UtilsDB of the writer.
+                                                                    It may return the number of rows that were
+                                                                    inserted, updated and skipped.
+
+        Returns:
+            Future: Result of {write}, or the exception it raised, once the writer has run it.
+        """
+        if not self.threads:
+            raise RuntimeError("DBWriterService must be started before writes are submitted.")
+        future = Future()
+        self.queues[self.shard(key)].put((write, future))
+        return future
+
+    def insert_df(self, df: pd.DataFrame, model: object,
+                  after_write: Optional[Callable[[pd.DataFrame], None]] = None, **kwargs) -> Optional[Future]:
+        """Queue the insertion of {df} into {model}, sharded by its table. See 'UtilsDB.insert_df_in_db'.
+
+        Args:
+            df (pd.DataFrame): Rows to insert.
+            model (object): Model class with table characteristics.
+            after_write (Callable[[pd.DataFrame], None], optional): Called by the writer with {df} once it has
+                                                                    been inserted, e.g. to mirror it elsewhere.
+                                                                    Defaults to None.
+            **kwargs: Passed on to 'UtilsDB.insert_df_in_db'.
+
+        Returns:
+            Future: Completion of the insertion. None if {df} is empty.
+        """
+        if df.empty:
+            return None
+
+        def write(utils_db: UtilsDB) -> Optional[Dict[str, int]]:
+            counts = utils_db.insert_df_in_db(df, model, **kwargs)
+            if after_write is not None:
+                after_write(df)
+            return counts
+
+        return self.submit(model.__table__.fullname, write)
+
+    def close(self) -> Dict[str, int]:
+        """Wait until every queued write has run and stop the writers.
+
+        Returns:
+            Dict[str, int]: Number of rows that were inserted, updated and skipped by all writers.
+        """
+        if not self.threads:
+            return self.counts
+        for write_queue in self.queues:
+            write_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        logger.info(f"DB writers finished: {self.counts['inserted']} rows inserted, {self.counts['updated']} updated, "\
+                    f"{self.counts['skipped']} skipped and {self.failed_writes} failed writes.")
+        return self.counts
+
+    def _run_writer(self, n: int) -> None:
+        utils_db = self.writers[n]
+        while True:
+            item = self.queues[n].get()
+            if item is None:
+                return
+            write, future = item
+            try:
+                counts = write(utils_db)
+            except Exception as e:
+                with self.lock:
+                    self.failed_writes += 1
+                logger.error(f"DB writer {n} could not complete a write: {e}")
+                future.set_exception(e)
+                continue
+            finally:
+                del item, write
+            future.set_result(counts)
+            if counts:
+                with self.lock:
+                    self.counts = {key: self.counts[key] + counts.get(key, 0) for key in self.counts}
+
@@ -0,0 +1,108 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Process-wide cache of the dynamic per-symbol models. Existing tables are looked up with a
+single catalog query per set of schemas, every model class is declared only once on the
+shared Base, and missing tables are created together in one transaction.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import sqlalchemy
+
+from config.log_config import logger
+from database.backends import StorageBackend
+from database.connection import Base, backend, engine
+from database.models import create_dynamic_model
+
+
+class ModelRegistry:
+    """Cache of model classes and of the tables that exist in the DB, keyed by (schema, table)."""
+
+    def __init__(self, db_engine: sqlalchemy.Engine = engine, db_backend: StorageBackend = backend) -> None:
+        self.engine = db_engine
+        self.backend = db_backend
+        self.models: Dict[Tuple[str, str], object] = {}
+        self.existing_tables: Set[Tuple[str, str]] = set()
+        self.loaded_schemas: Set[str] = set()
+        self.lock = threading.RLock()
+
+    def load_existing(self, schemas: Iterable[str]) -> None:
+        """Look up every table of {schemas} with one catalog query. Schemas already loaded are skipped."""
+        with self.lock:
+            schemas = sorted(set(schemas) - self.loaded_schemas)
+            if not schemas:
+                return
+            with self.engine.connect() as connection:
+                rows = self.backend.list_tables(connection, schemas)
+            self.existing_tables.update((schema_name, table_name) for schema_name, table_name in rows)
+            self.loaded_schemas.update(schemas)
+            logger.debug(f"{len(rows)} existing tables found in schemas {', '.join(schemas)}.")
+
+    def exists(self, schema_name: str, table_name: str) -> bool:
+        """Check whether a table exists, loading its schema on first use."""
+        with self.lock:
+            self.load_existing([schema_name])
+            return (schema_name, table_name) in self.existing_tables
+
+    def table_names(self, schema_name: str) -> List[str]:
+        """Sorted names of the existing tables of a schema, loading it on first use."""
+        with self.lock:
+            self.load_existing([schema_name])
+            return sorted(table_name for schema, table_name in self.existing_tables if schema == schema_name)
+
+    def get_model(self, class_name: str, model_name: str, schema_name: str, column_data: list,
+                  table_kwargs: Optional[dict] = None) -> object:
+        """Return the model of a table, declaring it on first use. See 'create_dynamic_model'.
+
+        Args:
+            class_name (str): Name of the class.
+            model_name (str): Name of the table.
+            schema_name (str): Name of the schema where the table is hosted.
+            column_data (list): Columns of the table. They are bound to the model, so a fresh copy is needed
+                                unless the model is already cached.
+            table_kwargs (dict, optional): Extra table options. Defaults to None.
+
+        Returns:
+            object: Model class.
+        """
+        key = (schema_name, model_name)
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = create_dynamic_model(class_name, model_name, schema_name, column_data, table_kwargs)
+            return self.models[key]
+
+    def create_missing(self, models: List[object]) -> int:
+        """Create, in a single transaction, the tables of {models} that do not exist yet.
+
+        Args:
+            models (List[object]): Model classes whose tables must exist.
+
+        Returns:
+            int: Number of tables that were created.
+        """
+        with self.lock:
+            self.load_existing({model.__table__.schema for model in models})
+            missing = [model.__table__ for model in models
+                       if (model.__table__.schema, model.__table__.name) not in self.existing_tables]
+            if not missing:
+                return 0
+            with self.engine.begin() as connection:
+                self.backend.ensure_schemas(connection, {table.schema for table in missing})
+                Base.metadata.create_all(connection, tables=missing, checkfirst=False)
+            self.existing_tables.update((table.schema, table.name) for table in missing)
+        logger.info(f"{len(missing)} tables created: {', '.join(table.fullname for table in missing)}.")
+        return len(missing)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Return the process-wide model registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -42,11 +42,12 @@ class Other(Base):
     industry = Column(String)
     sector = Column(String)
 
-def create_dynamic_model(class_name, model_name, schema_name, column_data):
+def create_dynamic_model(class_name, model_name, schema_name, column_data, table_kwargs=None):
     # Define the attributes for the class
+    # table_kwargs holds extra table options, e.g. {'postgresql_partition_by': 'RANGE (datetime)'}
     class_attributes = {
         "__tablename__": model_name,
-        "__table_args__": {'schema': schema_name}
+        "__table_args__": {'schema': schema_name, **(table_kwargs or {})}
     }
 
     # Add columns to the class attributes
@@ -0,0 +1,323 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Columnar copy of the quote store on local disk, for analytics that would be slow over Postgres
+row storage. Quotes are kept as a Hive-partitioned Parquet dataset per interval (yearly
+partitions for daily quotes and monthly ones for one-minute quotes), with zstd-compressed
+columns. Reads prune partitions and row groups with the given filters and memory-map the files.
+
+    <root>/daily/year=2023/AAPL_202301030000_202312290000.01700150400000000000.parquet
+    <root>/1min/month=2023-11/AAPL_202311160930_202311161559.01700150400000000000.parquet
+
+The number before the extension is the write sequence of the file. A quote found in several files is
+read from the one written last, whatever the order of their paths.
+
+Requires pyarrow.
+"""
+import glob
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import DateTime, Float, Integer
+
+from config.log_config import logger
+from config.pipeline_config import PARQUET_COMPRESSION, PARQUET_PATH
+from utils.dafault_columns import default_daily, default_minutes
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+_last_sequence = 0
+_sequence_lock = threading.Lock()
+
+
+def next_write_sequence() -> int:
+    """Sequence of a new file: nanoseconds since the epoch, strictly increasing within the process."""
+    global _last_sequence
+    with _sequence_lock:
+        _last_sequence = max(time.time_ns(), _last_sequence + 1)
+        return _last_sequence
+
+
+def write_sequence(path: Union[str, Path]) -> int:
+    """Write sequence of a file, from its name '<name>.<sequence>.parquet'. Files written before sequences
+       were used have none, and are taken as the oldest."""
+    _, _, sequence = Path(path).name[:-len(".parquet")].rpartition(".")
+    return int(sequence) if sequence.isdigit() else -1
+
+
+def arrow_schema(columns: List[sqlalchemy.Column]) -> "pa.Schema":
+    """Arrow schema of a quote table. Timezone-aware timestamps are stored in UTC."""
+    fields = []
+    for column in columns:
+        if isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC" if column.type.timezone else None)
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class ParquetMirror:
+    """Append-only Parquet dataset with the quotes of every symbol, one per interval."""
+
+    # Interval: (columns, partition field, strftime format of the partition values)
+    INTERVALS = {
+        "daily": (default_daily, "year", "%Y"),
+        "1min": (default_minutes, "month", "%Y-%m"),
+    }
+
+    def __init__(self, root: Union[str, Path] = PARQUET_PATH, compression: str = PARQUET_COMPRESSION) -> None:
+        """Class initializer.
+
+        Args:
+            root (Union[str, Path], optional): Directory of the datasets. Defaults to the STOCKS_PARQUET_PATH
+                                               environment variable.
+            compression (str, optional): Parquet compression codec. Defaults to the STOCKS_PARQUET_COMPRESSION
+                                         environment variable ("zstd").
+        """
+        if pa is None:
+            raise ImportError("pyarrow is needed by the Parquet mirror. Install it with 'pip install pyarrow'.")
+        self.root = Path(root)
+        self.compression = compression
+        self.schemas = {interval: arrow_schema(columns) for interval, (columns, _, _) in self.INTERVALS.items()}
+        self.filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+
+    def _partitioning(self, interval: str) -> "ds.Partitioning":
+        partition_field = self.INTERVALS[interval][1]
+        return ds.partitioning(pa.schema([(partition_field, pa.string())]), flavor="hive")
+
+    def append(self, df: pd.DataFrame, interval: str) -> int:
+        """Write the quotes of {df} to the dataset of {interval}, one file per symbol and partition. Files are
+           named after their symbol, datetime range and write sequence, and writing the same range again
+           replaces the previous file.
+
+        Args:
+            df (pd.DataFrame): Quotes of any number of symbols, with the columns of the quote tables.
+            interval (str): "daily" or "1min".
+
+        Returns:
+            int: Number of files written.
+        """
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Argument 'interval' must be one of these: {', '.join(self.INTERVALS)}.")
+        if df.empty:
+            return 0
+        _, partition_field, partition_format = self.INTERVALS[interval]
+        schema = self.schemas[interval]
+        df = df.copy()
+        df["datetime"] = pd.to_datetime(df["datetime"])
+        if df["datetime"].dt.tz is not None:
+            # Quotes are stored in exchange wall time, without timezone, as in the DB
+            df["datetime"] = df["datetime"].dt.tz_localize(None)
+        for field in schema:
+            if field.name not in df.columns:
+                df[field.name] = None
+            elif pa.types.is_timestamp(field.type) and field.type.tz is not None:
+                df[field.name] = pd.to_datetime(df[field.name], utc=True)
+        partitions = df["datetime"].dt.strftime(partition_format)
+        files = 0
+        for (symbol, partition), group in df.groupby([df["symbol"], partitions], sort=False):
+            group = group.sort_values("datetime")
+            directory = self.root / interval / f"{partition_field}={partition}"
+            directory.mkdir(parents=True, exist_ok=True)
+            first, last = group["datetime"].iloc[0], group["datetime"].iloc[-1]
+            name = f"{str(symbol).replace(os.sep, '_')}_{first:%Y%m%d%H%M}_{last:%Y%m%d%H%M}"
+            path = self._write([pa.Table.from_pandas(group[schema.names], schema=schema, preserve_index=False)],
+                               schema, directory, name, next_write_sequence())
+            # Previous writes of the same range are superseded by this one
+            for previous in [directory / f"{name}.parquet", *directory.glob(f"{glob.escape(name)}.*.parquet")]:
+                if previous != path and write_sequence(previous) < write_sequence(path):
+                    previous.unlink(missing_ok=True)
+            files += 1
+        logger.debug(f"Mirrored {len(df)} {interval} quotes into {files} Parquet files.")
+        return files
+
+    def _write(self, tables: Iterable["pa.Table"], schema: "pa.Schema", directory: Path, name: str, sequence: int,
+               row_group_size: Optional[int] = None) -> Path:
+        """Write {tables} one after the other as the file '<name>.<sequence>.parquet' of {directory}. It is
+           written next to its final path and renamed, so readers never see half a file.
+
+        Args:
+            tables (Iterable[pa.Table]): Tables with the rows of the file, in order.
+            schema (pa.Schema): Schema of the file.
+            directory (Path): Directory of the file.
+            name (str): Name of the file, before its write sequence.
+            sequence (int): Write sequence of the file.
+            row_group_size (int, optional): Tables are buffered into row groups of about this many rows.
+                                            Defaults to None, i.e. a row group per table.
+
+        Returns:
+            Path: Path of the file.
+        """
+        path = directory / f"{name}.{sequence:020d}.parquet"
+        temporary_path = directory / f".{uuid.uuid4().hex}.tmp"
+        with pq.ParquetWriter(temporary_path, schema, compression=self.compression) as writer:
+            pending = []
+            for table in tables:
+                pending.append(table)
+                if row_group_size is None or sum(map(len, pending)) >= row_group_size:
+                    writer.write_table(pa.concat_tables(pending))
+                    pending = []
+            if pending:
+                writer.write_table(pa.concat_tables(pending))
+        os.replace(temporary_path, path)
+        return path
+
+    def read(self, interval: str = "daily", symbols: Optional[Union[str, List[str]]] = None,
+             start: Optional[datetime] = None, end: Optional[datetime] = None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read quotes from the dataset of {interval}. Filters are pushed down to the partitions and to the
+           row group statistics of every file, and files are memory-mapped.
+
+        Args:
+            interval (str, optional): "daily" or "1min". Defaults to "daily".
+            symbols (Union[str, List[str]], optional): Symbols to read. Defaults to None (all of them).
+            start (datetime, optional): Earliest datetime to read, included. Defaults to None (no minimum).
+            end (datetime, optional): Latest datetime to read, excluded. Defaults to None (no maximum).
+            columns (List[str], optional): Quote columns to read. 'datetime' and 'symbol' are always read.
+                                           Defaults to None, which reads every column.
+
+        Returns:
+            pd.DataFrame: Quotes sorted by symbol and datetime. A quote written twice is read from the file
+                          written last. Empty if none matches.
+        """
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Argument 'interval' must be one of these: {', '.join(self.INTERVALS)}.")
+        schema = self.schemas[interval]
+        names = schema.names if columns is None else [name for name in schema.names
+                                                      if name in ("datetime", "symbol") or name in columns]
+        directory = self.root / interval
+        if not directory.exists():
+            return schema.empty_table().select(names).to_pandas()
+        _, partition_field, partition_format = self.INTERVALS[interval]
+        partitioning = self._partitioning(interval)
+        dataset = ds.dataset(str(directory), schema=pa.unify_schemas([schema, partitioning.schema]), format="parquet",
+                             filesystem=self.filesystem, partitioning=partitioning)
+        expression = None
+        conditions = []
+        if symbols is not None:
+            conditions.append(ds.field("symbol").isin([symbols] if isinstance(symbols, str) else list(symbols)))
+        if start is not None:
+            start = pd.Timestamp(start).to_pydatetime()
+            conditions += [ds.field(partition_field) >= f"{start:{partition_format}}", ds.field("datetime") >= start]
+        if end is not None:
+            end = pd.Timestamp(end).to_pydatetime()
+            conditions += [ds.field(partition_field) <= f"{end:{partition_format}}", ds.field("datetime") < end]
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        # Files are scanned in write order, so the last copy of a quote is the one written last
+        fragments = sorted(dataset.get_fragments(filter=expression), key=lambda fragment: write_sequence(fragment.path))
+        if not fragments:
+            return schema.empty_table().select(names).to_pandas()
+        table = pa.concat_tables([fragment.to_table(schema=dataset.schema, columns=names, filter=expression)
+                                  for fragment in fragments])
+        return (table.to_pandas().drop_duplicates(["symbol", "datetime"], keep="last")
+                .sort_values(["symbol", "datetime"], ignore_index=True))
+
+    def compact(self, interval: str, min_files: int = 2) -> Dict[str, int]:
+        """Merge the files of every partition of {interval} into a single file sorted by symbol and datetime,
+           which drops duplicated quotes and lets row group statistics skip most symbols on reads. The merged
+           file takes the latest write sequence of its files, so files written meanwhile still win. Partitions
+           are merged one symbol at a time, so memory does not grow with the size of a partition.
+
+        Args:
+            interval (str): "daily" or "1min".
+            min_files (int, optional): Partitions with fewer files are left as they are. Defaults to 2.
+
+        Returns:
+            Dict[str, int]: Number of files merged in every partition.
+        """
+        merged = {}
+        directory = self.root / interval
+        if not directory.exists():
+            return merged
+        schema = self.schemas[interval]
+        for partition in sorted(path for path in directory.iterdir() if path.is_dir()):
+            files = sorted(partition.glob("*.parquet"), key=write_sequence)
+            if len(files) < max(min_files, 2):
+                continue
+            path = self._write(self._merge_by_symbol(files, schema), schema, partition, "part",
+                               max(write_sequence(files[-1]), 0), row_group_size=100_000)
+            # The newest file may be a previous merge with the same name, which has just been replaced
+            for merged_path in files:
+                if merged_path != path:
+                    merged_path.unlink()
+            merged[partition.name] = len(files)
+        logger.info(f"Compacted {sum(merged.values())} {interval} Parquet files in {len(merged)} partitions.")
+        return merged
+
+    @staticmethod
+    def _merge_by_symbol(files: List[Path], schema: "pa.Schema") -> Iterator["pa.Table"]:
+        """Merge the quotes of {files} one symbol at a time. Only the row groups whose statistics may hold a
+           symbol are read for it, so memory is bounded by the quotes of a single symbol plus the row groups
+           of previous merges that it shares with its neighbours.
+
+        Args:
+            files (List[Path]): Files to be merged, in write order.
+            schema (pa.Schema): Schema of the files.
+
+        Yields:
+            pa.Table: Quotes of every symbol, in symbol order and sorted by datetime. A quote found in several
+                      files is taken from the one written last.
+        """
+        # Row groups holding a single symbol, by symbol, and row groups of previous merges with their bounds
+        single_symbol = defaultdict(list)
+        multi_symbol = []
+        symbols = set()
+        for order, path in enumerate(files):
+            with pq.ParquetFile(path, memory_map=True) as parquet_file:
+                symbol_index = parquet_file.schema_arrow.get_field_index("symbol")
+                for row_group in range(parquet_file.num_row_groups):
+                    statistics = parquet_file.metadata.row_group(row_group).column(symbol_index).statistics
+                    if statistics is not None and statistics.has_min_max and statistics.min == statistics.max:
+                        single_symbol[statistics.min].append((order, path, row_group))
+                        symbols.add(statistics.min)
+                        continue
+                    row_group_symbols = pc.unique(parquet_file.read_row_group(row_group, columns=["symbol"])
+                                                  .column(0)).drop_null().to_pylist()
+                    if row_group_symbols:
+                        symbols.update(row_group_symbols)
+                        multi_symbol.append((order, path, row_group, min(row_group_symbols), max(row_group_symbols)))
+        # Merged files are sorted by symbol, so each of their row groups is read once for consecutive symbols
+        # and dropped once they are past it
+        cached = {}
+        for symbol in sorted(symbols):
+            parts = [(order, path, row_group, False) for order, path, row_group in single_symbol.pop(symbol, [])]
+            for order, path, row_group, first, last in multi_symbol:
+                if first <= symbol <= last:
+                    parts.append((order, path, row_group, True))
+                elif symbol > last:
+                    cached.pop((path, row_group), None)
+            tables = []
+            for _, path, row_group, spans_symbols in sorted(parts, key=lambda part: part[0]):
+                table = cached.get((path, row_group))
+                if table is None:
+                    with pq.ParquetFile(path, memory_map=True) as parquet_file:
+                        table = parquet_file.read_row_group(row_group).select(schema.names).cast(schema)
+                if spans_symbols:
+                    cached[(path, row_group)] = table
+                    table = table.filter(pc.equal(table["symbol"], symbol))
+                tables.append(table)
+            df = (pa.concat_tables(tables).to_pandas().drop_duplicates("datetime", keep="last")
+                  .sort_values("datetime", ignore_index=True))
+            yield pa.Table.from_pandas(df, schema=schema, preserve_index=False)
@@ -0,0 +1,226 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Store the quotes of all symbols in one table per interval instead of one table per symbol.
+Tables are declaratively range-partitioned by datetime (yearly for daily quotes, monthly for
+one-minute quotes) and optionally hash-sub-partitioned by symbol. Partitions are created on
+demand before rows are written to them.
+
+Existing per-symbol tables can be moved into the partitioned ones with:
+    python -m database.partitioning migrate [--interval daily|1min] [--drop]
+"""
+import argparse
+import copy
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+
+from config.log_config import logger
+from config.pipeline_config import PARTITION_HASH_MODULUS
+from database.connection import engine
+from database.model_registry import get_model_registry
+from utils.dafault_columns import default_daily, default_minutes
+
+if TYPE_CHECKING:
+    # Only needed for annotations, since UtilsDB reads from the partitioned tables
+    from database.utils_db import UtilsDB
+
+PARTITIONED_SCHEMA = "quotes"
+
+
+class PartitionedQuoteTable:
+    """Quote table of one interval for all symbols, range-partitioned by datetime."""
+
+    # Interval: (table name, columns, schema of the former per-symbol tables, range of every partition)
+    INTERVALS = {
+        "daily": ("daily", default_daily, "daily_quotes", "year"),
+        "1min": ("onemin", default_minutes, "onemin_quotes", "month"),
+    }
+
+    def __init__(self, interval: str, hash_modulus: int = PARTITION_HASH_MODULUS,
+                 schema_name: str = PARTITIONED_SCHEMA, db_engine: sqlalchemy.Engine = engine) -> None:
+        """Class initializer.
+
+        Args:
+            interval (str): "daily" or "1min".
+            hash_modulus (int, optional): Number of hash sub-partitions by symbol of every time range. 0 turns
+                                          sub-partitioning off. Only applies to partitions that do not exist
+                                          yet. Defaults to the STOCKS_PARTITION_HASH_MODULUS environment
+                                          variable (0).
+            schema_name (str, optional): Schema of the table. Defaults to "quotes".
+            db_engine (sqlalchemy.Engine, optional): Engine of the DB. Defaults to the application engine.
+        """
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Argument 'interval' must be one of these: {', '.join(self.INTERVALS)}.")
+        if hash_modulus < 0:
+            raise ValueError("Argument 'hash_modulus' cannot be negative.")
+        self.interval = interval
+        self.table_name, columns, self.legacy_schema, self.partition_range = self.INTERVALS[interval]
+        self.hash_modulus = hash_modulus
+        self.schema_name = schema_name
+        self.engine = db_engine
+        self.model = self._get_model(self.table_name, schema_name, columns)
+        self.table = self.model.__table__
+        self.preparer = postgresql.dialect().identifier_preparer
+        self.known_partitions: Set[str] = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _get_model(table_name: str, schema_name: str, columns: list) -> object:
+        """Model of the partitioned table. Models are only declared once per process."""
+        # deepcopy is needed so that no column is bound to two tables
+        return get_model_registry().get_model(
+            class_name=f"Partitioned_{schema_name}_{table_name}", model_name=table_name,
+            schema_name=schema_name, column_data=copy.deepcopy(columns),
+            table_kwargs={"postgresql_partition_by": "RANGE (datetime)"},
+        )
+
+    def create(self) -> None:
+        """Create the schema and the partitioned table, if they do not exist yet."""
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.text(f"CREATE SCHEMA IF NOT EXISTS {self.preparer.quote(self.schema_name)}"))
+            self.table.create(connection, checkfirst=True)
+        logger.info(f"Partitioned table '{self.table.fullname}' is ready.")
+
+    def partition_bounds(self, day: datetime) -> Tuple[str, datetime, datetime]:
+        """Name, lower bound (included) and upper bound (excluded) of the partition that holds {day}."""
+        if self.partition_range == "year":
+            start = datetime(day.year, 1, 1)
+            return f"{self.table_name}_{day.year}", start, datetime(day.year + 1, 1, 1)
+        start = datetime(day.year, day.month, 1)
+        end = datetime(day.year + day.month // 12, day.month % 12 + 1, 1)
+        return f"{self.table_name}_{day.year}_{day.month:02d}", start, end
+
+    def partitions_between(self, start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+        """Bounds of every partition between two datetimes, both included."""
+        partitions = []
+        day = start
+        while day <= end:
+            partitions.append(self.partition_bounds(day))
+            day = partitions[-1][2]
+        return partitions
+
+    def ensure_partitions(self, start: datetime, end: datetime) -> None:
+        """Create the partitions (and their hash sub-partitions) that cover {start} to {end}, if missing.
+           Partitions already ensured by this instance are not looked up again.
+        """
+        missing = [bounds for bounds in self.partitions_between(start, end) if bounds[0] not in self.known_partitions]
+        if not missing:
+            return
+        with self.lock, self.engine.begin() as connection:
+            for name, lower, upper in missing:
+                if name in self.known_partitions:
+                    continue
+                for statement in self._partition_ddl(name, lower, upper):
+                    connection.execute(sqlalchemy.text(statement))
+                self.known_partitions.add(name)
+        logger.debug(f"Partitions {', '.join(bounds[0] for bounds in missing)} of '{self.table.fullname}' are ready.")
+
+    def _partition_ddl(self, name: str, lower: datetime, upper: datetime) -> List[str]:
+        """Statements that create a range partition and its hash sub-partitions."""
+        partition = f"{self.preparer.quote(self.schema_name)}.{self.preparer.quote(name)}"
+        sub_partitioning = " PARTITION BY HASH (symbol)" if self.hash_modulus else ""
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {self.preparer.format_table(self.table)} "\
+            f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}'){sub_partitioning}"
+        ]
+        for remainder in range(self.hash_modulus):
+            sub_partition = f"{self.preparer.quote(self.schema_name)}.{self.preparer.quote(f'{name}_h{remainder}')}"
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {sub_partition} PARTITION OF {partition} "\
+                f"FOR VALUES WITH (MODULUS {self.hash_modulus}, REMAINDER {remainder})"
+            )
+        return statements
+
+    def insert_df(self, df: pd.DataFrame, utils_db: "UtilsDB", **kwargs) -> Optional[Dict[str, int]]:
+        """Create the partitions that {df} needs and insert it with 'UtilsDB.insert_df_in_db'.
+
+        Args:
+            df (pd.DataFrame): Quotes of any number of symbols.
+            utils_db (UtilsDB): Writer of the rows.
+            **kwargs: Passed on to 'UtilsDB.insert_df_in_db'.
+
+        Returns:
+            Dict[str, int]: Number of rows that were inserted, updated and skipped. None if {df} is empty.
+        """
+        if df.empty:
+            return None
+        datetimes = pd.to_datetime(df["datetime"])
+        if datetimes.dt.tz is not None:
+            # Quotes are stored in exchange wall time, without timezone
+            datetimes = datetimes.dt.tz_localize(None)
+        self.ensure_partitions(datetimes.min().to_pydatetime(), datetimes.max().to_pydatetime())
+        return utils_db.insert_df_in_db(df, self.model, **kwargs)
+
+    def get_watermarks(self, column: str = "datetime") -> Dict[str, datetime]:
+        """Latest value of {column} stored for every symbol."""
+        query = sqlalchemy.select(self.table.c.symbol, sqlalchemy.func.max(self.table.c[column])).group_by(self.table.c.symbol)
+        with self.engine.connect() as connection:
+            return {symbol: watermark for symbol, watermark in connection.execute(query)}
+
+    def migrate(self, drop: bool = False) -> Dict[str, int]:
+        """Move the rows of every per-symbol table of this interval into the partitioned table. Each table is
+           copied in its own transaction with INSERT ... SELECT, so a failure only affects that table, and
+           rows that were already migrated are skipped.
+
+        Args:
+            drop (bool, optional): Drop every per-symbol table once its rows have been moved. Defaults to False.
+
+        Returns:
+            Dict[str, int]: Number of rows moved from each per-symbol table.
+        """
+        self.create()
+        insp = sqlalchemy.inspect(self.engine)
+        if not insp.has_schema(self.legacy_schema):
+            logger.info(f"No schema '{self.legacy_schema}' to migrate.")
+            return {}
+        moved = {}
+        column_names = [column.name for column in self.table.columns]
+        for legacy_name in insp.get_table_names(schema=self.legacy_schema):
+            legacy = sqlalchemy.Table(legacy_name, sqlalchemy.MetaData(), schema=self.legacy_schema,
+                                      autoload_with=self.engine)
+            shared_columns = [name for name in column_names if name in legacy.c]
+            try:
+                with self.engine.connect() as connection:
+                    start, end = connection.execute(sqlalchemy.select(sqlalchemy.func.min(legacy.c.datetime),
+                                                                      sqlalchemy.func.max(legacy.c.datetime))).one()
+                if start is not None:
+                    self.ensure_partitions(start, end)
+                statement = postgresql.insert(self.table).from_select(
+                    shared_columns, sqlalchemy.select(*[legacy.c[name] for name in shared_columns])
+                ).on_conflict_do_nothing()
+                with self.engine.begin() as connection:
+                    moved[legacy_name] = connection.execute(statement).rowcount
+                    if drop:
+                        legacy.drop(connection)
+                logger.info(f"Moved {moved[legacy_name]} rows from '{legacy.fullname}' into '{self.table.fullname}'.")
+            except Exception as e:
+                logger.error(f"Could not migrate table '{legacy.fullname}': {e}")
+        return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the partitioned quote tables.")
+    parser.add_argument("command", choices=["create", "migrate"],
+                        help="'create' the partitioned tables, or 'migrate' the per-symbol tables into them.")
+    parser.add_argument("--interval", choices=list(PartitionedQuoteTable.INTERVALS), action="append",
+                        help="Interval to handle. Can be repeated. Defaults to all of them.")
+    parser.add_argument("--hash-modulus", type=int, default=PARTITION_HASH_MODULUS,
+                        help="Number of hash sub-partitions by symbol of every new time range.")
+    parser.add_argument("--drop", action="store_true", help="Drop the per-symbol tables once migrated.")
+    args = parser.parse_args()
+    for interval in args.interval or list(PartitionedQuoteTable.INTERVALS):
+        partitioned_table = PartitionedQuoteTable(interval, hash_modulus=args.hash_modulus)
+        if args.command == "create":
+            partitioned_table.create()
+        else:
+            moved = partitioned_table.migrate(drop=args.drop)
+            logger.info(f"Migrated {sum(moved.values())} {interval} rows from {len(moved)} tables.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Read stored quotes back from the DB. Rows are streamed through a server-side cursor and turned
+into typed columns one chunk at a time, so memory does not hold every row as Python objects at
+once. Loaded quotes are kept in a process-wide LRU cache, so repeated reads for training and
+backtests are served from memory.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterator, List, Optional
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import Boolean, Float, Integer
+
+from config.log_config import logger
+from config.pipeline_config import QUOTE_CACHE_MAX_ROWS
+
+
+def column_dtypes(columns: List[sqlalchemy.Column]) -> Dict[str, str]:
+    """Pandas dtype of every numeric column. Datetimes are typed by pandas itself, with their timezone."""
+    dtypes = {}
+    for column in columns:
+        if isinstance(column.type, Float):
+            dtypes[column.name] = "float64"
+        elif isinstance(column.type, Integer):
+            # Nullable, so that missing values do not turn the column into floats
+            dtypes[column.name] = "Int64"
+        elif isinstance(column.type, Boolean):
+            dtypes[column.name] = "boolean"
+    return dtypes
+
+
+def empty_frame(columns: List[sqlalchemy.Column]) -> pd.DataFrame:
+    """Dataframe without rows, with one typed column per table column."""
+    dtypes = column_dtypes(columns)
+    return pd.DataFrame({column.name: pd.Series(dtype=dtypes.get(column.name, "object")) for column in columns})
+
+
+def iter_frames(connection: sqlalchemy.Connection, query: sqlalchemy.Select, columns: List[sqlalchemy.Column],
+                chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+    """Run {query} on a server-side cursor and yield its rows as typed dataframes of {chunk_size} rows at most.
+
+    Args:
+        connection (sqlalchemy.Connection): Connection to run the query on.
+        query (sqlalchemy.Select): Query to run. Its selected columns must be {columns}.
+        columns (List[sqlalchemy.Column]): Table columns selected by the query, which give the dtypes.
+        chunk_size (int, optional): Number of rows fetched and converted at a time. Defaults to 50_000.
+
+    Yields:
+        pd.DataFrame: Next rows of the query, with one typed column per selected column.
+    """
+    names = [column.name for column in columns]
+    dtypes = column_dtypes(columns)
+    result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(query)
+    for rows in result.partitions(chunk_size):
+        yield pd.DataFrame.from_records(rows, columns=names, coerce_float=True).astype(dtypes)
+
+
+def stream_frame(connection: sqlalchemy.Connection, query: sqlalchemy.Select, columns: List[sqlalchemy.Column],
+                 chunk_size: int = 50_000) -> pd.DataFrame:
+    """Run {query} on a server-side cursor and build a dataframe from its rows, {chunk_size} at a time.
+       See 'iter_frames'.
+
+    Returns:
+        pd.DataFrame: Rows of the query, with one typed column per selected column.
+    """
+    chunks = list(iter_frames(connection, query, columns, chunk_size))
+    if not chunks:
+        return empty_frame(columns)
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+class QuoteCache:
+    """Least-recently-used cache of loaded quotes, bounded by the total number of rows it holds.
+       Keys start with the full name of the table the rows were read from, so that every entry of
+       a table can be dropped once new rows are written to it.
+    """
+
+    def __init__(self, max_rows: int = QUOTE_CACHE_MAX_ROWS) -> None:
+        self.max_rows = max_rows
+        self.entries: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """Copy of a cached dataframe, or None if it is not cached."""
+        with self.lock:
+            df = self.entries.get(key)
+            if df is None:
+                return None
+            self.entries.move_to_end(key)
+        return df.copy()
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> None:
+        """Cache a copy of {df}, evicting the least recently used entries beyond {max_rows} rows."""
+        if len(df) > self.max_rows:
+            return
+        df = df.copy()
+        with self.lock:
+            if key in self.entries:
+                self.rows -= len(self.entries.pop(key))
+            self.entries[key] = df
+            self.rows += len(df)
+            while self.rows > self.max_rows:
+                _, evicted = self.entries.popitem(last=False)
+                self.rows -= len(evicted)
+
+    def invalidate(self, table_name: str) -> None:
+        """Drop every entry read from the table {table_name}."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == table_name]:
+                self.rows -= len(self.entries.pop(key))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.rows = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_quote_cache() -> QuoteCache:
+    """Return the process-wide quote cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QuoteCache()
+            logger.debug(f"Quote cache holds up to {_cache.max_rows} rows.")
+        return _cache
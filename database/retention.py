@@ -0,0 +1,205 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Keep the one-minute quote tables small. One-minute quotes older than a given age are copied
+into the compressed Parquet archive (see 'ParquetMirror') and then removed from the DB: rows
+are deleted from the per-symbol tables, and whole monthly partitions are dropped from the
+partitioned table once all their rows are past the cutoff. 'load_intraday_history' stitches
+the archive and the DB back together for historical queries.
+
+The job runs at the end of every ingestion when STOCKS_INTRADAY_RETENTION_DAYS is set, or with:
+    python -m database.retention --max-age-days 90
+"""
+import argparse
+import copy
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+import sqlalchemy
+
+from config.log_config import logger
+from config.pipeline_config import ARCHIVE_PATH, INTRADAY_RETENTION_DAYS, STORAGE_LAYOUT
+from database.parquet_mirror import ParquetMirror
+from database.partitioning import PartitionedQuoteTable
+from database.quote_reader import get_quote_cache, iter_frames
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_minutes
+
+
+class RetentionJob:
+    """Move one-minute quotes older than {max_age_days} days from the DB into the Parquet archive."""
+
+    def __init__(self, utils_db: UtilsDB, max_age_days: int = INTRADAY_RETENTION_DAYS,
+                 archive: Optional[ParquetMirror] = None, storage_layout: str = STORAGE_LAYOUT,
+                 chunk_size: int = 100_000) -> None:
+        """Class initializer.
+
+        Args:
+            utils_db (UtilsDB): Access to the DB.
+            max_age_days (int, optional): Age in days from which one-minute quotes are archived. Defaults to the
+                                          STOCKS_INTRADAY_RETENTION_DAYS environment variable.
+            archive (ParquetMirror, optional): Archive of the old quotes. Defaults to a Parquet dataset in the
+                                               STOCKS_ARCHIVE_PATH environment variable.
+            storage_layout (str, optional): "per_symbol" or "partitioned". Defaults to the
+                                            STOCKS_STORAGE_LAYOUT environment variable ("per_symbol").
+            chunk_size (int, optional): Rows read from the DB and archived at a time. Defaults to 100_000.
+        """
+        if max_age_days < 1:
+            raise ValueError("Argument 'max_age_days' must be higher than 0.")
+        self.utils_db = utils_db
+        self.max_age_days = max_age_days
+        self.archive = archive if archive is not None else ParquetMirror(ARCHIVE_PATH)
+        self.storage_layout = storage_layout
+        self.chunk_size = chunk_size
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """Midnight of the oldest day whose quotes are kept in the DB."""
+        now = now if now is not None else datetime.now()
+        return datetime(now.year, now.month, now.day) - timedelta(days=self.max_age_days)
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Archive and remove every one-minute quote older than the cutoff.
+
+        Args:
+            now (datetime, optional): Moment the cutoff is computed from. Defaults to None (now).
+
+        Returns:
+            Dict[str, int]: Number of rows archived from every table or partition.
+        """
+        cutoff = self.cutoff(now)
+        logger.info(f"Archiving one-minute quotes older than {cutoff:%Y-%m-%d} into '{self.archive.root}'.")
+        if self.storage_layout == "partitioned":
+            archived = self._archive_partitions(cutoff)
+        else:
+            archived = self._archive_tables(cutoff)
+        if archived:
+            self.archive.compact("1min")
+        logger.info(f"Archived {sum(archived.values())} one-minute quotes from {len(archived)} tables.")
+        return archived
+
+    def _archive_rows(self, table: sqlalchemy.Table, condition: sqlalchemy.ColumnElement) -> Tuple[int, Optional[datetime]]:
+        """Copy the rows of {table} that meet {condition} into the archive.
+
+        Returns:
+            Tuple[int, Optional[datetime]]: Number of archived rows and latest archived datetime.
+        """
+        rows, latest = 0, None
+        query = sqlalchemy.select(table).where(condition).order_by(table.c.datetime)
+        with self.utils_db.engine.connect() as connection:
+            for chunk in iter_frames(connection, query, list(table.columns), self.chunk_size):
+                self.archive.append(chunk, "1min")
+                rows += len(chunk)
+                latest = chunk["datetime"].iloc[-1].to_pydatetime()
+        return rows, latest
+
+    def _archive_tables(self, cutoff: datetime) -> Dict[str, int]:
+        """Archive the old rows of every per-symbol table, then delete them."""
+        archived = {}
+        registry = self.utils_db.registry
+        for table_name in registry.table_names("onemin_quotes"):
+            # deepcopy is needed so that no column is affected by previous tables
+            table = registry.get_model(table_name, table_name, "onemin_quotes", copy.deepcopy(default_minutes)).__table__
+            try:
+                rows, latest = self._archive_rows(table, table.c.datetime < cutoff)
+                if not rows:
+                    continue
+                # Only rows that made it into the archive are deleted
+                with self.utils_db.engine.begin() as connection:
+                    connection.execute(sqlalchemy.delete(table).where(table.c.datetime <= latest))
+                archived[table_name] = rows
+                get_quote_cache().invalidate(table.fullname)
+            except Exception as e:
+                logger.error(f"Could not archive old quotes of table '{table.fullname}': {e}")
+        return archived
+
+    def _archive_partitions(self, cutoff: datetime) -> Dict[str, int]:
+        """Archive every monthly partition that ends before the cutoff, then drop it."""
+        archived = {}
+        quote_table = PartitionedQuoteTable("1min", db_engine=self.utils_db.engine)
+        table = quote_table.table
+        for name, lower, upper in self.partitions(quote_table):
+            if upper > cutoff:
+                continue
+            try:
+                archived[name], _ = self._archive_rows(table, (table.c.datetime >= lower) & (table.c.datetime < upper))
+                with self.utils_db.engine.begin() as connection:
+                    connection.execute(sqlalchemy.text(
+                        f"DROP TABLE {quote_table.preparer.quote(table.schema)}.{quote_table.preparer.quote(name)}"
+                    ))
+                quote_table.known_partitions.discard(name)
+                logger.info(f"Partition '{name}' of '{table.fullname}' archived and dropped.")
+            except Exception as e:
+                logger.error(f"Could not archive partition '{name}' of '{table.fullname}': {e}")
+        get_quote_cache().invalidate(table.fullname)
+        return archived
+
+    def partitions(self, quote_table: PartitionedQuoteTable) -> List[tuple]:
+        """Name and bounds of every existing time range partition of {quote_table}, oldest first."""
+        query = sqlalchemy.text(
+            "SELECT child.relname FROM pg_catalog.pg_inherits AS inheritance "\
+            "JOIN pg_catalog.pg_class AS child ON inheritance.inhrelid = child.oid "\
+            "JOIN pg_catalog.pg_class AS parent ON inheritance.inhparent = parent.oid "\
+            "JOIN pg_catalog.pg_namespace AS namespace ON parent.relnamespace = namespace.oid "\
+            "WHERE namespace.nspname = :schema_name AND parent.relname = :table_name"
+        )
+        with self.utils_db.engine.connect() as connection:
+            names = connection.execute(query, {"schema_name": quote_table.schema_name,
+                                               "table_name": quote_table.table_name}).scalars().all()
+        pattern = re.compile(rf"^{re.escape(quote_table.table_name)}_(\d{{4}})_(\d{{2}})$")
+        partitions = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                partitions.append(quote_table.partition_bounds(datetime(int(match[1]), int(match[2]), 1)))
+        return sorted(partitions, key=lambda bounds: bounds[1])
+
+
+def load_intraday_history(symbols: Union[str, List[str]], start: Optional[datetime] = None,
+                          end: Optional[datetime] = None, columns: Optional[List[str]] = None,
+                          utils_db: Optional[UtilsDB] = None, archive: Optional[ParquetMirror] = None,
+                          storage_layout: str = STORAGE_LAYOUT) -> pd.DataFrame:
+    """Load one-minute quotes from both the archive and the DB, as if they had never been split.
+
+    Args:
+        symbols (Union[str, List[str]]): Symbol or symbols to load.
+        start (datetime, optional): Earliest datetime to load, included. Defaults to None (no minimum).
+        end (datetime, optional): Latest datetime to load, excluded. Defaults to None (no maximum).
+        columns (List[str], optional): Quote columns to load. 'datetime' and 'symbol' are always loaded.
+                                       Defaults to None, which loads every column.
+        utils_db (UtilsDB, optional): Reader of the DB. Defaults to a new UtilsDB.
+        archive (ParquetMirror, optional): Reader of the archive. Defaults to a Parquet dataset in the
+                                           STOCKS_ARCHIVE_PATH environment variable.
+        storage_layout (str, optional): "per_symbol" or "partitioned". Defaults to the STOCKS_STORAGE_LAYOUT
+                                        environment variable ("per_symbol").
+
+    Returns:
+        pd.DataFrame: Quotes sorted by symbol and datetime. Quotes found in both come from the DB.
+    """
+    utils_db = utils_db if utils_db is not None else UtilsDB()
+    archive = archive if archive is not None else ParquetMirror(ARCHIVE_PATH)
+    archived = archive.read("1min", symbols, start, end, columns)
+    live = utils_db.load_quotes(symbols, "1min", start, end, columns, storage_layout=storage_layout)
+    if archived.empty:
+        return live
+    if live.empty:
+        return archived
+    archived["datetime"] = archived["datetime"].astype(live["datetime"].dtype)
+    return (pd.concat([archived, live], ignore_index=True)
+            .drop_duplicates(["symbol", "datetime"], keep="last")
+            .sort_values(["symbol", "datetime"], ignore_index=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move old one-minute quotes from the DB into the Parquet archive.")
+    parser.add_argument("--max-age-days", type=int, default=INTRADAY_RETENTION_DAYS,
+                        help="Age in days from which one-minute quotes are archived.")
+    parser.add_argument("--storage-layout", choices=["per_symbol", "partitioned"], default=STORAGE_LAYOUT,
+                        help="Layout of the one-minute quote tables.")
+    args = parser.parse_args()
+    RetentionJob(UtilsDB(), max_age_days=args.max_age_days, storage_layout=args.storage_layout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Roll one-minute quotes up into coarser OHLCV bars (5 minutes, 15 minutes, 1 hour and 1 day),
+stored in one table per resolution for all symbols. Rollups are incremental: a watermark per
+symbol records the last minute already rolled up, so every update only reads the minutes of the
+buckets that received new quotes, and those buckets are upserted.
+"""
+import copy
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+import sqlalchemy
+
+from config.log_config import logger
+from config.pipeline_config import ROLLUP_RESOLUTIONS, STORAGE_LAYOUT
+from database.model_registry import get_model_registry
+from database.quote_reader import stream_frame
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_bars, default_rollup_watermarks
+
+ROLLUP_SCHEMA = "rollups"
+
+# Length of the buckets of every resolution. Buckets start at multiples of it, in exchange wall time
+RESOLUTIONS = {
+    "5min": pd.Timedelta(minutes=5),
+    "15min": pd.Timedelta(minutes=15),
+    "1h": pd.Timedelta(hours=1),
+    "1d": pd.Timedelta(days=1),
+}
+
+
+def rollup_bars(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """Aggregate one-minute quotes into bars of {resolution}: first open, highest high, lowest low, last
+       close and total volume of every symbol and bucket, plus the number of minutes in the bucket.
+
+    Args:
+        df (pd.DataFrame): One-minute quotes of any number of symbols.
+        resolution (str): One of "5min", "15min", "1h" or "1d".
+
+    Returns:
+        pd.DataFrame: One bar per symbol and bucket, with the start of the bucket as 'datetime'.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Argument 'resolution' must be one of these: {', '.join(RESOLUTIONS)}.")
+    df = df.sort_values(["symbol", "datetime"])
+    buckets = df["datetime"].dt.floor(RESOLUTIONS[resolution])
+    bars = df.groupby([df["symbol"], buckets], sort=True).agg(
+        open=("open", "first"), high=("high", "max"), low=("low", "min"), close=("close", "last"),
+        volume=("volume", "sum"), minutes=("datetime", "size"),
+    )
+    return bars.reset_index()
+
+
+class RollupEngine:
+    """Incremental rollups of the one-minute quotes of every symbol into bars of several resolutions.
+
+       Usage:
+           rollups = RollupEngine(utils_db)
+           rollups.create()
+           rollups.update(["AAPL", "MSFT"])
+           bars = rollups.read("AAPL", "15min", start="2023-11-16")
+    """
+
+    def __init__(self, utils_db: UtilsDB, resolutions: List[str] = ROLLUP_RESOLUTIONS,
+                 storage_layout: str = STORAGE_LAYOUT, schema_name: str = ROLLUP_SCHEMA) -> None:
+        """Class initializer.
+
+        Args:
+            utils_db (UtilsDB): Reader of the one-minute quotes and writer of the bars.
+            resolutions (List[str], optional): Resolutions to roll up. Defaults to the STOCKS_ROLLUP_RESOLUTIONS
+                                               environment variable ("5min,15min,1h,1d").
+            storage_layout (str, optional): Layout of the one-minute quotes, "per_symbol" or "partitioned".
+                                            Defaults to the STOCKS_STORAGE_LAYOUT environment variable.
+            schema_name (str, optional): Schema of the bar tables. Defaults to "rollups".
+        """
+        unknown = [resolution for resolution in resolutions if resolution not in RESOLUTIONS]
+        if unknown:
+            raise ValueError(f"Unknown resolutions {', '.join(unknown)}. Accepted: {', '.join(RESOLUTIONS)}.")
+        self.utils_db = utils_db
+        self.resolutions = list(resolutions)
+        self.storage_layout = storage_layout
+        self.schema_name = schema_name
+        registry = get_model_registry()
+        # deepcopy is needed so that no column is affected by previous tables
+        self.models = {
+            resolution: registry.get_model(f"Bars_{schema_name}_{resolution}", f"bars_{resolution}", schema_name,
+                                           copy.deepcopy(default_bars))
+            for resolution in self.resolutions
+        }
+        self.watermark_model = registry.get_model(f"Watermarks_{schema_name}", "watermarks", schema_name,
+                                                  copy.deepcopy(default_rollup_watermarks))
+        self.watermarks: Dict[str, datetime] = {}
+        self.lock = threading.Lock()
+
+    def create(self) -> None:
+        """Create the schema and the tables of the bars and watermarks, if missing, and load the watermarks."""
+        with self.utils_db.engine.begin() as connection:
+            self.utils_db.backend.create_schema(connection, self.schema_name)
+        self.utils_db.create_missing_models(list(self.models.values()) + [self.watermark_model])
+        self.load_watermarks()
+
+    def load_watermarks(self) -> None:
+        """Read the last minute already rolled up for every symbol."""
+        table = self.watermark_model.__table__
+        with self.utils_db.engine.connect() as connection:
+            watermarks = {symbol: last_minute for symbol, last_minute in connection.execute(sqlalchemy.select(table))}
+        with self.lock:
+            self.watermarks = watermarks
+
+    def on_insert(self, df: pd.DataFrame) -> None:
+        """Roll up the symbols of freshly inserted one-minute quotes. Meant as an 'after_write' hook."""
+        self.update(df["symbol"].unique())
+
+    def update(self, symbols: Iterable[str]) -> Dict[str, int]:
+        """Roll up the one-minute quotes stored after the watermark of every symbol.
+
+        Args:
+            symbols (Iterable[str]): Symbols to roll up.
+
+        Returns:
+            Dict[str, int]: Number of new minutes rolled up for every symbol.
+        """
+        rolled_up = {}
+        for symbol in symbols:
+            try:
+                rolled_up[symbol] = self._update_symbol(symbol)
+            except Exception as e:
+                logger.error(f"Could not roll up quotes of symbol {symbol}: {e}")
+        return rolled_up
+
+    def _update_symbol(self, symbol: str) -> int:
+        with self.lock:
+            watermark = self.watermarks.get(symbol)
+        # Buckets that already hold some rolled up minutes are recomputed from their first minute
+        start = None
+        if watermark is not None:
+            start = min(pd.Timestamp(watermark).floor(RESOLUTIONS[resolution]) for resolution in self.resolutions)
+        minutes = self.utils_db.load_quotes(symbol, "1min", start=start, storage_layout=self.storage_layout,
+                                            columns=["open", "high", "low", "close", "volume"], use_cache=False)
+        if watermark is not None:
+            new_minutes = int((minutes["datetime"] > watermark).sum())
+        else:
+            new_minutes = len(minutes)
+        if not new_minutes:
+            return 0
+        for resolution in self.resolutions:
+            rows = minutes
+            if watermark is not None:
+                rows = minutes[minutes["datetime"] >= pd.Timestamp(watermark).floor(RESOLUTIONS[resolution])]
+            self._write(rollup_bars(rows, resolution), self.models[resolution])
+        # The watermark only moves once the bars of every resolution are stored, so failed buckets are retried
+        last_minute = minutes["datetime"].max().to_pydatetime()
+        self._write(pd.DataFrame({"symbol": [symbol], "last_minute": [last_minute]}), self.watermark_model)
+        with self.lock:
+            self.watermarks[symbol] = last_minute
+        logger.debug(f"Rolled up {new_minutes} new minutes of {symbol} into {', '.join(self.resolutions)} bars.")
+        return new_minutes
+
+    def _write(self, df: pd.DataFrame, model: object) -> None:
+        """Upsert {df} into {model}, raising if any of its rows could not be written."""
+        counts = self.utils_db.insert_df_in_db(df, model, on_conflict="update", raise_on_error=True)
+        if counts["skipped"]:
+            raise RuntimeError(f"{counts['skipped']} rows could not be written into table '{model.__tablename__}'.")
+
+    def read(self, symbols: Union[str, List[str]], resolution: str, start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> pd.DataFrame:
+        """Read the bars of {resolution} of one or several symbols.
+
+        Args:
+            symbols (Union[str, List[str]]): Symbol or symbols to read.
+            resolution (str): One of the resolutions rolled up.
+            start (datetime, optional): Earliest bucket to read, included. Defaults to None (no minimum).
+            end (datetime, optional): Latest bucket to read, excluded. Defaults to None (no maximum).
+
+        Returns:
+            pd.DataFrame: Bars sorted by symbol and datetime.
+        """
+        if resolution not in self.models:
+            raise ValueError(f"Argument 'resolution' must be one of these: {', '.join(self.models)}.")
+        table = self.models[resolution].__table__
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        query = sqlalchemy.select(table).where(table.c.symbol.in_(symbols))
+        if start is not None:
+            query = query.where(table.c.datetime >= pd.Timestamp(start).to_pydatetime())
+        if end is not None:
+            query = query.where(table.c.datetime < pd.Timestamp(end).to_pydatetime())
+        with self.utils_db.engine.connect() as connection:
+            return stream_frame(connection, query.order_by(table.c.symbol, table.c.datetime), list(table.columns))
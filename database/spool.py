@@ -0,0 +1,244 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Write-ahead spool between the fetch workers and the DB. Fetched data is appended to segment
+files on local disk, as length-prefixed and checksummed records of zlib-compressed pickles, so
+appending never waits for the DB. Drainers replay sealed segments into the DB and only delete a
+segment once every one of its records has been written. Delivery is at-least-once: a segment
+that failed, or that was being drained when the process stopped, is replayed as a whole, which
+the conflict handling of the writes makes harmless.
+"""
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+from config.log_config import logger
+from config.pipeline_config import (SPOOL_DRAINERS, SPOOL_PATH, SPOOL_SEGMENT_BYTES, SPOOL_SEGMENT_SECONDS,
+                                    UPSTREAM_MAX_RETRIES)
+from src.data_extractor.resilience import backoff_delay
+
+# Length and CRC-32 of the compressed payload of every record
+RECORD_HEADER = struct.Struct(">II")
+
+
+class WriteAheadSpool:
+    """Append-only segment files in {path}. Records go to the active segment, which is sealed once it
+       holds {segment_bytes} bytes or is {segment_seconds} seconds old. Segments left by a previous
+       process are sealed too, so they are drained first.
+    """
+
+    SUFFIX = ".spool"
+
+    def __init__(self, path: Union[str, Path] = SPOOL_PATH, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 segment_seconds: float = SPOOL_SEGMENT_SECONDS, fsync: bool = True) -> None:
+        """Class initializer.
+
+        Args:
+            path (Union[str, Path], optional): Directory of the segments. Defaults to the STOCKS_SPOOL_PATH
+                                               environment variable.
+            segment_bytes (int, optional): Size from which the active segment is sealed. Defaults to the
+                                           STOCKS_SPOOL_SEGMENT_BYTES environment variable (64 MiB).
+            segment_seconds (float, optional): Age from which the active segment is sealed. Defaults to the
+                                               STOCKS_SPOOL_SEGMENT_SECONDS environment variable (5).
+            fsync (bool, optional): Flush every record to disk before 'append' returns. Defaults to True.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        existing = self.segments()
+        self.next_sequence = int(existing[-1].stem) + 1 if existing else 0
+        self.active = None
+        self.active_path = None
+        self.active_since = 0.0
+        self.lock = threading.Lock()
+        if existing:
+            logger.warning(f"{len(existing)} spool segments were left in '{self.path}'. They will be replayed.")
+
+    def segments(self) -> List[Path]:
+        """Every segment on disk, oldest first."""
+        return sorted(self.path.glob(f"*{self.SUFFIX}"))
+
+    def sealed_segments(self) -> List[Path]:
+        """Segments that are not being appended to anymore, oldest first."""
+        with self.lock:
+            return [segment for segment in self.segments() if segment != self.active_path]
+
+    def append(self, record: Any) -> None:
+        """Append a record to the active segment, opening a new one if needed."""
+        payload = zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            if self.active is None:
+                self.active_path = self.path / f"{self.next_sequence:012d}{self.SUFFIX}"
+                self.next_sequence += 1
+                self.active = open(self.active_path, "ab")
+                self.active_since = time.monotonic()
+            self.active.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.active.flush()
+            if self.fsync:
+                os.fsync(self.active.fileno())
+            if self.active.tell() >= self.segment_bytes:
+                self._seal()
+
+    def seal(self, force: bool = False) -> None:
+        """Seal the active segment if it is old enough, or whatever its age if {force}."""
+        with self.lock:
+            if self.active is not None and (force or time.monotonic() - self.active_since >= self.segment_seconds):
+                self._seal()
+
+    def _seal(self) -> None:
+        self.active.close()
+        self.active = None
+        self.active_path = None
+
+    def close(self) -> None:
+        """Seal the active segment. Records are kept on disk until they are drained."""
+        self.seal(force=True)
+
+    @staticmethod
+    def read_segment(segment: Path) -> Iterator[Any]:
+        """Records of a segment, in the order they were appended. A record cut short or corrupted by a crash
+           ends the segment, since nothing after it was acknowledged.
+        """
+        with open(segment, "rb") as file:
+            while True:
+                header = file.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                if len(header) < RECORD_HEADER.size:
+                    logger.warning(f"Spool segment '{segment.name}' ends with a torn record header.")
+                    return
+                length, checksum = RECORD_HEADER.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    logger.warning(f"Spool segment '{segment.name}' ends with a torn or corrupted record.")
+                    return
+                yield pickle.loads(zlib.decompress(payload))
+
+
+class SpoolDrainer:
+    """Threads that replay sealed segments through {handler}, one segment per thread at a time.
+       {handler} writes a record and returns the futures of the writes it queued, if any; a segment is
+       deleted once every record has been handled and all those futures have succeeded. A failed
+       segment is retried with exponential backoff.
+    """
+
+    def __init__(self, spool: WriteAheadSpool, handler: Callable[[Any], Optional[List[Future]]],
+                 n_drainers: int = SPOOL_DRAINERS, poll_seconds: float = 0.5,
+                 max_retries: int = UPSTREAM_MAX_RETRIES) -> None:
+        """Class initializer.
+
+        Args:
+            spool (WriteAheadSpool): Spool to drain.
+            handler (Callable[[Any], Optional[List[Future]]]): Writes a record into the DB.
+            n_drainers (int, optional): Number of drainer threads. Defaults to the STOCKS_SPOOL_DRAINERS
+                                        environment variable (2).
+            poll_seconds (float, optional): Wait between looks for sealed segments. Defaults to 0.5.
+            max_retries (int, optional): Retries of a failed segment while stopping. Segments that still fail
+                                         stay on disk for the next run. Defaults to the
+                                         STOCKS_UPSTREAM_MAX_RETRIES environment variable (3).
+        """
+        if n_drainers < 1:
+            raise ValueError("Argument 'n_drainers' must be higher than 0.")
+        self.spool = spool
+        self.handler = handler
+        self.n_drainers = n_drainers
+        self.poll_seconds = poll_seconds
+        self.max_retries = max_retries
+        self.claimed = set()
+        self.failures = {}
+        self.drained_records = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def __enter__(self) -> "SpoolDrainer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Start the drainer threads."""
+        self.threads = [threading.Thread(target=self._run, name=f"spool-drainer-{n}") for n in range(self.n_drainers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Seal the active segment and wait until every segment has been drained, or has failed
+           {max_retries} times in a row."""
+        self.spool.close()
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        left = self.spool.segments()
+        if left:
+            logger.error(f"{len(left)} spool segments could not be drained. They are kept in '{self.spool.path}'.")
+        logger.info(f"Spool drainers replayed {self.drained_records} records.")
+
+    def _claim(self) -> Optional[Path]:
+        """Oldest sealed segment that no other drainer handles and is not waiting for a retry."""
+        now = time.monotonic()
+        with self.lock:
+            for segment in self.spool.sealed_segments():
+                attempts, retry_at = self.failures.get(segment, (0, 0.0))
+                if segment in self.claimed or retry_at > now:
+                    continue
+                if self.stopping.is_set() and attempts > self.max_retries:
+                    continue
+                self.claimed.add(segment)
+                return segment
+        return None
+
+    def _pending(self) -> bool:
+        """Whether a segment may still be drained before stopping."""
+        with self.lock:
+            return any(self.failures.get(segment, (0, 0.0))[0] <= self.max_retries or segment in self.claimed
+                       for segment in self.spool.sealed_segments())
+
+    def _run(self) -> None:
+        while True:
+            self.spool.seal()
+            segment = self._claim()
+            if segment is None:
+                if self.stopping.is_set() and not self._pending():
+                    return
+                time.sleep(self.poll_seconds)
+                continue
+            try:
+                self.drain(segment)
+            finally:
+                with self.lock:
+                    self.claimed.discard(segment)
+
+    def drain(self, segment: Path) -> bool:
+        """Replay every record of a segment, then delete it. Returns whether it was drained."""
+        try:
+            futures = []
+            records = 0
+            for record in WriteAheadSpool.read_segment(segment):
+                futures.extend(self.handler(record) or [])
+                records += 1
+            for future in futures:
+                future.result()
+        except Exception as e:
+            with self.lock:
+                attempts = self.failures.get(segment, (0, 0.0))[0] + 1
+                self.failures[segment] = (attempts, time.monotonic() + backoff_delay(attempts - 1))
+            logger.error(f"Could not drain spool segment '{segment.name}' (attempt {attempts}): {e}")
+            return False
+        segment.unlink()
+        with self.lock:
+            self.failures.pop(segment, None)
+            self.drained_records += records
+        logger.debug(f"Spool segment '{segment.name}' drained ({records} records).")
+        return True
@@ -1,22 +1,36 @@
+import copy
 import inspect
-from typing import List, Any, Union
+from typing import Dict, List, Any, Optional, Union
 from config.log_config import logger 
 import math
 
 import sqlalchemy 
 import pandas as pd
-from database.connection import engine
+import psycopg2
+from config.pipeline_config import DB_WRITE_METHOD, DB_COPY_FORMAT, DB_ON_CONFLICT, STORAGE_LAYOUT
+from database.connection import backend, engine
+from database.copy_loader import CONFLICT_POLICIES, copy_columns, copy_df, to_wall_time, upsert_df
 from database import models
-from database.models import create_dynamic_model
-from database.connection import SessionLocal
+from database.model_registry import get_model_registry
+from database.partitioning import PartitionedQuoteTable
+from database.quote_reader import empty_frame, get_quote_cache, stream_frame
+from utils.dafault_columns import default_daily, default_minutes
 
 
 class UtilsDB:
+
+    WRITE_METHODS = ["orm", "copy"]
+    # Interval: (schema, columns) of the per-symbol quote tables, named '<symbol>_<interval>'
+    QUOTE_TABLES = {"daily": ("daily_quotes", default_daily), "1min": ("onemin_quotes", default_minutes)}
+
     def __init__(self) -> None:
         self.engine = engine
-        self.dbsession = SessionLocal()
+        self.backend = backend
+        self.session_timezone = None
+        self.registry = get_model_registry()
 
-    def create_specific_model(self, class_name: str, model_name: str, schema_name: str, column_data: dict) -> object:
+    def create_specific_model(self, class_name: str, model_name: str, schema_name: str, column_data: dict,
+                              check_exists: bool = True) -> object:
         """Create specific model inside specific schema.
 
         Args:
@@ -28,31 +42,35 @@ class UtilsDB:
                                                         'col2': Column(type, ...), 
                                                         'col3': Column(type, ...),
                                                          ...}
+            check_exists (bool, optional): Create the table if it is missing. Can be turned off to create many
+                                           tables at once afterwards with 'create_missing_models'.
+                                           Defaults to True.
 
         Returns:
             object: Returns model class.
         """
-            # Define the attributes for the class
-        model_class = create_dynamic_model(class_name, model_name, schema_name, column_data)
-        table_name = model_class.__tablename__
-        schema_name = model_class.__table_args__["schema"]
-        insp = sqlalchemy.inspect(self.engine)
-        if not insp.has_table(table_name=table_name, schema=schema_name):
-            model_class.__table__.create(self.engine)
-            logger.info(f"Model '{model_name}' created successfully in schema '{schema_name}'.")
+        # Model classes are cached by the registry, so each one is only declared once per process
+        model_class = self.registry.get_model(class_name, model_name, schema_name, column_data)
+        if check_exists:
+            self.create_missing_models([model_class])
         return model_class
 
+    def create_missing_models(self, model_list: List[object]) -> int:
+        """Create, in a single transaction, the tables of {model_list} that are missing in the DB. Existing
+           tables are looked up with one catalog query per schema, cached for the whole process.
+
+        Args:
+            model_list (List[object]): Model classes with table characteristics.
+
+        Returns:
+            int: Number of tables that were created.
+        """
+        return self.registry.create_missing(model_list)
+
     def create_new_models(self) -> None:
         """Create all models found in database.models module, in case one of them is missing.
         """
-        model_list = self.__get_all_classes("database.models")
-        insp = sqlalchemy.inspect(self.engine)
-        for cls in model_list:
-            table_name = cls.__tablename__
-            schema_name = cls.__table_args__["schema"]
-            if not insp.has_table(table_name=table_name, schema=schema_name):
-                cls.__table__.create(self.engine)
-                logger.info(f"Model '{table_name}' created successfully in schema '{schema_name}'.")
+        self.create_missing_models(self.__get_all_classes("database.models"))
 
     @staticmethod
     def __get_all_classes(model_name: str) -> List[Any]:
@@ -70,33 +88,275 @@ class UtilsDB:
                 objective_cls = cls
         return objective_cls
 
+    def read_latest_snapshot(self, model: object, date_column: str = "registration_date") -> pd.DataFrame:
+        """Read the rows of the most recent snapshot stored in a model, i.e. those with the latest {date_column}.
+
+        Args:
+            model (object): Model class with table characteristics.
+            date_column (str, optional): Column identifying each snapshot. Defaults to "registration_date".
+
+        Returns:
+            pd.DataFrame: Rows of the latest snapshot. Empty if the table does not exist or holds no rows.
+        """
+        table = model.__table__
+        if not self.registry.exists(table.schema, table.name):
+            return pd.DataFrame(columns=[column.name for column in table.columns])
+        latest_date = sqlalchemy.select(sqlalchemy.func.max(table.c[date_column])).scalar_subquery()
+        query = sqlalchemy.select(table).where(table.c[date_column] == latest_date)
+        with self.engine.connect() as connection:
+            result = connection.execute(query)
+            return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+    def get_watermarks(self, models: List[object], column: str = "datetime", chunk_size: int = 500) -> Dict[str, Any]:
+        """Get the latest value of {column} already stored in each model. Tables are queried together
+           with one UNION ALL statement per chunk, instead of one round-trip per table.
+
+        Args:
+            models (List[object]): Model classes with table characteristics.
+            column (str, optional): Column from which to take the maximum. Defaults to "datetime".
+            chunk_size (int, optional): Maximum number of tables per query. Defaults to 500.
+
+        Returns:
+            Dict[str, Any]: Latest value for each table, keyed by '<schema>.<table>'. Empty tables map to None.
+        """
+        watermarks = {}
+        for n in range(0, len(models), chunk_size):
+            selects = [
+                sqlalchemy.select(
+                    sqlalchemy.literal(model.__table__.fullname).label("table_name"),
+                    sqlalchemy.func.max(model.__table__.c[column]).label("watermark"),
+                )
+                for model in models[n : n + chunk_size]
+            ]
+            with self.engine.connect() as connection:
+                for table_name, watermark in connection.execute(sqlalchemy.union_all(*selects)):
+                    watermarks[table_name] = watermark
+        return watermarks
+
+    def load_quotes(self, symbols: Union[str, List[str]], interval: str = "daily", start: Optional[Any] = None,
+                    end: Optional[Any] = None, columns: Optional[List[str]] = None,
+                    storage_layout: str = STORAGE_LAYOUT, chunk_size: int = 50_000,
+                    use_cache: bool = True) -> pd.DataFrame:
+        """Load stored quotes of one or several symbols, streamed from the DB through a server-side cursor.
+           Every symbol is cached on its own by (table, symbol, range, columns), so later loads of the same
+           range are served from memory until new rows are written to its table.
+
+        Args:
+            symbols (Union[str, List[str]]): Symbol or symbols to load.
+            interval (str, optional): "daily" or "1min". Defaults to "daily".
+            start (Any, optional): Earliest datetime to load, included. Defaults to None (no minimum).
+            end (Any, optional): Latest datetime to load, excluded. Defaults to None (no maximum).
+            columns (List[str], optional): Quote columns to load. 'datetime' and 'symbol' are always loaded.
+                                           Defaults to None, which loads every column.
+            storage_layout (str, optional): "per_symbol" or "partitioned". Defaults to the
+                                            STOCKS_STORAGE_LAYOUT environment variable ("per_symbol").
+            chunk_size (int, optional): Rows fetched from the cursor at a time. Defaults to 50_000.
+            use_cache (bool, optional): Serve and keep loaded quotes in the quote cache. Defaults to True.
+
+        Returns:
+            pd.DataFrame: Quotes sorted by symbol, in the order given, and datetime. Empty if none is stored.
+        """
+        if interval not in self.QUOTE_TABLES:
+            raise ValueError(f"Argument 'interval' must be one of these: {', '.join(self.QUOTE_TABLES)}.")
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        start = pd.Timestamp(start).to_pydatetime() if start is not None else None
+        end = pd.Timestamp(end).to_pydatetime() if end is not None else None
+        selected = tuple(columns) if columns is not None else None
+        tables = {symbol: self._quote_table(symbol, interval, storage_layout) for symbol in symbols}
+        cache = get_quote_cache()
+        frames = {}
+        for symbol, table in tables.items():
+            cached = cache.get((table.fullname, symbol, start, end, selected)) if use_cache else None
+            if cached is not None:
+                frames[symbol] = cached
+        missing = [symbol for symbol in symbols if symbol not in frames]
+        if missing:
+            logger.debug(f"Loading {interval} quotes of {len(missing)} symbols from the DB "\
+                         f"({len(symbols) - len(missing)} served from cache).")
+            frames.update(self._read_quotes(missing, tables, start, end, columns, chunk_size))
+            if use_cache:
+                for symbol in missing:
+                    cache.put((tables[symbol].fullname, symbol, start, end, selected), frames[symbol])
+        return pd.concat([frames[symbol] for symbol in symbols], ignore_index=True)
+
+    def _quote_table(self, symbol: str, interval: str, storage_layout: str) -> sqlalchemy.Table:
+        """Table that holds the quotes of {symbol} for {interval}."""
+        if storage_layout == "partitioned":
+            return PartitionedQuoteTable(interval, db_engine=self.engine).table
+        schema_name, column_data = self.QUOTE_TABLES[interval]
+        model_name = f"{symbol}_{interval}"
+        # deepcopy is needed so that no column is affected by previous tables
+        return self.registry.get_model(model_name, model_name, schema_name, copy.deepcopy(column_data)).__table__
+
+    def _read_quotes(self, symbols: List[str], tables: Dict[str, sqlalchemy.Table], start: Optional[Any],
+                     end: Optional[Any], columns: Optional[List[str]], chunk_size: int) -> Dict[str, pd.DataFrame]:
+        """Read the quotes of {symbols} with one streamed query per table."""
+        symbols_by_table = {}
+        for symbol in symbols:
+            symbols_by_table.setdefault(tables[symbol], []).append(symbol)
+        frames = {}
+        with self.engine.connect() as connection:
+            for table, table_symbols in symbols_by_table.items():
+                selected = [column for column in table.columns
+                            if columns is None or column.name in ("datetime", "symbol") or column.name in columns]
+                if not self.registry.exists(table.schema, table.name):
+                    df = empty_frame(selected)
+                else:
+                    query = sqlalchemy.select(*selected).where(table.c.symbol.in_(table_symbols))
+                    if start is not None:
+                        query = query.where(table.c.datetime >= start)
+                    if end is not None:
+                        query = query.where(table.c.datetime < end)
+                    query = query.order_by(table.c.symbol, table.c.datetime)
+                    df = stream_frame(connection, query, selected, chunk_size)
+                if len(table_symbols) == 1:
+                    frames[table_symbols[0]] = df
+                    continue
+                groups = {symbol: group.reset_index(drop=True) for symbol, group in df.groupby("symbol", sort=False)}
+                for symbol in table_symbols:
+                    frames[symbol] = groups.get(symbol, df.iloc[:0])
+        return frames
+
     def insert_df_in_db(
-        self, df: pd.DataFrame, model: object, batch_size: int = 10_000
-    ) -> None:
+        self, df: pd.DataFrame, model: object, batch_size: int = 10_000, method: str = DB_WRITE_METHOD,
+        on_conflict: Optional[str] = DB_ON_CONFLICT, raise_on_error: bool = False
+    ) -> Dict[str, int]:
         """Insert the input dataframe in the corresponding model in DB.
 
         Args:
             df (pd.DataFrame): Input dataframe of which its information will be stored in the DB.
             model (object): Model class with table characteristics.
             batch_size (int, optional): Maximum rows to be inserted into the DB per iteration. Defaults to 100_000.
+            method (str, optional): "copy" streams every batch through COPY FROM STDIN, "orm" inserts it
+                                    with an executemany INSERT. Defaults to the STOCKS_DB_WRITE_METHOD
+                                    environment variable ("copy").
+            on_conflict (str, optional): How rows whose primary key is already stored are handled, one by one:
+                                         "ignore" skips them and "update" overwrites the stored ones. With
+                                         "none" or None, a batch holding any of them is skipped as a whole.
+                                         Defaults to the STOCKS_DB_ON_CONFLICT environment variable ("ignore").
+            raise_on_error (bool, optional): Raise errors other than duplicated primary keys, such as a lost
+                                             connection, instead of skipping the batch, so that the caller can
+                                             retry the whole dataframe. Defaults to False.
+
+        Returns:
+            Dict[str, int]: Number of rows that were inserted, updated and skipped.
         """
+        if method not in self.WRITE_METHODS:
+            raise ValueError(f"Argument 'method' must be one of these: {', '.join(self.WRITE_METHODS)}.")
+        on_conflict = None if on_conflict in (None, "none") else on_conflict
+        if on_conflict is not None and on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"Argument 'on_conflict' must be one of these: {', '.join(CONFLICT_POLICIES)}.")
+        # COPY is specific to PostgreSQL, other backends insert with the ORM method
+        if method == "copy" and self.backend.supports_copy:
+            return self.copy_df_in_db(df, model, batch_size, on_conflict=on_conflict, raise_on_error=raise_on_error)
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        table = model.__table__
         batched_dfs = self._divide_df_in_batches(df, batch_size)
         for df_batch in batched_dfs:
+            columns = copy_columns(df_batch, table)
+            df_batch = to_wall_time(df_batch[[column.name for column in columns]], columns)
+            df_batch = self.backend.prepare_frame(df_batch, columns)
+            duplicates = 0
+            if on_conflict == "update":
+                # A multi-row upsert cannot update the same row twice, so only the last copy of every key is sent
+                key = [column.name for column in table.primary_key.columns]
+                deduplicated = df_batch.drop_duplicates(key, keep="last")
+                duplicates = len(df_batch) - len(deduplicated)
+                df_batch = deduplicated
             dictionary_rows = df_batch.to_dict(orient='records')
             try:
-                self.dbsession.bulk_insert_mappings(model, dictionary_rows)
-                self.dbsession.commit()
-                logger.info(f"Table '{model.__tablename__}' successfully stored in schema {model.__table_args__['schema']}.")
+                # Each batch runs in its own transaction on a pooled connection, committed on success
+                # and rolled back on error, so several writers can insert at the same time
+                with self.engine.begin() as connection:
+                    if on_conflict is None:
+                        connection.execute(sqlalchemy.insert(table), dictionary_rows)
+                        batch_counts = {"inserted": len(dictionary_rows), "updated": 0, "skipped": 0}
+                    else:
+                        statement = self.backend.conflict_insert(table, columns, on_conflict)
+                        written = connection.execute(statement, dictionary_rows).scalars().all()
+                        inserted = sum(written)
+                        batch_counts = {"inserted": inserted, "updated": len(written) - inserted,
+                                        "skipped": len(dictionary_rows) - len(written) + duplicates}
+                self._log_batch(table, batch_counts)
+                get_quote_cache().invalidate(table.fullname)
+                counts = {key: counts[key] + batch_counts[key] for key in counts}
             except sqlalchemy.exc.IntegrityError as e:
+                counts["skipped"] += len(dictionary_rows) + duplicates
                 logger.warning(
                     f"Duplicated primary key entries. Skipping table '{model.__tablename__}'. Error log: \n {e}"
                 )
             except Exception as e:
+                if raise_on_error:
+                    raise
+                counts["skipped"] += len(dictionary_rows) + duplicates
                 logger.error(
                     f"An error occurred when inserting table '{model.__tablename__}' into database: {e}."
                 )
-        # Close connection
-                self.dbsession.close()
+        return counts
+
+    def copy_df_in_db(self, df: pd.DataFrame, model: object, batch_size: int = 10_000,
+                      copy_format: str = DB_COPY_FORMAT, on_conflict: Optional[str] = None,
+                      raise_on_error: bool = False) -> Dict[str, int]:
+        """Insert the input dataframe in the corresponding model in DB with COPY, one batch at a time.
+           Each batch is committed on its own. With an {on_conflict} policy, batches are copied into a
+           staging table and stored keys are resolved row by row; otherwise, as with 'insert_df_in_db',
+           a batch holding duplicated primary keys is skipped without stopping the rest.
+
+        Args:
+            df (pd.DataFrame): Input dataframe of which its information will be stored in the DB.
+            model (object): Model class with table characteristics.
+            batch_size (int, optional): Maximum rows to be copied into the DB per statement. Defaults to 10_000.
+            copy_format (str, optional): "csv" or "binary". Defaults to the STOCKS_DB_COPY_FORMAT
+                                         environment variable ("binary").
+            on_conflict (str, optional): "ignore" or "update". Defaults to None.
+            raise_on_error (bool, optional): Raise errors other than duplicated primary keys instead of
+                                             skipping the batch. Defaults to False.
+
+        Returns:
+            Dict[str, int]: Number of rows that were inserted, updated and skipped.
+        """
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        table = model.__table__
+        connection = self.engine.raw_connection()
+        try:
+            if copy_format == "binary" and self.session_timezone is None:
+                with connection.cursor() as cursor:
+                    cursor.execute("SHOW TimeZone")
+                    self.session_timezone = cursor.fetchone()[0]
+            for df_batch in self._divide_df_in_batches(df, batch_size):
+                try:
+                    if on_conflict is None:
+                        rows = copy_df(connection, df_batch, table, copy_format, self.session_timezone)
+                        batch_counts = {"inserted": rows, "updated": 0, "skipped": 0}
+                    else:
+                        batch_counts = upsert_df(connection, df_batch, table, on_conflict, copy_format,
+                                                 self.session_timezone)
+                    connection.commit()
+                    self._log_batch(table, batch_counts)
+                    get_quote_cache().invalidate(table.fullname)
+                    counts = {key: counts[key] + batch_counts[key] for key in counts}
+                except psycopg2.IntegrityError as e:
+                    connection.rollback()
+                    counts["skipped"] += len(df_batch)
+                    logger.warning(
+                        f"Duplicated primary key entries. Skipping table '{table.name}'. Error log: \n {e}"
+                    )
+                except Exception as e:
+                    connection.rollback()
+                    if raise_on_error:
+                        raise
+                    counts["skipped"] += len(df_batch)
+                    logger.error(
+                        f"An error occurred when inserting table '{table.name}' into database: {e}."
+                    )
+        finally:
+            connection.close()
+        return counts
+
+    @staticmethod
+    def _log_batch(table: sqlalchemy.Table, counts: Dict[str, int]) -> None:
+        logger.info(f"Table '{table.name}' successfully stored in schema {table.schema} "\
+                    f"({counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped).")
 
     @staticmethod
     def _divide_df_in_batches(input_df: pd.DataFrame, batch_size: int) -> List[pd.DataFrame]:
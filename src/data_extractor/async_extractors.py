@@ -0,0 +1,118 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from config.log_config import logger
+from config.pipeline_config import ASYNC_MAX_IN_FLIGHT
+from src.data_extractor.crypto_extractor import CryptoExtractor
+from src.data_extractor.forex_extractor import ForexExtractor
+
+
+class BaseAsyncExtractor(ABC):
+    """asyncio counterpart of the AlphaVantage extractors. Requests go through the same pooled
+       client, so the shared token bucket keeps all in-flight requests within the quota, and every
+       DataFrame has the same shape as the one returned by the blocking 'get_data'.
+    """
+
+    @abstractmethod
+    def _make_extractor(self) -> Any:
+        """Blocking extractor that serves the requests of this instrument."""
+
+    async def get_data(self,
+                       period: str = "daily",
+                       from_date: str = datetime.now().strftime("%Y-%m-%d"),
+                       until_date: str = datetime.now().strftime("%Y-%m-%d"),
+                       stream: bool = False,
+                       executor: Optional[Executor] = None) -> pd.DataFrame:
+        """Get the data from the API without blocking the event loop. Arguments are the same as
+           those of the blocking 'get_data'.
+
+        Args:
+            executor (Executor, optional): Executor in which the request runs. Defaults to the event
+                                           loop's default executor.
+
+        Returns:
+            pd.DataFrame: Returns DataFrame containing OHLCV information.
+        """
+        # A new extractor per call, since extractors keep the last url as state
+        extractor = self._make_extractor()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, extractor.get_data, period, from_date, until_date, stream)
+
+    @classmethod
+    async def fetch_many(cls,
+                         combinations: Iterable[Tuple[Any, str]],
+                         from_date: str = datetime.now().strftime("%Y-%m-%d"),
+                         until_date: str = datetime.now().strftime("%Y-%m-%d"),
+                         max_in_flight: int = ASYNC_MAX_IN_FLIGHT,
+                         stream: bool = False,
+                         executor: Optional[Executor] = None) -> Dict[Tuple[Any, str], pd.DataFrame]:
+        """Fetch every (instrument, period) combination concurrently, with at most {max_in_flight}
+           requests running at the same time. A failure on one combination is logged and does not
+           stop the rest.
+
+        Args:
+            combinations (Iterable[Tuple[Any, str]]): Pairs of instrument and period. The instrument is
+                                                      whatever the class initializer takes.
+            from_date (str, optional): Date from where to start fetching data. Defaults to today.
+            until_date (str, optional): Date from where to end fetching data. Defaults to today.
+            max_in_flight (int, optional): Maximum number of concurrent requests. Defaults to the
+                                           STOCKS_ASYNC_MAX_IN_FLIGHT environment variable (16).
+            stream (bool, optional): Stream each response into the DataFrame. Defaults to False.
+            executor (Executor, optional): Executor in which the requests run. It is owned by the caller, so the
+                                           event loop never waits for it to shut down. Defaults to the event
+                                           loop's default executor, whose size may bound concurrency below
+                                           {max_in_flight}.
+
+        Returns:
+            Dict[Tuple[Any, str], pd.DataFrame]: One DataFrame per combination that succeeded.
+        """
+        combinations = list(combinations)
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def fetch_one(instrument: Any, period: str) -> pd.DataFrame:
+            async with semaphore:
+                async_extractor = cls(*instrument) if isinstance(instrument, tuple) else cls(instrument)
+                return await async_extractor.get_data(period, from_date, until_date, stream, executor)
+
+        outputs = await asyncio.gather(*(fetch_one(instrument, period) for instrument, period in combinations),
+                                       return_exceptions=True)
+
+        results = {}
+        for combination, output in zip(combinations, outputs):
+            if isinstance(output, Exception):
+                logger.error(f"Could not fetch data for {combination}: {output!r}")
+            else:
+                results[combination] = output
+        logger.info(f"Fetched {len(results)}/{len(combinations)} combinations asynchronously.")
+        return results
+
+
+class AsyncForexExtractor(BaseAsyncExtractor):
+    """asyncio counterpart of ForexExtractor."""
+
+    def __init__(self, symbol_pair: str):
+        """Class initializer.
+
+        Args:
+            symbol_pair (str): Pair from where to fetch data, e.g. "EUR/USD".
+        """
+        self.symbol_pair = symbol_pair
+
+    def _make_extractor(self) -> ForexExtractor:
+        return ForexExtractor(self.symbol_pair)
+
+
+class AsyncCryptoExtractor(BaseAsyncExtractor):
+    """asyncio counterpart of CryptoExtractor. Instruments given to 'fetch_many' are (symbol, currency) tuples."""
+
+    def __init__(self, symbol: str, currency: str):
+        self.symbol = symbol
+        self.currency = currency
+
+    def _make_extractor(self) -> CryptoExtractor:
+        return CryptoExtractor(self.symbol, self.currency)
@@ -1,6 +1,9 @@
 from dependencies import authenticator
 import pandas as pd
 
+from src.data_extractor.http_client import get_client
+from src.data_extractor.response_cache import get_cache
+
 from abc import abstractmethod
 from typing import Any
 
@@ -9,6 +12,8 @@ class BaseExtractor:
     """
     def __init__(self):
         self.api_key = authenticator.api_key
+        self.client = get_client()
+        self.cache = get_cache()
 
     @abstractmethod
     def get_data(self) -> pd.DataFrame:
@@ -1,13 +1,15 @@
 from config.log_config import logger 
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 import pandas as pd
 import requests
 from dateutil.relativedelta import relativedelta
 
 from src.data_extractor.base_extractor import BaseExtractor
-from utils.error_handling import ValueOutOfBoundsException, APIError
+from src.data_extractor.http_client import get_client
+from src.data_extractor.json_parser import parse_time_series
+from utils.error_handling import ValueOutOfBoundsException, APIError, InternetError
 
 
 class CryptoExtractor(BaseExtractor):
@@ -24,7 +26,8 @@ class CryptoExtractor(BaseExtractor):
     def get_data(self, 
                  period: str = "daily", 
                  from_date: str = datetime.now().strftime("%Y-%m-%d"), 
-                 until_date: str = datetime.now().strftime("%Y-%m-%d")) -> pd.DataFrame:
+                 until_date: str = datetime.now().strftime("%Y-%m-%d"),
+                 stream: bool = False) -> pd.DataFrame:
         """Get the crypto data from the API for a specified symbol.
 
         Args:
@@ -35,6 +38,8 @@ class CryptoExtractor(BaseExtractor):
             until_date (str, optional): Date from where to end fetching data. Only accepts '%Y-m-%d'
                                         string formats. Defaults to datetime.now().strftime("%Y-%m-%d")
                                         (today).
+            stream (bool, optional): Parse the response while it is being downloaded, with bounded memory.
+                                     All fields are returned as floats. Defaults to False.
 
         Raises:
             ValueOutOfBoundsException: Raises exception if the 'period' argument is not within the 
@@ -48,8 +53,13 @@ class CryptoExtractor(BaseExtractor):
                                             f"{', '.join(self.ACCEPTABLE_PERIODS)}")
             raise ValueOutOfBoundsException
 
-        new_data = self.__choose_function_type(period)
-        df = pd.DataFrame(new_data).T
+        # Specific daydate filters are applied while parsing
+        if stream:
+            self.__set_url(period)
+            df = self.__stream_request(self.url, from_date, until_date)
+        else:
+            new_data = self.__choose_function_type(period, until_date)
+            df = parse_time_series(new_data, from_date, until_date, errors="ignore")
         if period == "daily":
             renamed_cols = {
                 f"1a. open ({self.currency})": f"open_{self.currency}",
@@ -74,61 +84,81 @@ class CryptoExtractor(BaseExtractor):
             }
             df = df.rename(columns=renamed_cols)
             df['currency'] = self.currency
-        df.index = pd.to_datetime(df.index)
-
-        # Apply specific daydate filters
-        start_date = pd.to_datetime(f"{from_date} 00:00:00")
-        end_date = pd.to_datetime(f"{until_date} 23:59:59")
-        df = df[(df.index >= start_date) & (df.index <= end_date)]
-        df = df.apply(pd.to_numeric, errors='ignore')
         df = df.fillna(method="ffill")
         df['symbol'] = self.symbol
 
         return df
 
-    def __choose_function_type(self, period: str) -> Dict[str, str]:
+    def __choose_function_type(self, period: str, until_date: Optional[str] = None) -> Dict[str, str]:
         """Decide wich endpoint to trigger depending on the period category.
 
         Args:
             period (str): Defines the window size for each new quote. Defaults to "daily".
+            until_date (str, optional): Last day needed, used to decide whether a cached response is
+                                        still valid. Defaults to None.
 
         Returns:
             Dict[str, str]: JSON file containing OHLCV information from the API.
         """
+        series_key = self.__set_url(period)
+        response = self.__return_request(self.url, until_date)
+        json_data = response[series_key]
+
+        return json_data
+
+    def __set_url(self, period: str) -> str:
+        """Set the endpoint url for the period category.
+
+        Args:
+            period (str): Defines the window size for each new quote.
+
+        Returns:
+            str: Key of the response under which the time series is found.
+        """
         if period == "daily":
             self.url = (
                 f"https://www.alphavantage.co/query?function=DIGITAL_CURRENCY_DAILY&symbol="\
                 f"{self.symbol}&market={self.currency}&apikey={self.api_key}"
             )
-            response = self.__return_request(self.url)
-            json_data = response["Time Series (Digital Currency Daily)"]
-        else:
-            self.url = (
-                f"https://www.alphavantage.co/query?function=CRYPTO_INTRADAY&symbol="\
-                f"{self.symbol}&market={self.currency}&interval={period}&outputsize=full"\
-                f"&apikey={self.api_key}"
-            )
-            response = self.__return_request(self.url)
-            json_data = response[f"Time Series Crypto ({period})"]
+            return "Time Series (Digital Currency Daily)"
+        self.url = (
+            f"https://www.alphavantage.co/query?function=CRYPTO_INTRADAY&symbol="\
+            f"{self.symbol}&market={self.currency}&interval={period}&outputsize=full"\
+            f"&apikey={self.api_key}"
+        )
+        return f"Time Series Crypto ({period})"
 
-        return json_data
+    @staticmethod
+    def __stream_request(url: str, from_date: Optional[str] = None, until_date: Optional[str] = None) -> pd.DataFrame:
+        """Stream the API response into a DataFrame, stopping once quotes are older than {from_date}.
+
+        Args:
+            url (str): Endpoint url for the API call.
+            from_date (str, optional): Earliest day needed from the response. Defaults to None.
+            until_date (str, optional): Last day needed from the response. Defaults to None.
+
+        Returns:
+            pd.DataFrame: Float64 columns named after the payload fields, with a DatetimeIndex.
+        """
+        return get_client().stream_time_series(url, from_date, until_date)
 
     @staticmethod
-    def __return_request(url: str) -> dict:
+    def __return_request(url: str, until_date: Optional[str] = None) -> dict:
         """_summary_
 
         Args:
             url (str): Endpoint url for the API call.
+            until_date (str, optional): Last day needed from the response. Defaults to None.
 
         Raises:
             APIError: Raise custom error if any problem arises within the API. 
+            InternetError: Raised if the API could not be reached.
 
         Returns:
             dict: Returns a dictionary with the stated characteristics.
         """
         try:
-            r = requests.get(url)
-            r_json = r.json()
+            r_json = get_client().get_json(url, until_date)
             if len(r_json) == 0:
                 logger.error(f"API response returned an empty dictionary")
                 raise APIError
@@ -139,8 +169,9 @@ class CryptoExtractor(BaseExtractor):
                 logger.error(f"{potential_error_explanation}")
                 raise APIError
 
-        except requests.exceptions.RequestException:
+        except requests.exceptions.RequestException as e:
             logger.error(f"Could not connect with AlphaVantage API. Please, "\
                            "make sure you are connected to the internet")
+            raise InternetError from e
 
         return r_json
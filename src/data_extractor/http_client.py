@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+from urllib.parse import parse_qs, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.log_config import logger
+from config.pipeline_config import (ALPHAVANTAGE_CALLS_PER_MINUTE, ALPHAVANTAGE_MAX_RETRIES,
+                                    ALPHAVANTAGE_BACKOFF_SECONDS, HTTP_POOL_SIZE, HTTP_TIMEOUT_SECONDS)
+from src.data_extractor.json_stream import TimeSeriesStreamParser
+from src.data_extractor.resilience import FAILED, SUCCESS, THROTTLED, get_circuit_breaker
+from src.data_extractor.response_cache import ResponseCache, cache_policy, get_cache
+from utils.error_handling import APIError
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Tokens are refilled continuously at {rate_per_minute} and at most
+       {capacity} of them can be accumulated, which bounds the size of a burst. The default capacity
+       of one token spaces calls evenly, so no 60-second window ever exceeds the quota.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = 1.0) -> None:
+        if rate_per_minute <= 0:
+            raise ValueError("Argument 'rate_per_minute' must be higher than 0.")
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, blocking until one is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class AlphaVantageClient:
+    """HTTP client shared by all extractors. It keeps connections alive through a pooled session,
+       spends one token of a shared bucket per call and backs off when the API answers with its
+       rate-limit payload instead of data. Successful JSON responses go through the shared response
+       cache, so reruns and replays do not spend quota. Every call goes through the circuit breaker
+       of AlphaVantage, which rejects calls for a while once the API keeps failing or throttling.
+    """
+
+    HOST = "www.alphavantage.co"
+
+    def __init__(self,
+                 calls_per_minute: float = ALPHAVANTAGE_CALLS_PER_MINUTE,
+                 pool_size: int = HTTP_POOL_SIZE,
+                 max_retries: int = ALPHAVANTAGE_MAX_RETRIES,
+                 backoff_seconds: float = ALPHAVANTAGE_BACKOFF_SECONDS,
+                 timeout: float = HTTP_TIMEOUT_SECONDS,
+                 cache: Optional[ResponseCache] = None) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.rate_limiter = TokenBucket(calls_per_minute)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.cache = cache if cache is not None else get_cache()
+        self.breaker = get_circuit_breaker(self.HOST)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request through the pooled session, once a token is available and the circuit
+           breaker lets it through. Connection errors count as failures of the breaker.
+        """
+        self.breaker.before_call()
+        self.rate_limiter.acquire()
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            return self.session.get(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record(FAILED)
+            raise
+
+    def get_json(self, url: str, until_date: Optional[str] = None) -> dict:
+        """Send a GET request and return its JSON body, retrying with exponential backoff while the
+           API keeps answering with its rate-limit message.
+
+        Args:
+            url (str): Endpoint url for the API call.
+            until_date (str, optional): Last day the caller needs, in "%Y-%m-%d" format. Cached responses
+                                        fetched after a past day are served without expiring. Defaults to None.
+
+        Raises:
+            APIError: Raised if the API is still throttling after all retries.
+            CircuitOpenError: Raised if the circuit breaker of AlphaVantage is open.
+
+        Returns:
+            dict: Parsed JSON response.
+        """
+        key = ResponseCache.make_url_key(url)
+        function = parse_qs(urlparse(url).query).get("function", [""])[0]
+        cached = self.cache.get(key, *cache_policy(until_date, intraday="INTRADAY" in function))
+        if cached is not None:
+            return json.loads(cached)
+        for attempt in range(self.max_retries + 1):
+            response = self.get(url)
+            r_json = response.json()
+            if not self.is_rate_limited(r_json):
+                self.breaker.record(SUCCESS)
+                if r_json and "Error Message" not in r_json:
+                    self.cache.put(key, response.content)
+                return r_json
+            self.breaker.record(THROTTLED)
+            self._backoff(attempt)
+        logger.error(f"AlphaVantage kept throttling requests after {self.max_retries} retries.")
+        raise APIError
+
+    def stream_time_series(self, url: str, from_date: Optional[str] = None, until_date: Optional[str] = None,
+                           stop_early: bool = True, chunk_size: int = 1 << 16) -> pd.DataFrame:
+        """Send a GET request and parse its time series while the body is being downloaded, so that peak
+           memory does not depend on the size of the payload. Complete bodies are also written to the
+           response cache chunk by chunk.
+
+        Args:
+            url (str): Endpoint url for the API call.
+            from_date (str, optional): Earliest day to keep. Defaults to None.
+            until_date (str, optional): Latest day to keep. Defaults to None.
+            stop_early (bool, optional): Stop downloading once quotes are older than {from_date}. Defaults to True.
+            chunk_size (int, optional): Number of bytes read at a time. Defaults to 64 KiB.
+
+        Raises:
+            APIError: Raised if the API answers with an error message, or is still throttling after all retries.
+            CircuitOpenError: Raised if the circuit breaker of AlphaVantage is open.
+
+        Returns:
+            pd.DataFrame: Float64 columns named after the payload fields, with a DatetimeIndex.
+        """
+        key = ResponseCache.make_url_key(url)
+        function = parse_qs(urlparse(url).query).get("function", [""])[0]
+        for attempt in range(self.max_retries + 1):
+            parser = TimeSeriesStreamParser(from_date, until_date, stop_early=stop_early)
+            cached_chunks = self.cache.get_stream(key, *cache_policy(until_date, intraday="INTRADAY" in function),
+                                                  chunk_size=chunk_size)
+            if cached_chunks is not None:
+                return parser.parse(cached_chunks)
+            response = self.get(url, stream=True)
+            try:
+                df = parser.parse(self.cache.put_stream(key, response.iter_content(chunk_size)))
+            finally:
+                response.close()
+            if df is not None:
+                self.breaker.record(SUCCESS)
+                return df
+            self.cache.discard(key)
+            if not self.is_rate_limited(parser.payload):
+                self.breaker.record(SUCCESS)
+                logger.error(f"AlphaVantage response holds no time series: {parser.payload}")
+                raise APIError
+            self.breaker.record(THROTTLED)
+            self._backoff(attempt)
+        logger.error(f"AlphaVantage kept throttling requests after {self.max_retries} retries.")
+        raise APIError
+
+    def _backoff(self, attempt: int) -> None:
+        """Wait before the next retry, doubling the waiting time on every attempt."""
+        if attempt < self.max_retries:
+            wait_time = self.backoff_seconds * 2 ** attempt
+            logger.warning(f"AlphaVantage rate limit reached. Retrying in {wait_time:.0f} seconds.")
+            time.sleep(wait_time)
+
+    @staticmethod
+    def is_rate_limited(r_json: dict) -> bool:
+        """Check whether the response is AlphaVantage's "Note"/rate-limit payload instead of data."""
+        if not isinstance(r_json, dict):
+            return False
+        if "Note" in r_json:
+            return True
+        information = str(r_json.get("Information", "")).lower()
+        return "rate limit" in information or "call frequency" in information
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> AlphaVantageClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AlphaVantageClient()
+        return _client
@@ -0,0 +1,59 @@
+from operator import itemgetter
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def parse_time_series(json_data: Dict[str, Dict[str, str]],
+                      from_date: Optional[str] = None,
+                      until_date: Optional[str] = None,
+                      errors: str = "coerce",
+                      sort: bool = False) -> pd.DataFrame:
+    """Convert an AlphaVantage time series mapping into a typed DataFrame with a DatetimeIndex.
+       Dates are filtered on the raw keys before anything is materialized, and each field is
+       converted to a numeric column in a single vectorized call, instead of building an object
+       frame, transposing it and converting it column by column.
+
+    Args:
+        json_data (Dict[str, Dict[str, str]]): Mapping from quote datetime to a dictionary of fields,
+                                               as found under the "Time Series (...)" key.
+        from_date (str, optional): Earliest day to keep. Defaults to None (no minimum date).
+        until_date (str, optional): Latest day to keep. Defaults to None (no maximum date).
+        errors (str, optional): "coerce" turns unparseable values into NaN, while "ignore" keeps a field
+                                as object dtype if any value cannot be parsed. Defaults to "coerce".
+        sort (bool, optional): Sort rows in ascending date order. The API order (descending) is kept
+                               otherwise. Defaults to False.
+
+    Returns:
+        pd.DataFrame: DataFrame with one column per field, in the same order as in the payload.
+    """
+    # AlphaVantage keys are ISO formatted, so comparing their first ten characters is a date comparison
+    first_day = pd.Timestamp(from_date).strftime("%Y-%m-%d") if from_date is not None else None
+    last_day = pd.Timestamp(until_date).strftime("%Y-%m-%d") if until_date is not None else None
+    keys = [
+        key for key in json_data
+        if (first_day is None or key[:10] >= first_day) and (last_day is None or key[:10] <= last_day)
+    ]
+    if sort:
+        keys.sort()
+    if not json_data:
+        return pd.DataFrame(index=pd.DatetimeIndex([]))
+    # Fields missing from some rows are NaN there, and fields only found in later rows still get a column
+    fields = list(dict.fromkeys(field for row in json_data.values() for field in row))
+    if not keys:
+        return pd.DataFrame(columns=fields, index=pd.DatetimeIndex([]))
+
+    try:
+        get_fields = itemgetter(*fields)
+        rows = [get_fields(json_data[key]) for key in keys]
+    except KeyError:
+        rows = [tuple(json_data[key].get(field) for field in fields) for key in keys]
+    values = np.array(rows, dtype=object).reshape(len(rows), len(fields))
+    columns = {}
+    for n, field in enumerate(fields):
+        try:
+            columns[field] = pd.to_numeric(values[:, n], errors="raise" if errors == "ignore" else errors)
+        except (ValueError, TypeError):
+            columns[field] = values[:, n]
+    return pd.DataFrame(columns, index=pd.to_datetime(keys))
@@ -0,0 +1,157 @@
+import codecs
+import json
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+_SERIES_KEY = re.compile(r'"(Time Series[^"]*)"\s*:\s*\{')
+_WHITESPACE = re.compile(r"[\s,]*")
+_DECODER = json.JSONDecoder()
+
+
+class TimeSeriesStreamParser:
+    """Incremental parser for AlphaVantage time series responses. The body is consumed chunk by
+       chunk, and each quote is written straight into preallocated float64 column buffers, so that
+       only one chunk of raw text is held in memory at any time.
+
+       AlphaVantage sorts quotes from newest to oldest. With {stop_early}, parsing stops at the first
+       quote older than {from_date}, and the rest of the body is never downloaded.
+
+       If the body holds no "Time Series (...)" key (e.g. a rate-limit or error message), nothing is
+       parsed and the whole payload is exposed in the 'payload' attribute instead.
+    """
+
+    # Consumed text is dropped from the buffer once it exceeds this number of characters
+    TRIM_THRESHOLD = 1 << 16
+
+    def __init__(self,
+                 from_date: Optional[str] = None,
+                 until_date: Optional[str] = None,
+                 stop_early: bool = True,
+                 initial_capacity: int = 4096) -> None:
+        self.first_day = pd.Timestamp(from_date).strftime("%Y-%m-%d") if from_date is not None else None
+        self.last_day = pd.Timestamp(until_date).strftime("%Y-%m-%d") if until_date is not None else None
+        self.stop_early = stop_early
+        self.capacity = initial_capacity
+        self.series_key = None
+        self.payload = None
+        self.stopped_early = False
+        # Largest number of characters buffered at once, which bounds the memory used by the raw text
+        self.peak_buffer = 0
+        self.fields: List[str] = []
+        self.keys: List[str] = []
+        self.values = None
+
+    def parse(self, chunks: Iterable[bytes]) -> Optional[pd.DataFrame]:
+        """Consume the chunks of a response body.
+
+        Args:
+            chunks (Iterable[bytes]): Raw body, e.g. 'response.iter_content(chunk_size)'.
+
+        Raises:
+            ValueError: Raised if the body is not valid JSON.
+
+        Returns:
+            Optional[pd.DataFrame]: Float64 columns named after the payload fields, with a DatetimeIndex
+                                    in the API order. None if the body holds no time series.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        chunk_iterator = iter(chunks)
+        buffer, pos, exhausted = "", 0, False
+
+        def read_more() -> bool:
+            nonlocal buffer, exhausted
+            for chunk in chunk_iterator:
+                text = decoder.decode(chunk)
+                if text:
+                    buffer += text
+                    self.peak_buffer = max(self.peak_buffer, len(buffer))
+                    return True
+            buffer += decoder.decode(b"", final=True)
+            exhausted = True
+            return False
+
+        # Look for the time series key. Anything before it (metadata) is small.
+        match = _SERIES_KEY.search(buffer)
+        while match is None:
+            if not read_more():
+                self.payload = json.loads(buffer) if buffer.strip() else {}
+                return None
+            match = _SERIES_KEY.search(buffer)
+        self.series_key = match.group(1)
+        pos = match.end()
+
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                if not read_more():
+                    raise ValueError("Response body ended in the middle of the time series.")
+                continue
+            if buffer[pos] == "}":
+                break
+            try:
+                key, end = json.decoder.scanstring(buffer, pos + 1)
+                end = _WHITESPACE.match(buffer, end).end()
+                if end >= len(buffer):
+                    raise json.JSONDecodeError("Incomplete row", buffer, end)
+                if buffer[end] != ":":
+                    raise ValueError(f"Unexpected character {buffer[end]!r} in time series.")
+                end = _WHITESPACE.match(buffer, end + 1).end()
+                row, end = _DECODER.raw_decode(buffer, end)
+            except json.JSONDecodeError:
+                # The row is split between two chunks
+                if exhausted or not read_more():
+                    raise
+                continue
+            pos = end
+            # Trimmed before the date filters, so skipped rows do not pile up in the buffer either
+            if pos > self.TRIM_THRESHOLD:
+                buffer, pos = buffer[pos:], 0
+            day = key[:10]
+            if self.first_day is not None and day < self.first_day:
+                if self.stop_early:
+                    self.stopped_early = True
+                    break
+                continue
+            if self.last_day is not None and day > self.last_day:
+                continue
+            self._append(key, row)
+
+        if self.stopped_early:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        else:
+            # Only the closing braces are left, reading them lets the body be fully consumed
+            for _ in chunk_iterator:
+                pass
+        return self._to_frame()
+
+    def _append(self, key: str, row: dict) -> None:
+        if self.values is None:
+            self.fields = list(row.keys())
+            self.values = np.empty((self.capacity, len(self.fields)), dtype=np.float64)
+        n = len(self.keys)
+        if n == len(self.values):
+            # Grow the buffers geometrically, so that appending stays amortized O(1)
+            grown = np.empty((2 * len(self.values), len(self.fields)), dtype=np.float64)
+            grown[:n] = self.values
+            self.values = grown
+        for column, field in enumerate(self.fields):
+            self.values[n, column] = self._to_float(row.get(field))
+        self.keys.append(key)
+
+    @staticmethod
+    def _to_float(value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def _to_frame(self) -> pd.DataFrame:
+        if self.values is None:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        n = len(self.keys)
+        return pd.DataFrame(self.values[:n], columns=self.fields, index=pd.to_datetime(self.keys))
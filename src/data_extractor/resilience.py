@@ -0,0 +1,224 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Retry, backoff and adaptive concurrency shared by every call to a throttling upstream
+(yfinance, AlphaVantage). An AIMD controller decides how many calls may run at the same
+time, and a per-host circuit breaker stops calling an upstream that keeps failing.
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple, Type
+
+from config.log_config import logger
+from config.pipeline_config import (AIMD_DECREASE_FACTOR, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS,
+                                    UPSTREAM_BACKOFF_SECONDS, UPSTREAM_MAX_BACKOFF_SECONDS, UPSTREAM_MAX_RETRIES)
+from utils.error_handling import CircuitOpenError, ThrottledError
+
+# Outcomes of a single upstream call
+SUCCESS = "success"
+THROTTLED = "throttled"
+FAILED = "failed"
+
+# Host key of the circuit breaker shared by all yfinance calls
+YAHOO_HOST = "finance.yahoo.com"
+
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease limit on concurrent calls, as in TCP congestion
+       control. Every successful call adds {increase}/{limit} slots, so the limit grows by {increase}
+       once per window of successes, and every throttled call multiplies it by {decrease_factor}.
+       Calls that were admitted before the last decrease do not decrease it again, so a burst of
+       throttled responses to one window only counts as a single congestion signal.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None,
+                 increase: float = 1.0, decrease_factor: float = AIMD_DECREASE_FACTOR, name: str = "upstream") -> None:
+        if minimum < 1:
+            raise ValueError("Argument 'minimum' must be higher than 0.")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("Argument 'decrease_factor' must be between 0 and 1.")
+        self.minimum = minimum
+        self.maximum = maximum if maximum is not None else max(initial, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.name = name
+        self.in_flight = 0
+        self.epoch = 0
+        self.condition = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        """Number of calls currently allowed to run at the same time."""
+        return max(self.minimum, int(self.limit))
+
+    def acquire(self) -> int:
+        """Wait until a slot is free and take it. Returns the epoch the call was admitted in."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+            return self.epoch
+
+    def release(self, epoch: int, outcome: str) -> None:
+        """Free a slot and adapt the limit to the outcome of the call."""
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == SUCCESS:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            elif outcome == THROTTLED and epoch == self.epoch:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self.epoch += 1
+                logger.warning(f"{self.name} is throttling requests. Concurrency lowered to {self.concurrency}.")
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """Stop calling a host after {failure_threshold} consecutive failed or throttled calls. Once
+       {reset_timeout} seconds have passed, a single probe call is let through: the circuit closes
+       again if it succeeds and stays open for another {reset_timeout} seconds otherwise.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS) -> None:
+        if failure_threshold < 1:
+            raise ValueError("Argument 'failure_threshold' must be higher than 0.")
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call is allowed to go through."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit breaker for {self.host} lets a probe call through.")
+                return
+            raise CircuitOpenError(self.host, max(retry_in, 0))
+
+    def record(self, outcome: str) -> None:
+        """Update the state of the circuit with the outcome of a call."""
+        with self.lock:
+            if outcome == SUCCESS:
+                if self.state != self.CLOSED:
+                    logger.info(f"Circuit breaker for {self.host} is closed again.")
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"Circuit breaker for {self.host} opened after {self.failures} failed calls.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Give the circuit back after a call that ended without telling whether the host recovered. A pending
+           probe opens the circuit again, already past its timeout, so that the next call probes the host."""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker of a host, creating it on first use."""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def backoff_delay(attempt: int, base: float = UPSTREAM_BACKOFF_SECONDS,
+                  cap: float = UPSTREAM_MAX_BACKOFF_SECONDS) -> float:
+    """Exponential backoff with full jitter, so that workers throttled together do not retry together."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Check whether an exception means that the upstream is throttling, rather than failing."""
+    if isinstance(error, ThrottledError):
+        return True
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in (429, 503):
+        return True
+    message = str(error).lower()
+    return "too many requests" in message or "rate limit" in message
+
+
+def call_with_retry(func: Callable[[], Any],
+                    host: str,
+                    is_throttled: Optional[Callable[[Any], bool]] = None,
+                    controller: Optional[AIMDController] = None,
+                    max_retries: int = UPSTREAM_MAX_RETRIES,
+                    backoff_seconds: float = UPSTREAM_BACKOFF_SECONDS,
+                    retry_on: Tuple[Type[Exception], ...] = (Exception,)) -> Any:
+    """Call {func} through the circuit breaker of {host}, retrying with backoff while it raises or
+       its result is throttled. Every outcome is reported to the breaker and to {controller}.
+
+    Args:
+        func (Callable[[], Any]): Call to the upstream.
+        host (str): Host key of the circuit breaker.
+        is_throttled (Callable[[Any], bool], optional): Tells whether a result is actually a throttled
+                                                        response, such as an empty payload. Defaults to None.
+        controller (AIMDController, optional): Controller that admits the call. Defaults to None.
+        max_retries (int, optional): Number of retries after the first call. Defaults to the
+                                     STOCKS_UPSTREAM_MAX_RETRIES environment variable (3).
+        backoff_seconds (float, optional): Base of the exponential backoff. Defaults to the
+                                           STOCKS_UPSTREAM_BACKOFF_SECONDS environment variable (2).
+        retry_on (Tuple[Type[Exception], ...], optional): Exceptions that are retried and count as upstream
+                                                          failures. Any other one is raised straight away.
+                                                          Defaults to (Exception,).
+
+    Raises:
+        CircuitOpenError: Raised if the circuit of {host} is open.
+        ThrottledError: Raised if the result was still throttled after all retries.
+
+    Returns:
+        Any: Result of {func}.
+    """
+    breaker = get_circuit_breaker(host)
+    for attempt in range(max_retries + 1):
+        breaker.before_call()
+        epoch = None
+        error = None
+        outcome = None
+        try:
+            epoch = controller.acquire() if controller is not None else None
+            result = func()
+            outcome = THROTTLED if is_throttled is not None and is_throttled(result) else SUCCESS
+        except retry_on as e:
+            error = e
+            outcome = THROTTLED if is_throttling_error(e) else FAILED
+        finally:
+            if epoch is not None:
+                controller.release(epoch, outcome or FAILED)
+            if outcome is None:
+                # Not an upstream failure (e.g. an unknown symbol), so it is not counted against the host,
+                # but a probe call must not leave the circuit half-open
+                breaker.release_probe()
+        breaker.record(outcome)
+        if outcome == SUCCESS:
+            return result
+        if attempt < max_retries:
+            wait_time = backoff_delay(attempt, backoff_seconds)
+            logger.warning(f"Call to {host} was {outcome} (attempt {attempt + 1}/{max_retries + 1}). "\
+                           f"Retrying in {wait_time:.1f} seconds.")
+            time.sleep(wait_time)
+    if error is not None:
+        raise error
+    raise ThrottledError(host)
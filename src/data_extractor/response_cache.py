@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from config.log_config import logger
+from config.pipeline_config import (CACHE_PATH, RESPONSE_CACHE_MODE, INTRADAY_CACHE_TTL_SECONDS,
+                                    DAILY_CACHE_TTL_SECONDS)
+from utils.error_handling import CacheMissError
+
+
+class ResponseCache:
+    """Content-addressed disk cache for raw extractor responses. Each entry is keyed by the hash of
+       its endpoint and parameters, and stored as a single file whose modification time is the time
+       it was fetched.
+
+       Three modes are accepted:
+        - off: nothing is read nor written.
+        - on: fresh entries are served and every new response is stored.
+        - replay: only cached responses are served, whatever their age. A miss raises CacheMissError,
+                  so a whole run can be reproduced without touching the network.
+    """
+
+    MODES = ["off", "on", "replay"]
+    # Query parameters that must never be part of a key
+    EXCLUDED_PARAMS = ["apikey"]
+
+    def __init__(self, cache_dir: str, mode: str = "on") -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Argument 'mode' must be one of these categories: {', '.join(self.MODES)}")
+        self.cache_dir = Path(cache_dir)
+        self.mode = mode
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @classmethod
+    def make_key(cls, endpoint: str, params: Optional[dict] = None) -> str:
+        """Hash an endpoint and its parameters into a cache key. Parameters are sorted, so their
+           order does not matter.
+        """
+        params = {name: value for name, value in (params or {}).items() if name not in cls.EXCLUDED_PARAMS}
+        identity = json.dumps({"endpoint": endpoint, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    @classmethod
+    def make_url_key(cls, url: str) -> str:
+        """Cache key of a GET request, built from its url without the API key."""
+        parsed_url = urlparse(url)
+        endpoint = f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}"
+        return cls.make_key(endpoint, dict(parse_qsl(parsed_url.query)))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _fresh_path(self, key: str, ttl_seconds: Optional[float] = None,
+                    not_before: Optional[datetime] = None) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            if self.mode == "replay":
+                raise CacheMissError(key)
+            return None
+        if self.mode != "replay":
+            fetched_at = datetime.fromtimestamp(path.stat().st_mtime)
+            if ttl_seconds is not None and (datetime.now() - fetched_at).total_seconds() > ttl_seconds:
+                return None
+            if not_before is not None and fetched_at < not_before:
+                return None
+        logger.debug(f"Serving response '{key}' from cache.")
+        return path
+
+    def get(self, key: str, ttl_seconds: Optional[float] = None,
+            not_before: Optional[datetime] = None) -> Optional[bytes]:
+        """Read a cached payload.
+
+        Args:
+            key (str): Cache key.
+            ttl_seconds (float, optional): Maximum age of the entry. None means the entry never expires.
+            not_before (datetime, optional): Entries fetched before this moment are ignored. Used for
+                                             history that cannot change once it has been fetched after
+                                             its end date. Defaults to None.
+
+        Raises:
+            CacheMissError: Raised in replay mode when the key is not cached.
+
+        Returns:
+            Optional[bytes]: Cached payload, or None if missing or stale.
+        """
+        path = self._fresh_path(key, ttl_seconds, not_before)
+        return path.read_bytes() if path is not None else None
+
+    def get_stream(self, key: str, ttl_seconds: Optional[float] = None, not_before: Optional[datetime] = None,
+                   chunk_size: int = 1 << 16) -> Optional[Iterator[bytes]]:
+        """Same as 'get', but the payload is read lazily in chunks of {chunk_size} bytes."""
+        path = self._fresh_path(key, ttl_seconds, not_before)
+        if path is None:
+            return None
+
+        def read_chunks() -> Iterator[bytes]:
+            with open(path, "rb") as cached_file:
+                while True:
+                    chunk = cached_file.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        return read_chunks()
+
+    def put(self, key: str, payload: bytes) -> None:
+        """Store a payload. The file is written aside and then moved, so readers never see half of it."""
+        if self.mode != "on":
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass the chunks of a payload through while they are written to disk. The entry is only
+           stored if the chunks are consumed to the end, so a partially read body is never cached.
+        """
+        if self.mode != "on":
+            yield from chunks
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        completed = False
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                for chunk in chunks:
+                    tmp_file.write(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                os.replace(tmp_path, path)
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+    def discard(self, key: str) -> None:
+        """Remove an entry, e.g. a streamed payload that turned out to be an error message."""
+        if self.mode == "on":
+            self._path(key).unlink(missing_ok=True)
+
+
+def cache_policy(until_date: Optional[str], intraday: bool) -> Tuple[Optional[float], Optional[datetime]]:
+    """Decide how long a response may be served from cache. History that ends before today is
+       immutable as long as it was fetched after its last day. Anything reaching today expires after
+       the intraday or daily TTL.
+
+    Args:
+        until_date (str, optional): Last day covered by the request, in "%Y-%m-%d" format.
+        intraday (bool): Whether the response holds intraday quotes.
+
+    Returns:
+        Tuple[Optional[float], Optional[datetime]]: 'ttl_seconds' and 'not_before' arguments for ResponseCache.get.
+    """
+    if until_date is not None:
+        try:
+            last_day = date.fromisoformat(str(until_date)[:10])
+        except ValueError:
+            last_day = None
+        if last_day is not None and last_day < date.today():
+            return None, datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    return (INTRADAY_CACHE_TTL_SECONDS if intraday else DAILY_CACHE_TTL_SECONDS), None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """Return the process-wide response cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(os.path.join(CACHE_PATH, "responses"), mode=RESPONSE_CACHE_MODE)
+        return _cache
@@ -1,5 +1,6 @@
+import io
 from datetime import datetime, timedelta
-from typing import Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
 
 import pandas as pd
 import yfinance as yf
@@ -7,12 +8,19 @@ import yfinance as yf
 from config.log_config import logger
 from utils.rename_columns import rename_yf_columns
 from src.data_extractor.base_extractor import BaseExtractor
+from src.data_extractor.response_cache import ResponseCache, cache_policy, get_cache
+from utils.trading_calendar import trading_days
 
 
 class StockExtractor(BaseExtractor):
     """Extract stock rates from the AlphaVantage API."""
 
     VALID_INTERVALS = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
+    # Maximum number of calendar days a single yfinance request may span, per interval.
+    # Intervals that are not listed have no limit.
+    MAX_SPAN_DAYS = {"1m": 7, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "60m": 730, "90m": 60, "1h": 730}
+    # Number of days back from today for which yfinance keeps quotes of each interval
+    MAX_HISTORY_DAYS = {"1m": 30, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "60m": 730, "90m": 60, "1h": 730}
 
     def __init__(self, symbol: str):
         super().__init__()
@@ -22,14 +30,16 @@ class StockExtractor(BaseExtractor):
     def get_data(self,
                  end_date: str = datetime.now().strftime('%Y-%m-%d'),
                  lookback_period: int = 30,
-                 chunk_size: int = 7,
+                 chunk_size: Optional[int] = None,
                  interval: str = "1m")-> pd.DataFrame:
         """Get OHLCV data for any given stock, with a given frequency, with a maximum lookback period of 30 days.
+           Only trading sessions are requested, in as few requests as the interval allows.
 
         Args:
             end_date (str): Latest date to compute. Follows the "%Y-%m-%d" format.
             lookback_period (int): Number of days to look back from the end date. Maximum 30 days.
-            chunk_size (int): Number of days that each chunk must have.
+            chunk_size (int, optional): Maximum number of days that each request may span. Defaults to None,
+                                        which is the longest span yfinance accepts for the interval.
             interval (str, optional): The interval determines the time span between to consecutive rows in the dataframe.
                                       Defaults to "1d".
 
@@ -37,20 +47,148 @@ class StockExtractor(BaseExtractor):
             pd.DataFrame: Dataframe with OHLCV data for the given stock.
         """
         df_list = []
-        start_dates, end_dates = self.calculate_date_chunks(end_date, lookback_period, chunk_size)
+        start_dates, end_dates = self.plan_date_chunks(end_date, lookback_period, interval, chunk_size)
         for start, end in zip(start_dates, end_dates):
-            data_extracted_df = yf.download(tickers=self.symbol, start=start, end=end, interval=interval)
-            data_extracted_df = data_extracted_df.rename(columns = rename_yf_columns)
-            _time = datetime.now()
-            data_extracted_df['timestamp'] = _time
-            data_extracted_df['timestamp_day'] = _time.strftime("%Y-%m-%d")
-            data_extracted_df['datetime'] = data_extracted_df.index
-            data_extracted_df['symbol'] = self.symbol
-            df_list.append(data_extracted_df)
-        df = pd.concat(df_list)
+            data_extracted_df = self._download(tickers=self.symbol, start=start, end=end, interval=interval)
+            df_list.append(self._format_downloaded_df(data_extracted_df, self.symbol))
+        df = pd.concat(df_list) if df_list else pd.DataFrame()
         logger.debug(f"Data on {self.symbol} with {len(df)} rows has been imported successfully.")
         return df
 
+    @classmethod
+    def get_batch_data(cls,
+                       symbols: List[str],
+                       end_date: str = datetime.now().strftime('%Y-%m-%d'),
+                       lookback_period: int = 30,
+                       chunk_size: Optional[int] = None,
+                       interval: str = "1m",
+                       batch_size: int = 50) -> Dict[str, pd.DataFrame]:
+        """Get OHLCV data for several stocks at once, downloading up to {batch_size} tickers per request.
+
+        Args:
+            symbols (List[str]): Symbols of the stocks to be fetched.
+            end_date (str): Latest date to compute. Follows the "%Y-%m-%d" format.
+            lookback_period (int): Number of days to look back from the end date. Maximum 30 days.
+            chunk_size (int, optional): Maximum number of days that each request may span. Defaults to None,
+                                        which is the longest span yfinance accepts for the interval.
+            interval (str, optional): The interval determines the time span between to consecutive rows in the dataframe.
+                                      Defaults to "1m".
+            batch_size (int, optional): Maximum number of tickers per request. Defaults to 50.
+
+        Returns:
+            Dict[str, pd.DataFrame]: Dictionary with one dataframe per symbol, with the same columns that
+                                     'get_data' returns.
+        """
+        symbols = list(symbols)
+        df_lists = {symbol: [] for symbol in symbols}
+        start_dates, end_dates = cls.plan_date_chunks(end_date, lookback_period, interval, chunk_size)
+        for n in range(0, len(symbols), batch_size):
+            batch = symbols[n : n + batch_size]
+            for start, end in zip(start_dates, end_dates):
+                data_extracted_df = cls._download(tickers=batch, start=start, end=end, interval=interval,
+                                                  group_by="ticker", threads=False, progress=False)
+                for symbol, symbol_df in cls._split_batch_df(data_extracted_df, batch).items():
+                    df_lists[symbol].append(cls._format_downloaded_df(symbol_df, symbol))
+        data = {symbol: pd.concat(df_list) if df_list else pd.DataFrame() for symbol, df_list in df_lists.items()}
+        logger.debug(f"Data on {len(symbols)} symbols has been imported successfully in batches of {batch_size}.")
+        return data
+
+    @staticmethod
+    def _download(tickers: Union[str, List[str]], start: str, end: str, interval: str, **kwargs) -> pd.DataFrame:
+        """Call yf.download through the shared response cache. Chunks that end before today are
+           immutable once fetched, while those reaching today expire after the intraday or daily TTL.
+           Frames are cached as Parquet, which unlike pickle runs no code when read and does not depend
+           on the pandas version.
+        """
+        cache = get_cache()
+        if not cache.enabled:
+            return yf.download(tickers=tickers, start=start, end=end, interval=interval, **kwargs)
+        params = {"tickers": tickers, "start": start, "end": end, "interval": interval, **kwargs}
+        params.pop("progress", None)
+        key = ResponseCache.make_key("yfinance.download.parquet", params)
+        # yfinance excludes the end date, so the last day covered is the one before
+        last_day = (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        cached = cache.get(key, *cache_policy(last_day, intraday=interval[-1] in "mh"))
+        if cached is not None:
+            return pd.read_parquet(io.BytesIO(cached))
+        data_extracted_df = yf.download(tickers=tickers, start=start, end=end, interval=interval, **kwargs)
+        if not data_extracted_df.empty:
+            buffer = io.BytesIO()
+            data_extracted_df.to_parquet(buffer)
+            cache.put(key, buffer.getvalue())
+        return data_extracted_df
+
+    @staticmethod
+    def _split_batch_df(batch_df: pd.DataFrame, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """Split the multi-index result of a multi-ticker download into one dataframe per symbol.
+           Rows where the symbol had no quote at all are dropped.
+        """
+        if not isinstance(batch_df.columns, pd.MultiIndex):
+            # Single-ticker downloads may come back with flat columns
+            return {symbols[0]: batch_df.dropna(how="all")}
+        downloaded = batch_df.columns.get_level_values(0)
+        split_dfs = {}
+        for symbol in symbols:
+            if symbol in downloaded:
+                split_dfs[symbol] = batch_df[symbol].dropna(how="all")
+            else:
+                logger.debug(f"No data was returned for {symbol} in its batch.")
+                split_dfs[symbol] = pd.DataFrame(columns=batch_df[downloaded[0]].columns)
+        return split_dfs
+
+    @staticmethod
+    def _format_downloaded_df(data_extracted_df: pd.DataFrame, symbol: str) -> pd.DataFrame:
+        """Rename the yfinance columns and add the metadata columns expected by the DB models."""
+        data_extracted_df = data_extracted_df.rename(columns = rename_yf_columns)
+        _time = datetime.now()
+        data_extracted_df['timestamp'] = _time
+        data_extracted_df['timestamp_day'] = _time.strftime("%Y-%m-%d")
+        data_extracted_df['datetime'] = data_extracted_df.index
+        data_extracted_df['symbol'] = symbol
+        return data_extracted_df
+
+    @classmethod
+    def plan_date_chunks(cls, end_date: str, lookback_period: int, interval: str,
+                         chunk_size: Optional[int] = None) -> Tuple[List[str], List[str]]:
+        """Plan the fewest requests that cover every trading session of the lookback period. Weekends and
+           exchange holidays are skipped, and each request spans at most the number of days yfinance
+           accepts for {interval}. Days that yfinance no longer keeps for {interval} are left out.
+
+        Args:
+            end_date (str): Latest date to compute. Follows the "%Y-%m-%d" format.
+            lookback_period (int): Number of days to look back from the end date, the end date included.
+            interval (str): yfinance interval of the quotes.
+            chunk_size (int, optional): Maximum number of days that each request may span, if lower than
+                                        the limit of the interval. Defaults to None.
+
+        Returns:
+            Tuple[List[str], List[str]]: Start and end day of every request, in ascending order. End days
+                                         are excluded from the request, as yfinance expects them.
+        """
+        date_format = "%Y-%m-%d"
+        end_day = datetime.strptime(end_date, date_format).date()
+        start_day = end_day - timedelta(days=lookback_period - 1)
+        if interval in cls.MAX_HISTORY_DAYS:
+            earliest_day = datetime.now().date() - timedelta(days=cls.MAX_HISTORY_DAYS[interval] - 1)
+            if start_day < earliest_day:
+                logger.warning(f"yfinance only keeps {interval} quotes for the last {cls.MAX_HISTORY_DAYS[interval]} "\
+                               f"days. Quotes before {earliest_day} are not requested.")
+                start_day = earliest_day
+        max_span = min(cls.MAX_SPAN_DAYS.get(interval, lookback_period), chunk_size or lookback_period)
+        start_dates = []
+        end_dates = []
+        chunk_start = None
+        for session in trading_days(start_day, end_day).tolist():
+            if chunk_start is None or (session - chunk_start).days >= max_span:
+                if chunk_start is not None:
+                    end_dates.append((last_session + timedelta(days=1)).strftime(date_format))
+                chunk_start = session
+                start_dates.append(session.strftime(date_format))
+            last_session = session
+        if chunk_start is not None:
+            end_dates.append((last_session + timedelta(days=1)).strftime(date_format))
+        return start_dates, end_dates
+
     @staticmethod
     def calculate_date_chunks(end_date: str, lookback_period: int, chunk_size: int) -> Union[Tuple[str], Tuple[str]]:
         """Calculate periods of {chunk_size} days according to an end date and a lookback period.
@@ -5,17 +5,24 @@ import random
 import requests
 import pandas as pd
 from io import StringIO
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Any
+from typing import Dict, List, Any, Optional, Set, Tuple
 
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
 
 from utils.headers import headers
 from config.log_config import logger
+from config.pipeline_config import CACHE_PATH, ENRICHMENT_TTL_DAYS, ENRICHMENT_WORKERS, AIMD_INITIAL_CONCURRENCY
 from database.utils_db import UtilsDB
 from database.models import Nasdaq, Other
 from utils.rename_columns import rename_sec_columns
+from utils.enrichment_cache import EnrichmentCache
+from utils.error_handling import CircuitOpenError
+from src.data_extractor.resilience import AIMDController, YAHOO_HOST, call_with_retry
 
 """
 VARIABLES
@@ -27,18 +34,40 @@ class GeneralInformation:
        security name, financial status, industry and sector, among others.
     """
 
-    def __init__(self) -> None:
-        pass
+    CHANGE_TYPES = ["added", "removed", "changed", "unchanged"]
+    # Columns that are not part of the listing itself, and therefore never count as a change
+    NON_LISTING_COLUMNS = ["symbol", "timestamp", "source_time", "registration_date", "industry", "sector"]
+
+    def __init__(self, max_workers: int = ENRICHMENT_WORKERS) -> None:
+        """Class initializer.
+
+        Args:
+            max_workers (int, optional): Number of concurrent requests used to resolve industries and
+                                         sectors missing from the local cache. Defaults to the
+                                         STOCKS_ENRICHMENT_WORKERS environment variable (8). Requests
+                                         start at a lower concurrency, which is raised while yfinance
+                                         answers and halved when it throttles.
+        """
+        self.max_workers = max_workers
+        self.controller = AIMDController(initial=min(AIMD_INITIAL_CONCURRENCY, max_workers),
+                                         maximum=max_workers, name="yfinance")
+        self.symbol_changes = {change: [] for change in self.CHANGE_TYPES}
+        self.enrichment_cache = EnrichmentCache(os.path.join(CACHE_PATH, "industries_sectors.json"),
+                                                ttl_days=ENRICHMENT_TTL_DAYS)
 
     def run_extraction(self, securities_filter: List[str] = ['nasdaq', 'other']) -> pd.DataFrame:
-        """Run all methods sequentially to get the joint results of all scrapings.
+        """Run all methods sequentially to get the joint results of all scrapings. Listings are compared
+           against the latest stored snapshot first, so that only added or changed symbols are enriched.
+           The whole directory is still stored as today's snapshot, which the next run compares against.
 
         Returns:
             pd.DataFrame: Dataframe containing information on different assets, as well as 
                           their industry group.
         """
         list_of_dfs = self.extract_securities(securities_filter = securities_filter)
-        list_of_dfs_with_ind_sect = self._extract_industries_sectors(list_of_dfs)
+        # Only new or modified listings need to be enriched again
+        symbols_to_enrich = self._diff_against_snapshots(list_of_dfs)
+        list_of_dfs_with_ind_sect = self._extract_industries_sectors(list_of_dfs, symbols_to_enrich)
         self.save_tables(list_of_dfs_with_ind_sect)
         joint_df_with_ind_sect = pd.concat(list_of_dfs_with_ind_sect)
         return joint_df_with_ind_sect
@@ -99,43 +128,149 @@ class GeneralInformation:
         df.metadata = metadata
         return df
 
-    def _extract_industries_sectors(self, list_of_securities: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    def _diff_against_snapshots(self, list_of_securities: List[pd.DataFrame]) -> Set[str]:
+        """Compare each freshly downloaded directory against the latest snapshot stored in its model, and
+           classify symbols as added, removed, changed or unchanged. The classification is kept in the
+           'symbol_changes' attribute. Unchanged symbols get their industry and sector from the snapshot.
+
+        Args:
+            list_of_securities (List[pd.DataFrame]): List of dataframes with the downloaded directories.
+
+        Returns:
+            Set[str]: Symbols that were added or changed, or whose snapshot has no industry or sector, and
+                      therefore need to be enriched.
+        """
+        utils_db = UtilsDB()
+        self.symbol_changes = {change: [] for change in self.CHANGE_TYPES}
+        missing_info = set()
+        for sec in list_of_securities:
+            snapshot = utils_db.read_latest_snapshot(sec.metadata['model'])
+            changes = self._classify_changes(sec, snapshot)
+            for change, symbols in changes.items():
+                self.symbol_changes[change].extend(symbols)
+            previous_info = snapshot.set_index('symbol').reindex(sec['symbol'])
+            is_unchanged = sec['symbol'].isin(changes['unchanged']).to_numpy()
+            sec['industry'] = previous_info['industry'].astype(object).where(is_unchanged, None).to_numpy()
+            sec['sector'] = previous_info['sector'].astype(object).where(is_unchanged, None).to_numpy()
+            # Unchanged symbols whose previous enrichment failed are retried
+            has_no_info = (previous_info['industry'].isna() | previous_info['sector'].isna()).to_numpy()
+            missing_info.update(sec['symbol'][is_unchanged & has_no_info])
+        logger.info(", ".join(f"{len(symbols)} {change}" for change, symbols in self.symbol_changes.items()) \
+                    + " symbols compared to the latest snapshot.")
+        return set(self.symbol_changes['added']) | set(self.symbol_changes['changed']) | missing_info
+
+    @classmethod
+    def _classify_changes(cls, new_df: pd.DataFrame, snapshot_df: pd.DataFrame) -> Dict[str, List[str]]:
+        """Classify the symbols of a directory against a previous snapshot of it.
+
+        Args:
+            new_df (pd.DataFrame): Freshly downloaded directory.
+            snapshot_df (pd.DataFrame): Previous snapshot. It may be empty.
+
+        Returns:
+            Dict[str, List[str]]: Symbols for each type of change.
+        """
+        compared_columns = [
+            column for column in new_df.columns
+            if column in snapshot_df.columns and column not in cls.NON_LISTING_COLUMNS
+        ]
+        new_listing = new_df.drop_duplicates('symbol').set_index('symbol')[compared_columns]
+        old_listing = snapshot_df.drop_duplicates('symbol').set_index('symbol')[compared_columns]
+        added = new_listing.index.difference(old_listing.index)
+        removed = old_listing.index.difference(new_listing.index)
+        common = new_listing.index.intersection(old_listing.index)
+        # Compare as text, since the DB stores every listing column as a string
+        new_values = new_listing.loc[common].fillna('').astype(str)
+        old_values = old_listing.loc[common].fillna('').astype(str)
+        is_changed = (new_values != old_values).any(axis=1)
+        return {
+            'added': added.tolist(),
+            'removed': removed.tolist(),
+            'changed': is_changed[is_changed].index.tolist(),
+            'unchanged': is_changed[~is_changed].index.tolist(),
+        }
+
+    def _extract_industries_sectors(self, list_of_securities: List[pd.DataFrame],
+                                    symbols_to_enrich: Optional[Set[str]] = None) -> List[pd.DataFrame]:
         """Extract the industry and sector of each of the rows (ETFs) in the dataframe.
-           If symbol is an ETF, not industry nor sector is given.
+           If symbol is an ETF, not industry nor sector is given. Values are taken from the local
+           enrichment cache when possible, and only the missing or stale ones are fetched, concurrently.
 
         Args:
             list_of_securities (List[pd.DataFrame]): List of dataframes with symbols from which to fetch their 
                                                      industry and sector.
+            symbols_to_enrich (Set[str], optional): If given, only these symbols are enriched, and the
+                                                    "industry" and "sector" values already present in the
+                                                    dataframes are kept for the rest. Defaults to None.
 
         Returns:
             List[pd.DataFrame]: Same list of dataframes as input but with "industry" and "sector" as extra columns.
         """
-        for sec in list_of_securities:
-            industry_list, sector_list = [], []
-            for symbol in sec['symbol']:
-                if sec[sec['symbol'] == symbol].iloc[0]['is_etf'] == 'N':
-                    try:
-                        info = yf.Ticker(symbol.replace(".", "-")).info
-                        industry_list.append(info.get('industry', 'N/A'))
-                        sector_list.append(info.get('sector', 'N/A'))
-                    except requests.exceptions.HTTPError:
-                        industry_list.append(None)
-                        sector_list.append(None)
-                        logger.debug(f"Request returned an HTTP error. "\
-                                     f"No industry nor sector was found for {symbol}.")
-                    except requests.exceptions.ChunkedEncodingError:
-                        industry_list.append(None)
-                        sector_list.append(None)
-                        logger.debug(f"Connection broken. "\
-                                     f"No industry nor sector was found for {symbol}.")
-                else:
-                    industry_list.append(None)
-                    sector_list.append(None)
-                    logger.debug(f"Symbol is an ETF. "\
-                                f"No industry nor sector was applied for {symbol}.")
-            sec['industry'] = industry_list
-            sec['sector'] = sector_list
+        # Whatever was fetched is kept for the next runs, even if the enrichment is interrupted
+        try:
+            for sec in list_of_securities:
+                is_stock = sec['is_etf'] == 'N'
+                to_enrich = is_stock if symbols_to_enrich is None \
+                            else is_stock & sec['symbol'].isin(symbols_to_enrich)
+                stock_symbols = sec.loc[to_enrich, 'symbol'].unique().tolist()
+                found = {}
+                missing_symbols = []
+                for symbol in stock_symbols:
+                    cached = self.enrichment_cache.get(symbol)
+                    if cached is None:
+                        missing_symbols.append(symbol)
+                    else:
+                        found[symbol] = cached
+                logger.info(f"{len(found)} industries and sectors found in cache, "\
+                            f"{len(missing_symbols)} to be fetched.")
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    fetched = executor.map(self._fetch_industry_sector, missing_symbols)
+                    for symbol, info in zip(missing_symbols, fetched):
+                        if info is not None:
+                            self.enrichment_cache.set(symbol, *info)
+                            found[symbol] = info
+                industry_map = {symbol: info[0] for symbol, info in found.items()}
+                sector_map = {symbol: info[1] for symbol, info in found.items()}
+                has_info = to_enrich & sec['symbol'].isin(list(found))
+                industries = sec['symbol'].map(industry_map).astype(object).where(has_info, None)
+                sectors = sec['symbol'].map(sector_map).astype(object).where(has_info, None)
+                if symbols_to_enrich is not None and 'industry' in sec.columns:
+                    industries = industries.where(to_enrich, sec['industry'])
+                    sectors = sectors.where(to_enrich, sec['sector'])
+                sec['industry'] = industries
+                sec['sector'] = sectors
+        finally:
+            self.enrichment_cache.save()
         return list_of_securities
+
+    def _fetch_industry_sector(self, symbol: str) -> Optional[Tuple[str, str]]:
+        """Request the industry and sector of a single symbol, retrying while yfinance throttles.
+           Returns None if it could not be fetched.
+        """
+        try:
+            info = call_with_retry(lambda: yf.Ticker(symbol.replace(".", "-")).info, host=YAHOO_HOST,
+                                   controller=self.controller,
+                                   retry_on=(YFRateLimitError, requests.exceptions.ConnectionError,
+                                             requests.exceptions.Timeout))
+            return info.get('industry', 'N/A'), info.get('sector', 'N/A')
+        except YFRateLimitError:
+            logger.warning(f"yfinance kept throttling requests. "\
+                           f"No industry nor sector was found for {symbol}.")
+        except CircuitOpenError as e:
+            logger.debug(f"{e} No industry nor sector was found for {symbol}.")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            logger.debug(f"Could not connect with yfinance. "\
+                         f"No industry nor sector was found for {symbol}.")
+        except requests.exceptions.HTTPError:
+            logger.debug(f"Request returned an HTTP error. "\
+                         f"No industry nor sector was found for {symbol}.")
+        except requests.exceptions.ChunkedEncodingError:
+            logger.debug(f"Connection broken. "\
+                         f"No industry nor sector was found for {symbol}.")
+        except Exception as e:
+            # e.g. a malformed payload. One symbol must not stop the enrichment of the rest
+            logger.warning(f"Unexpected error {e!r}. No industry nor sector was found for {symbol}.")
+        return None
     
     def save_tables(self, dfs_list: List[pd.DataFrame]) -> None:
         """Save any list of dataframes into the DB. A previous model with the data 
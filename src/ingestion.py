@@ -0,0 +1,286 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Fetch OHLCV data for a whole universe of symbols through a bounded pool of workers, and
+hand every symbol over to the writers as soon as it has been fetched.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from config.log_config import logger
+from config.pipeline_config import (MAX_WORKERS, BATCH_SIZE, MAX_IN_FLIGHT_SYMBOLS, AIMD_INITIAL_CONCURRENCY,
+                                    UPSTREAM_MAX_RETRIES)
+from database.copy_loader import wall_time
+from src.data_extractor.resilience import AIMDController, YAHOO_HOST, backoff_delay, call_with_retry
+from src.data_extractor.stock_extractor import StockExtractor
+from utils.error_handling import CircuitOpenError, ThrottledError
+from utils.trading_calendar import is_trading_day
+
+
+class InFlightLimiter:
+    """Counter of symbols that have been requested but not written yet. A whole batch is admitted
+       at once, so that workers never hold part of the capacity while waiting for the rest.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, n: int) -> None:
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight + n <= self.capacity)
+            self.in_flight += n
+
+    def release(self, n: int = 1) -> None:
+        with self.condition:
+            self.in_flight -= n
+            self.condition.notify_all()
+
+
+class IngestionPipeline:
+    """Fetch daily and one-minute quotes for many symbols concurrently. Symbols are grouped in
+       batches that are downloaded together, and each worker handles one batch at a time. A failure
+       on one batch is logged and recorded, but never stops the rest of the universe.
+
+       Fetched symbols flow through a queue into a writer thread. At most {max_in_flight} symbols
+       can be fetched but not yet written, so fetch workers wait when writers fall behind and memory
+       does not grow with the size of the universe.
+
+       When {adaptive}, the number of batches fetched at the same time is not fixed: an AIMD controller
+       raises it while yfinance answers and halves it when it throttles, with {max_workers} as the
+       ceiling. Throttled or failed batches are retried with backoff before being given up. While the
+       circuit breaker of yfinance is open, batches wait for it to let calls through again; a batch is
+       only given up once the circuit has stayed open through {max_retries} of its waits.
+    """
+
+    # Table key and yfinance interval of every quote table that is fed
+    INTERVALS = {"daily": "1d", "1min": "1m"}
+
+    def __init__(self, max_workers: int = MAX_WORKERS, batch_size: int = BATCH_SIZE,
+                 max_in_flight: int = MAX_IN_FLIGHT_SYMBOLS, lookback_period: int = 2, chunk_size: Optional[int] = None,
+                 adaptive: bool = True, max_retries: int = UPSTREAM_MAX_RETRIES) -> None:
+        """Class initializer.
+
+        Args:
+            max_workers (int, optional): Maximum number of symbols fetched at the same time.
+                                         Defaults to the STOCKS_MAX_WORKERS environment variable (8).
+            batch_size (int, optional): Number of symbols downloaded in a single request. A value of 1
+                                        fetches every symbol on its own. Defaults to the STOCKS_BATCH_SIZE
+                                        environment variable (50).
+            max_in_flight (int, optional): Maximum number of symbols held in memory between fetch and write.
+                                           Must be at least {batch_size}. Defaults to the
+                                           STOCKS_MAX_IN_FLIGHT_SYMBOLS environment variable (200).
+            lookback_period (int, optional): Number of days to look back from today. When watermarks are
+                                             used, this is the maximum lookback. Defaults to 2.
+            chunk_size (int, optional): Maximum number of days that each request may span. Defaults to None,
+                                        which is the longest span yfinance accepts for each interval.
+            adaptive (bool, optional): Tune concurrency to the rate yfinance allows, starting from the
+                                       STOCKS_AIMD_INITIAL_CONCURRENCY environment variable (2). If False,
+                                       {max_workers} batches are always fetched at once. Defaults to True.
+            max_retries (int, optional): Retries of a throttled or failed batch. Defaults to the
+                                         STOCKS_UPSTREAM_MAX_RETRIES environment variable (3).
+        """
+        if max_workers < 1:
+            raise ValueError("Argument 'max_workers' must be higher than 0.")
+        if batch_size < 1:
+            raise ValueError("Argument 'batch_size' must be higher than 0.")
+        if max_in_flight < batch_size:
+            raise ValueError("Argument 'max_in_flight' cannot be smaller than 'batch_size'.")
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.lookback_period = lookback_period
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.controller = None
+        if adaptive:
+            self.controller = AIMDController(initial=min(AIMD_INITIAL_CONCURRENCY, max_workers),
+                                             maximum=max_workers, name="yfinance")
+        self.failed_symbols = []
+
+    def fetch_symbol(self, symbol: str, watermarks: Optional[Dict[str, datetime]] = None) -> Dict[str, pd.DataFrame]:
+        """Fetch daily and one-minute OHLCV data for a single symbol.
+
+        Args:
+            symbol (str): Symbol of the stock.
+            watermarks (Dict[str, datetime], optional): Latest datetime already stored for each of the
+                                                        'daily' and '1min' tables. Defaults to None.
+
+        Returns:
+            Dict[str, pd.DataFrame]: Dictionary with the 'daily' and '1min' dataframes.
+        """
+        return self.fetch_batch([symbol], {symbol: watermarks or {}})[symbol]
+
+    def fetch_batch(self, symbols: List[str],
+                    watermarks: Optional[Dict[str, Dict[str, datetime]]] = None) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """Fetch daily and one-minute OHLCV data for a batch of symbols with multi-ticker downloads.
+           When watermarks are given, only the days after the oldest watermark of the batch are
+           requested and rows that are already stored are dropped.
+
+        Raises:
+            ThrottledError: Raised if a multi-ticker daily download is empty for every symbol even though
+                            the market held a session during the requested days, which is how yfinance answers
+                            once it throttles.
+
+        Args:
+            symbols (List[str]): Symbols of the batch.
+            watermarks (Dict[str, Dict[str, datetime]], optional): Latest datetime already stored for each
+                                                                    symbol and interval. Defaults to None.
+
+        Returns:
+            Dict[str, Dict[str, pd.DataFrame]]: Dictionary with the 'daily' and '1min' dataframes of each symbol.
+        """
+        watermarks = watermarks or {}
+        batch_data = {symbol: {} for symbol in symbols}
+        for key, interval in self.INTERVALS.items():
+            symbol_watermarks = {symbol: watermarks.get(symbol, {}).get(key) for symbol in symbols}
+            lookback_period = self._lookback_from_watermarks(list(symbol_watermarks.values()))
+            if len(symbols) == 1:
+                extractor = StockExtractor(symbols[0])
+                dfs = {symbols[0]: extractor.get_data(lookback_period=lookback_period, chunk_size=self.chunk_size,
+                                                      interval=interval)}
+            else:
+                dfs = StockExtractor.get_batch_data(symbols, lookback_period=lookback_period, chunk_size=self.chunk_size,
+                                                    interval=interval, batch_size=len(symbols))
+            if key == "daily" and len(symbols) > 1 and self._expects_quotes(lookback_period) \
+                    and all(df.empty for df in dfs.values()):
+                raise ThrottledError(YAHOO_HOST)
+            for symbol, df in dfs.items():
+                batch_data[symbol][key] = self._filter_after_watermark(df, symbol_watermarks[symbol])
+        return batch_data
+
+    @staticmethod
+    def _expects_quotes(lookback_period: int) -> bool:
+        """Check whether the requested days include a past trading session, whose daily quotes must exist."""
+        today = date.today()
+        return any(is_trading_day(today - timedelta(days=n)) for n in range(1, lookback_period))
+
+    def _lookback_from_watermarks(self, watermarks: List[Optional[datetime]]) -> int:
+        """Number of days to request so that the oldest watermark of a batch is covered. Symbols
+           without any stored data fall back to the full lookback period.
+        """
+        if not watermarks or any(watermark is None for watermark in watermarks):
+            return self.lookback_period
+        oldest_day = min(watermarks).date()
+        days_since_watermark = (date.today() - oldest_day).days + 1
+        return max(1, min(self.lookback_period, days_since_watermark))
+
+    @staticmethod
+    def _filter_after_watermark(df: pd.DataFrame, watermark: Optional[datetime]) -> pd.DataFrame:
+        """Keep only those rows that are more recent than the watermark. Both are compared in exchange wall
+           time, which is how quotes are stored by every write path (see 'database.copy_loader.wall_time')."""
+        if watermark is None or df.empty:
+            return df
+        return df[wall_time(df["datetime"]) > pd.Timestamp(watermark).tz_localize(None)]
+
+    def _fetch_through_circuit(self, batch: List[str],
+                               watermarks: Optional[Dict[str, Dict[str, datetime]]]) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """Fetch a batch with retries, waiting for the circuit breaker of yfinance whenever it is open.
+
+        Raises:
+            CircuitOpenError: Raised if the circuit was still open after {max_retries} full waits.
+
+        Returns:
+            Dict[str, Dict[str, pd.DataFrame]]: Dictionary with the 'daily' and '1min' dataframes of each symbol.
+        """
+        circuit_waits = 0
+        while True:
+            try:
+                return call_with_retry(lambda: self.fetch_batch(batch, watermarks), host=YAHOO_HOST,
+                                       controller=self.controller, max_retries=self.max_retries)
+            except CircuitOpenError as e:
+                # Waits while another batch probes yfinance (nothing left of the timeout) are not counted
+                if e.retry_in > 0:
+                    circuit_waits += 1
+                if circuit_waits > self.max_retries:
+                    raise
+                # Jitter keeps the waiting batches from all calling again at the same time
+                wait_time = e.retry_in + backoff_delay(circuit_waits)
+                logger.warning(f"Circuit breaker for {YAHOO_HOST} is open. Symbols {', '.join(batch)} "\
+                               f"wait {wait_time:.1f} seconds.")
+                time.sleep(wait_time)
+
+    def run(self, symbols: List[str],
+            watermarks: Optional[Dict[str, Dict[str, datetime]]] = None,
+            sink: Optional[Callable[[str, Dict[str, pd.DataFrame]], None]] = None) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """Fetch all symbols concurrently, pass each of them to {sink} as soon as its batch has been
+           fetched, and report the throughput of the run.
+
+        Args:
+            symbols (List[str]): Symbols to be fetched.
+            watermarks (Dict[str, Dict[str, datetime]], optional): Latest datetime already stored for each
+                                                                    symbol and interval. If given, only new
+                                                                    quotes are fetched. Defaults to None.
+            sink (Callable[[str, Dict[str, pd.DataFrame]], None], optional): Function that stores the 'daily'
+                                                                               and '1min' dataframes of a symbol.
+                                                                               If None, every symbol is kept
+                                                                               in memory and returned.
+
+        Returns:
+            Dict[str, Dict[str, pd.DataFrame]]: Fetched data for every symbol that succeeded when no sink
+                                                is given, an empty dictionary otherwise. Symbols that failed
+                                                are kept in the 'failed_symbols' attribute.
+        """
+        symbols = list(symbols)
+        results = {}
+        self.failed_symbols = []
+        self.written_symbols = 0
+        limiter = InFlightLimiter(self.max_in_flight)
+        write_queue = queue.Queue()
+
+        def produce(batch: List[str]) -> None:
+            limiter.acquire(len(batch))
+            try:
+                batch_data = self._fetch_through_circuit(batch, watermarks)
+            except Exception as e:
+                limiter.release(len(batch))
+                self.failed_symbols.extend(batch)
+                logger.error(f"Could not fetch data for symbols {', '.join(batch)}: {e}")
+                return
+            for symbol in batch:
+                write_queue.put((symbol, batch_data.pop(symbol)))
+
+        def consume() -> None:
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    return
+                symbol, symbol_data = item
+                try:
+                    if sink is None:
+                        results[symbol] = symbol_data
+                    else:
+                        sink(symbol, symbol_data)
+                    self.written_symbols += 1
+                except Exception as e:
+                    self.failed_symbols.append(symbol)
+                    logger.error(f"Could not store data for symbol {symbol}: {e}")
+                finally:
+                    del item, symbol_data
+                    limiter.release()
+
+        start = time.perf_counter()
+        writer = threading.Thread(target=consume, name="ingestion-writer")
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                batches = [symbols[n : n + self.batch_size] for n in range(0, len(symbols), self.batch_size)]
+                list(executor.map(produce, batches))
+        finally:
+            write_queue.put(None)
+            writer.join()
+        elapsed = time.perf_counter() - start
+        throughput = len(symbols) / elapsed if elapsed > 0 else float("inf")
+        concurrency = self.controller.concurrency if self.controller is not None else self.max_workers
+        logger.info(f"Processed {self.written_symbols}/{len(symbols)} symbols in {elapsed:.1f} seconds "\
+                    f"({throughput:.2f} symbols/s, {concurrency}/{self.max_workers} concurrent batches).")
+        if self.failed_symbols:
+            logger.warning(f"{len(self.failed_symbols)} symbols could not be processed: {', '.join(self.failed_symbols)}")
+        return results
@@ -1,38 +1,175 @@
 import copy
+import threading
+from collections import defaultdict
+from functools import partial
 
 import config.log_config as log_config
 from config.log_config import logger
+from config.pipeline_config import (MAX_WORKERS, INCREMENTAL, STORAGE_LAYOUT, PARQUET_MIRROR, ROLLUP_RESOLUTIONS,
+                                    INTRADAY_RETENTION_DAYS, SPOOL, PARQUET_COMPACT_MIN_FILES)
 from src.general_information import GeneralInformation
-from src.stock import Stock
+from src.ingestion import IngestionPipeline
+from database.connection import backend
 from database.utils_db import UtilsDB
+from database.db_writer import DBWriterService
+from database.partitioning import PartitionedQuoteTable
+from database.parquet_mirror import ParquetMirror
+from database.rollups import RollupEngine
+from database.retention import RetentionJob
+from database.spool import SpoolDrainer, WriteAheadSpool
 from utils.dafault_columns import default_daily, default_minutes
 from src.email_notifications.email_generator import EmailGenerator
 
-def main():
+def _after_writes(mirror: ParquetMirror = None, rollups: RollupEngine = None):
+    """Hook run by the DB writers once the quotes of each table key have been inserted, if any."""
+    after_writes = {}
+    for key in ["daily", "1min"]:
+        callbacks = []
+        if mirror is not None:
+            callbacks.append(partial(mirror.append, interval=key))
+        if rollups is not None and key == "1min":
+            callbacks.append(rollups.on_insert)
+        if callbacks:
+            after_writes[key] = partial(_run_callbacks, callbacks)
+    return after_writes
+
+
+def _run_callbacks(callbacks, df):
+    for callback in callbacks:
+        callback(df)
+
+
+def _per_symbol_storage(utils_db: UtilsDB, writers: DBWriterService, stock_df, incremental: bool, after_writes: dict,
+                        raise_on_error: bool = False):
+    """Writer and watermarks for the layout with one daily and one minute table per symbol. The writer
+       returns the futures of the queued writes; with {raise_on_error}, they fail on any DB error."""
+    # Declare the daily and minute models of every symbol, then create the missing tables in one go.
+    # deepcopy is needed so that no column is affected by previous tables
+    def declare_models(symbol):
+        return {
+            "daily": utils_db.create_specific_model(class_name=f"{symbol}_daily", model_name=f"{symbol}_daily",
+                                                    schema_name="daily_quotes", column_data=copy.deepcopy(default_daily),
+                                                    check_exists=False),
+            "1min": utils_db.create_specific_model(class_name=f"{symbol}_1min", model_name=f"{symbol}_1min",
+                                                   schema_name="onemin_quotes", column_data=copy.deepcopy(default_minutes),
+                                                   check_exists=False),
+        }
+
+    models = {symbol: declare_models(symbol) for symbol in stock_df.symbol[:]}
+    utils_db.create_missing_models([model for symbol_models in models.values() for model in symbol_models.values()])
+    # Only ask for quotes newer than the ones already stored
+    watermarks = None
+    if incremental:
+        table_watermarks = utils_db.get_watermarks([model for symbol_models in models.values()
+                                                    for model in symbol_models.values()])
+        watermarks = {symbol: {key: table_watermarks.get(model.__table__.fullname) for key, model in symbol_models.items()}
+                      for symbol, symbol_models in models.items()}
+
+    models_lock = threading.Lock()
+
+    def store_symbol(symbol, symbol_data):
+        # Queue daily and minute data on the DB writers of their tables, and hand them on once stored
+        with models_lock:
+            if symbol not in models:
+                # Spooled by a previous run for a symbol that has left the directory since
+                logger.warning(f"Symbol {symbol} is not listed anymore. Its spooled quotes are stored anyway.")
+                models[symbol] = declare_models(symbol)
+                utils_db.create_missing_models(list(models[symbol].values()))
+        futures = []
+        for key in ["daily", "1min"]:
+            future = writers.insert_df(symbol_data[key], models[symbol][key], after_write=after_writes.get(key),
+                                       raise_on_error=raise_on_error)
+            if future is not None:
+                futures.append(future)
+        return futures
+
+    return store_symbol, watermarks
+
+
+def _partitioned_storage(writers: DBWriterService, incremental: bool, after_writes: dict, raise_on_error: bool = False):
+    """Writer and watermarks for the layout with one partitioned table per interval, for all symbols. The
+       writer returns the futures of the queued writes; with {raise_on_error}, they fail on any DB error."""
+    quote_tables = {key: PartitionedQuoteTable(key) for key in ["daily", "1min"]}
+    for quote_table in quote_tables.values():
+        quote_table.create()
+    # Only ask for quotes newer than the ones already stored
+    watermarks = None
+    if incremental:
+        table_watermarks = {key: quote_table.get_watermarks() for key, quote_table in quote_tables.items()}
+        watermarks = defaultdict(dict)
+        for key, symbol_watermarks in table_watermarks.items():
+            for symbol, watermark in symbol_watermarks.items():
+                watermarks[symbol][key] = watermark
+
+    def write(utils_db, key, df):
+        counts = quote_tables[key].insert_df(df, utils_db, raise_on_error=raise_on_error)
+        if key in after_writes:
+            after_writes[key](df)
+        return counts
+
+    def store_symbol(symbol, symbol_data):
+        # Queue daily and minute data on the DB writers, creating the partitions they need. Rows of
+        # different symbols never share a primary key, so each symbol is a shard of its own
+        futures = []
+        for key, quote_table in quote_tables.items():
+            if not symbol_data[key].empty:
+                futures.append(writers.submit(f"{quote_table.table.fullname}/{symbol}",
+                                              partial(write, key=key, df=symbol_data[key])))
+        return futures
+
+    return store_symbol, watermarks
+
+
+def _spool_record(spool: WriteAheadSpool, symbol, symbol_data):
+    spool.append((symbol, symbol_data))
+
+
+def _replay_record(store_symbol, record):
+    symbol, symbol_data = record
+    return store_symbol(symbol, symbol_data)
+
+
+def main(max_workers: int = MAX_WORKERS, incremental: bool = INCREMENTAL, storage_layout: str = STORAGE_LAYOUT,
+         spool: bool = SPOOL):
     log_config.add_separator()
+    if storage_layout == "partitioned" and not backend.supports_partitioning:
+        raise ValueError(f"Storage layout 'partitioned' is not supported by the {backend.name} backend.")
     logger.info(f"Initializing information scraping.")
     # Call API with metadata on stocks (industry-type, company name, exchange market...)
     # After fetching, automatically store data in DB
-    stock_df = GeneralInformation().run_extraction()
+    general_information = GeneralInformation()
+    stock_df = general_information.run_extraction()
     utils_db = UtilsDB()
-    stock_dictionary = {}
-    for symbol in stock_df.symbol[:]:
-        logger.debug(f"Checking additional information for symbol {symbol}.")
-        # initiation the stock class for particular stock
-        stock_dictionary[f"{symbol}"] = Stock(symbol)
-        # Fetching OHLCV data on that stock
-        stock_extractor = stock_dictionary[f"{symbol}"].extractor
-        stock_dictionary[f"{symbol}_daily"] = stock_extractor.get_data(lookback_period = 2, chunk_size = 2, interval="1d")
-        stock_dictionary[f"{symbol}_1min"] = stock_extractor.get_data(lookback_period = 2, chunk_size = 2, interval="1m")
-
-    for symbol in stock_df.symbol[:]:
-        model_daily = utils_db.create_specific_model(class_name=f"{symbol}_daily", model_name=f"{symbol}_daily", 
-                                                        schema_name="daily_quotes", column_data=copy.deepcopy(default_daily))
-        model_minute = utils_db.create_specific_model(class_name=f"{symbol}_1min", model_name=f"{symbol}_1min", 
-                                                        schema_name="onemin_quotes", column_data=copy.deepcopy(default_minutes))
-        # Store daily data in DB
-        utils_db.insert_df_in_db(stock_dictionary[f"{symbol}_daily"], model_daily)
-        utils_db.insert_df_in_db(stock_dictionary[f"{symbol}_1min"], model_minute)
+    mirror = ParquetMirror() if PARQUET_MIRROR else None
+    rollups = None
+    if ROLLUP_RESOLUTIONS:
+        rollups = RollupEngine(utils_db, storage_layout=storage_layout)
+        rollups.create()
+    after_writes = _after_writes(mirror, rollups)
+    # Fetching OHLCV data on every stock, several symbols at a time, and storing each
+    # of them as soon as it arrives, through several DB writers
+    with DBWriterService() as writers:
+        if storage_layout == "partitioned":
+            store_symbol, watermarks = _partitioned_storage(writers, incremental, after_writes, raise_on_error=spool)
+        else:
+            store_symbol, watermarks = _per_symbol_storage(utils_db, writers, stock_df, incremental, after_writes,
+                                                           raise_on_error=spool)
+        pipeline = IngestionPipeline(max_workers=max_workers)
+        if spool:
+            # Fetched data goes to the local spool first, and drainers replay it into the DB with retries,
+            # together with whatever a previous run left undrained
+            write_ahead_spool = WriteAheadSpool()
+            with SpoolDrainer(write_ahead_spool, partial(_replay_record, store_symbol)):
+                pipeline.run(stock_df.symbol[:], watermarks, sink=partial(_spool_record, write_ahead_spool))
+        else:
+            pipeline.run(stock_df.symbol[:], watermarks, sink=store_symbol)
+    # Every run adds one mirror file per symbol and partition, which are merged once they pile up
+    if mirror is not None:
+        for interval in ParquetMirror.INTERVALS:
+            mirror.compact(interval, min_files=PARQUET_COMPACT_MIN_FILES)
+    # Move old one-minute quotes out of the DB, once every new one has been written
+    if INTRADAY_RETENTION_DAYS:
+        RetentionJob(utils_db, storage_layout=storage_layout).run()
 
             # Saving data in DB
             # utils_db = UtilsDB()
@@ -1,11 +1,9 @@
 import pprint
 
-import requests
-
 from dependencies.authenticator import api_key
+from src.data_extractor.http_client import get_client
 
 url = f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers=AAPL&apikey={api_key}"
-r = requests.get(url)
-data = r.json()
+data = get_client().get_json(url)
 
 pprint.pprint(data)
@@ -1,18 +1,24 @@
 """
 OBJECTIVE OF THIS MODULE
 ------------------------
-Define funtions for fetching data from AlphaVantage API
+Define funtions for fetching data from AlphaVantage API, or loading it from the DB
 """
 from config.log_config import logger 
 
-import numpy as np
 import pandas as pd
 import requests
 from sklearn.preprocessing import MinMaxScaler
 
 import utils.error_handling as errors
+from config.pipeline_config import INTRADAY_RETENTION_DAYS
+from database.parquet_mirror import ParquetMirror
+from database.retention import load_intraday_history
+from database.utils_db import UtilsDB
 from dependencies.authenticator import api_key
+from src.data_extractor.http_client import get_client
+from src.data_extractor.json_parser import parse_time_series
 from src.data_extractor.stock_extractor import StockExtractor
+from utils.windowing import supervised_windows
 
 
 class Stock(StockExtractor):
@@ -24,18 +30,37 @@ class Stock(StockExtractor):
 
     @staticmethod
     def transform_json_to_df(json_data, start_date, end_date):
-        df = pd.DataFrame(json_data).T.sort_index()
-        df.index = pd.to_datetime(df.index)
-        df = df.apply(pd.to_numeric, errors="coerce")
-        if start_date is not None:
-            start_date = pd.to_datetime(f"{start_date} 00:00:00")
-            df = df[df.index >= start_date]
-        if end_date is not None:
-            end_date = pd.to_datetime(f"{end_date} 23:59:59")
-            df = df[df.index <= end_date]
-        return df
+        return parse_time_series(json_data, start_date, end_date, errors="coerce", sort=True)
+
+    def _fetch_time_series(self, url, series_key, start_date, end_date, stream) -> pd.DataFrame:
+        """
+        Request an AlphaVantage time series and return it in ascending date order.
+
+        Args:
+            url (str): Endpoint url for the API call.
+            series_key (str): Key of the response under which the time series is found.
+            start_date (str): Earliest date to keep. None for no minimum date.
+            end_date (str): Latest date to keep. None for no maximum date.
+            stream (bool): Parse the response while it is being downloaded, with bounded memory.
 
-    def fetch_intraday(self, start_date=None, end_date=None) -> None:
+        Returns:
+            pd.DataFrame: a Dataframe containing the time series
+        """
+        try:
+            if stream:
+                return get_client().stream_time_series(url, start_date, end_date).sort_index()
+            r_json = get_client().get_json(url, end_date)
+        except requests.exceptions.ConnectionError as e:
+            logger.error(f"AlphaVantage: Could not fetch info for {self.stock_symbol} due to no internet connectivity")
+            raise e
+        try:
+            json_data = r_json[series_key]
+        except KeyError as e:
+            logger.warning(f'AlphaVantage: JSON does not have a "{series_key}" key.')
+            raise e
+        return self.transform_json_to_df(json_data, start_date, end_date)
+
+    def fetch_intraday(self, start_date=None, end_date=None, stream=False) -> None:
         """
         Fetch intraday data for a particular stock instance.
 
@@ -44,6 +69,8 @@ class Stock(StockExtractor):
                               If no value is given, it assumes no minimum date.
             end_date (str): A final date string of the format 'DDD-MM-YYYY'
                             If no value is given, it assumes no maximum date.
+            stream (bool): Parse the response while it is being downloaded, so that memory stays
+                           bounded for 'outputsize=full' payloads. Defaults to False.
 
         Returns:
             pd.DataFrame: a Dataframe containing intraday prices for a particular stock
@@ -52,16 +79,14 @@ class Stock(StockExtractor):
             f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY"
             f"&symbol={self.stock_symbol}&outputsize=full&interval=1min&apikey={self.api_key}"
         )
-        r = requests.get(url)
-        json_data = r.json()["Time Series (1min)"]
-        df = self.transform_json_to_df(json_data, start_date, end_date)
+        df = self._fetch_time_series(url, "Time Series (1min)", start_date, end_date, stream)
         df.columns = ["open", "high", "low", "close", "volume"]
         if df.empty:
             logger.warning("AlphaVantage: returns an empty Dataframe.")
             raise errors.EmptyDataframeError()
         self.data = df
 
-    def fetch_daily(self, start_date=None, end_date=None) -> None:
+    def fetch_daily(self, start_date=None, end_date=None, stream=False) -> None:
         """
         Fetch daily data for a particular stock instance.
 
@@ -70,6 +95,8 @@ class Stock(StockExtractor):
                               If no value is given, it assumes no minimum date.
             end_date (str): A final date string of the format 'DDD-MM-YYYY'
                             If no value is given, it assumes no maximum date.
+            stream (bool): Parse the response while it is being downloaded, so that memory stays
+                           bounded for 'outputsize=full' payloads. Defaults to False.
 
         Returns:
             pd.DataFrame: a Dataframe containing daily prices for a particular stock
@@ -78,17 +105,7 @@ class Stock(StockExtractor):
             f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED"
             f"&symbol={self.stock_symbol}&outputsize=full&apikey={self.api_key}"
         )
-        try:
-            r = requests.get(url)
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"AlphaVantage: Could not fetch info for {self.stock_symbol} due to no internet connectivity")
-            raise e
-        try:
-            json_data = r.json()["Time Series (Daily)"]
-        except KeyError as e:
-            logger.warning('AlphaVantage: JSON does not have a "Time Series (Daily)" key.')
-            raise e
-        df = self.transform_json_to_df(json_data, start_date, end_date)
+        df = self._fetch_time_series(url, "Time Series (Daily)", start_date, end_date, stream)
         df.columns = [
             "open",
             "high",
@@ -104,6 +121,54 @@ class Stock(StockExtractor):
             raise errors.EmptyDataframeError(self.stock_symbol)
         self.data = df
 
+    def load_from_db(self, interval="daily", start_date=None, end_date=None, utils_db=None) -> None:
+        """
+        Load quotes already stored in the DB for a particular stock instance, instead of fetching them
+        from AlphaVantage. Quotes are cached in memory, so loading them again is almost free. One-minute
+        quotes moved to the archive by the retention job are read from it.
+
+        Args:
+            interval (str): "daily" or "1min". Defaults to "daily".
+            start_date (str): Earliest date to load, included. If no value is given, it assumes no minimum date.
+            end_date (str): Latest date to load, excluded. If no value is given, it assumes no maximum date.
+            utils_db (UtilsDB): Reader of the quotes. Defaults to a new UtilsDB.
+
+        Raises:
+            NoStoredQuotesError: Raised if no quote is stored for the stock in that range.
+        """
+        utils_db = utils_db if utils_db is not None else UtilsDB()
+        columns = ["open", "high", "low", "close", "volume"]
+        if interval == "1min" and INTRADAY_RETENTION_DAYS:
+            # Old one-minute quotes have been moved to the archive
+            df = load_intraday_history(self.stock_symbol, start_date, end_date, columns, utils_db=utils_db)
+        else:
+            df = utils_db.load_quotes(self.stock_symbol, interval, start_date, end_date, columns=columns)
+        if df.empty:
+            logger.warning(f"DB: no {interval} quotes stored for {self.stock_symbol}.")
+            raise errors.NoStoredQuotesError(self.stock_symbol, interval)
+        self.data = df.drop(columns="symbol").set_index("datetime")
+
+    def load_from_parquet(self, interval="daily", start_date=None, end_date=None, mirror=None) -> None:
+        """
+        Load quotes from the local Parquet mirror for a particular stock instance, without touching the DB.
+
+        Args:
+            interval (str): "daily" or "1min". Defaults to "daily".
+            start_date (str): Earliest date to load, included. If no value is given, it assumes no minimum date.
+            end_date (str): Latest date to load, excluded. If no value is given, it assumes no maximum date.
+            mirror (ParquetMirror): Reader of the quotes. Defaults to a new ParquetMirror.
+
+        Raises:
+            NoStoredQuotesError: Raised if no quote is mirrored for the stock in that range.
+        """
+        mirror = mirror if mirror is not None else ParquetMirror()
+        df = mirror.read(interval, self.stock_symbol, start_date, end_date,
+                         columns=["open", "high", "low", "close", "volume"])
+        if df.empty:
+            logger.warning(f"Parquet: no {interval} quotes mirrored for {self.stock_symbol}.")
+            raise errors.NoStoredQuotesError(self.stock_symbol, interval)
+        self.data = df.drop(columns="symbol").set_index("datetime")
+
     def _treat_missing_data(self) -> pd.DataFrame:
         """
         If a value is missing, fill it with the previous value
@@ -152,12 +217,8 @@ class Stock(StockExtractor):
         if scale:
             scaler = MinMaxScaler()
             train_data = scaler.fit_transform(train_data)
-        x_train = np.empty((0, rolling_window))
-        y_train = train_data[rolling_window:, 0]
-        for i in range(rolling_window, len(train_data)):
-            x_train = np.vstack((x_train, train_data[i - rolling_window : i, 0]))
-        # Adding a third dimension as a requirement from TensorFlow
-        x_train = np.reshape(x_train, (x_train.shape[0], x_train.shape[1], 1))
+        # Windows are views on the data, already with the third dimension TensorFlow requires
+        x_train, y_train = supervised_windows(train_data, rolling_window)
         # Now, let's proceed with the test set
         # We subtract 60 because to output the first prediction on test
         # we need data on the 60 last close prices
@@ -167,14 +228,7 @@ class Stock(StockExtractor):
             self.scaler = scaler
         else:
             self.scaler = scale
-        x_test = np.empty((0, rolling_window))
-        y_test = test_data[rolling_window:, 0]
-        for i in range(rolling_window, len(test_data)):
-            x_test = np.vstack((x_test, test_data[i - rolling_window : i, 0]))
-        x_test = np.reshape(x_test, (x_test.shape[0], x_test.shape[1], 1))
-        x_test = np.reshape(x_test, (x_test.shape[0], x_test.shape[1], 1))
-
-        x_test = np.reshape(x_test, (x_test.shape[0], x_test.shape[1], 1))
+        x_test, y_test = supervised_windows(test_data, rolling_window)
 
         self.x_train = x_train
         self.y_train = y_train
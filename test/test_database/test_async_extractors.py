@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from src.data_extractor.async_extractors import AsyncForexExtractor
+from src.data_extractor.forex_extractor import ForexExtractor
+
+class TestFetchMany(unittest.TestCase):
+
+    input_EURUSD_daily = \
+    {
+        "Time Series FX (Daily)": {
+        "2023-11-13": {
+            "1. open": "1.06826",
+            "2. high": "1.07061",
+            "3. low": "1.06647",
+            "4. close": "1.06987"
+            },
+        "2023-11-10": {
+            "1. open": "1.06671",
+            "2. high": "1.06930",
+            "3. low": "1.06559",
+            "4. close": "1.06718"
+            },
+        }
+    }
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def fake_get_data(self, extractor, period, from_date, until_date, stream):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(0.05)
+            if extractor.symbol_pair == "BAD/PAIR":
+                raise ConnectionError("upstream down")
+            return pd.DataFrame({"symbol_pair": [extractor.symbol_pair]})
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    @patch("src.data_extractor.forex_extractor.ForexExtractor._ForexExtractor__return_request")
+    def test_frames_match_the_blocking_extractor(self, mocked_response):
+        mocked_response.return_value = self.input_EURUSD_daily
+        expected = ForexExtractor(symbol_pair="EUR/USD").get_data(period="daily", from_date='2023-11-10',
+                                                                  until_date='2023-11-13')
+        output = asyncio.run(AsyncForexExtractor.fetch_many([("EUR/USD", "daily")], from_date='2023-11-10',
+                                                            until_date='2023-11-13', executor=self.executor))
+        self.assertEqual(list(output), [("EUR/USD", "daily")])
+        assert_frame_equal(output[("EUR/USD", "daily")], expected)
+
+    def test_in_flight_requests_are_bounded(self):
+        combinations = [(f"EUR/{n:03d}", "daily") for n in range(12)]
+        with patch.object(ForexExtractor, "get_data", autospec=True, side_effect=self.fake_get_data):
+            output = asyncio.run(AsyncForexExtractor.fetch_many(combinations, max_in_flight=3,
+                                                                executor=self.executor))
+        self.assertEqual(len(output), 12)
+        self.assertLessEqual(self.peak_in_flight, 3)
+        self.assertGreater(self.peak_in_flight, 1)
+
+    def test_failure_does_not_cancel_the_others(self):
+        combinations = [("EUR/USD", "daily"), ("BAD/PAIR", "daily"), ("NOK/CHF", "daily")]
+        with patch.object(ForexExtractor, "get_data", autospec=True, side_effect=self.fake_get_data):
+            output = asyncio.run(AsyncForexExtractor.fetch_many(combinations, executor=self.executor))
+        self.assertEqual(sorted(output), [("EUR/USD", "daily"), ("NOK/CHF", "daily")])
+        self.assertEqual(output[("NOK/CHF", "daily")]["symbol_pair"].tolist(), ["NOK/CHF"])
+
+if __name__ == "__main__":
+    unittest.main()
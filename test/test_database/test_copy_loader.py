@@ -0,0 +1,150 @@
+import struct
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pandas as pd
+import psycopg2
+from sqlalchemy import Column, Date, Float, MetaData, String, Table
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+from database.backends import PostgresBackend
+from database.copy_loader import (BINARY_HEADER, BINARY_TRAILER, copy_df, copy_statement, encode_binary, encode_csv,
+                                  upsert_df)
+from database.utils_db import UtilsDB
+
+class TestCopyLoader(unittest.TestCase):
+
+    table = Table(
+        "aapl_1min", MetaData(),
+        Column("timestamp", TIMESTAMP(timezone=True)),
+        Column("datetime", TIMESTAMP, primary_key=True),
+        Column("close", Float),
+        Column("registration_date", Date),
+        Column("symbol", String, primary_key=True),
+        schema="onemin_quotes",
+    )
+
+    df = pd.DataFrame(
+        {
+            "timestamp": [datetime(2023, 11, 17, 12, 0), datetime(2023, 11, 17, 12, 0)],
+            "datetime": pd.to_datetime(["2023-11-16 09:30", "2023-11-16 09:31"]).tz_localize("America/New_York"),
+            "close": [189.5, np.nan],
+            "registration_date": ["2023-11-17", "2023-11-17"],
+            "symbol": ["AAPL", "ÅAPL"],
+            "dividends": [0.0, 0.0],
+        }
+    )
+
+    @staticmethod
+    def decode_binary(payload):
+        """Minimal reader of the binary COPY format, returning the raw bytes of every field."""
+        assert payload.startswith(BINARY_HEADER) and payload.endswith(BINARY_TRAILER)
+        position, rows = len(BINARY_HEADER), []
+        while position < len(payload) - len(BINARY_TRAILER):
+            (n_fields,) = struct.unpack_from(">h", payload, position)
+            position += 2
+            row = []
+            for _ in range(n_fields):
+                (length,) = struct.unpack_from(">i", payload, position)
+                position += 4
+                row.append(None if length == -1 else payload[position : position + length])
+                position += max(length, 0)
+            rows.append(row)
+        return rows
+
+    def test_copy_statement(self):
+        columns = list(self.table.columns)[2:]
+        self.assertEqual(copy_statement(self.table, columns, "binary"),
+                         'COPY onemin_quotes.aapl_1min (close, registration_date, symbol) FROM STDIN WITH (FORMAT binary)')
+
+    def test_encode_csv(self):
+        output = encode_csv(self.df, list(self.table.columns)).decode("utf-8").splitlines()
+        self.assertEqual(output, ["2023-11-17 12:00:00,2023-11-16 09:30:00-05:00,189.5,2023-11-17,AAPL",
+                                  "2023-11-17 12:00:00,2023-11-16 09:31:00-05:00,\\N,2023-11-17,ÅAPL"])
+
+    def test_encode_binary(self):
+        rows = self.decode_binary(encode_binary(self.df, list(self.table.columns), session_timezone="Europe/Madrid"))
+        microseconds = lambda day: struct.pack(">q", int((pd.Timestamp(day) - pd.Timestamp("2000-01-01")).value // 1000))
+        self.assertEqual(rows[0], [
+            microseconds("2023-11-17 11:00"),  # Naive in the session timezone, stored in UTC
+            microseconds("2023-11-16 09:30"),  # Wall time kept for timestamps without time zone
+            struct.pack(">d", 189.5),
+            struct.pack(">i", (pd.Timestamp("2023-11-17") - pd.Timestamp("2000-01-01")).days),
+            b"AAPL",
+        ])
+        self.assertIsNone(rows[1][2])
+        self.assertEqual(rows[1][4], "ÅAPL".encode("utf-8"))
+
+    def test_layouts_match_scattered_encoding(self):
+        df = pd.concat([self.df] * 5, ignore_index=True)
+        df.loc[::3, "symbol"] = None
+        columns = list(self.table.columns)
+        by_layout = self.decode_binary(encode_binary(df, columns, session_timezone="UTC"))
+        with patch("database.copy_loader.MAX_LAYOUTS", 0):
+            scattered = self.decode_binary(encode_binary(df, columns, session_timezone="UTC"))
+        self.assertEqual(scattered[3][4], None)
+        self.assertEqual(sorted(map(repr, by_layout)), sorted(map(repr, scattered)))
+
+    def test_insert_with_copy(self):
+        utils_db = UtilsDB.__new__(UtilsDB)
+        utils_db.session_timezone = "UTC"
+        utils_db.backend = PostgresBackend()
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.copy_expert.side_effect = [None, psycopg2.IntegrityError("duplicate key"), None]
+        utils_db.engine = MagicMock()
+        utils_db.engine.raw_connection.return_value = connection
+        model = MagicMock(__table__=self.table)
+        output = utils_db.insert_df_in_db(pd.concat([self.df] * 3), model, batch_size=2, method="copy", on_conflict=None)
+        self.assertEqual(output, {"inserted": 4, "updated": 0, "skipped": 2})
+        self.assertEqual(cursor.copy_expert.call_count, 3)
+        self.assertEqual(connection.commit.call_count, 2)
+        connection.rollback.assert_called_once()
+        connection.close.assert_called_once()
+
+    def test_upsert_with_copy(self):
+        utils_db = UtilsDB.__new__(UtilsDB)
+        utils_db.session_timezone = "UTC"
+        utils_db.backend = PostgresBackend()
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = [(1, 0), (0, 2)]
+        utils_db.engine = MagicMock()
+        utils_db.engine.raw_connection.return_value = connection
+        model = MagicMock(__table__=self.table)
+        output = utils_db.insert_df_in_db(pd.concat([self.df] * 2), model, batch_size=2, method="copy",
+                                          on_conflict="update")
+        self.assertEqual(output, {"inserted": 1, "updated": 2, "skipped": 1})
+        self.assertEqual(cursor.copy_expert.call_args[0][0],
+                         "COPY staging_aapl_1min (timestamp, datetime, close, registration_date, symbol) "\
+                         "FROM STDIN WITH (FORMAT binary)")
+        upsert_statement = cursor.execute.call_args[0][0]
+        self.assertIn("SELECT DISTINCT ON (staging_aapl_1min.datetime, staging_aapl_1min.symbol)", upsert_statement)
+        self.assertIn("ORDER BY staging_aapl_1min.datetime, staging_aapl_1min.symbol, ctid DESC", upsert_statement)
+        self.assertIn("ON CONFLICT (datetime, symbol) DO UPDATE SET timestamp = excluded.timestamp", upsert_statement)
+        self.assertEqual(connection.commit.call_count, 2)
+
+    def test_orm_and_copy_store_the_same_wall_time(self):
+        utils_db = UtilsDB.__new__(UtilsDB)
+        utils_db.backend = PostgresBackend()
+        utils_db.engine = MagicMock()
+        connection = utils_db.engine.begin.return_value.__enter__.return_value
+        connection.execute.return_value.scalars.return_value.all.return_value = [True, True]
+        model = MagicMock(__table__=self.table)
+        utils_db.insert_df_in_db(self.df, model, method="orm", on_conflict="ignore")
+        orm_rows = connection.execute.call_args[0][1]
+        self.assertEqual(orm_rows[0]["datetime"], pd.Timestamp("2023-11-16 09:30"))
+        self.assertEqual(orm_rows[0]["timestamp"], pd.Timestamp("2023-11-17 12:00"))
+
+        raw_connection = MagicMock()
+        cursor = raw_connection.cursor.return_value.__enter__.return_value
+        copy_df(raw_connection, self.df, self.table, "csv")
+        payload = cursor.copy_expert.call_args[0][1].getvalue().decode("utf-8")
+        self.assertEqual(payload.splitlines()[0], "2023-11-17 12:00:00,2023-11-16 09:30:00,189.5,2023-11-17,AAPL")
+
+    def test_upsert_needs_primary_key(self):
+        with self.assertRaises(ValueError):
+            upsert_df(MagicMock(), self.df.drop(columns="symbol"), self.table)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pandas as pd
+from database.db_writer import DBWriterService
+
+class TestDBWriterService(unittest.TestCase):
+
+    def setUp(self):
+        self.utils_dbs = []
+        def factory():
+            utils_db = MagicMock()
+            utils_db.insert_df_in_db.return_value = {"inserted": 1, "updated": 0, "skipped": 0}
+            self.utils_dbs.append(utils_db)
+            return utils_db
+        self.writers = DBWriterService(n_writers=3, queue_size=2, utils_db_factory=factory)
+        self.df = pd.DataFrame({"symbol": ["AAA"], "close": [1.0]})
+
+    def model(self, name):
+        return SimpleNamespace(__table__=SimpleNamespace(fullname=f"daily_quotes.{name}"))
+
+    def test_writes_are_sharded_by_table(self):
+        models = [self.model(f"s{n}_daily") for n in range(10)]
+        with self.writers:
+            for model in models * 3:
+                self.writers.insert_df(self.df, model)
+            self.writers.insert_df(pd.DataFrame(), models[0])
+        self.assertEqual(self.writers.counts, {"inserted": 30, "updated": 0, "skipped": 0})
+        for model in models:
+            writers = [n for n, utils_db in enumerate(self.utils_dbs)
+                       if any(call.args[1] is model for call in utils_db.insert_df_in_db.call_args_list)]
+            self.assertEqual(writers, [self.writers.shard(model.__table__.fullname)])
+
+    def test_writers_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        first = "t0"
+        second = next(key for key in ["t1", "t2", "t3", "t4"] if self.writers.shard(key) != self.writers.shard(first))
+        def wait(utils_db):
+            barrier.wait()
+        with self.writers:
+            # Both writes only finish if they run at the same time on different writers
+            self.writers.submit(first, wait)
+            self.writers.submit(second, wait)
+        self.assertEqual(self.writers.failed_writes, 0)
+
+    def test_failed_writes_do_not_stop_the_writer(self):
+        def fail(utils_db):
+            raise RuntimeError("Connection lost")
+        with self.writers:
+            self.writers.submit("t0", fail)
+            self.writers.insert_df(self.df, self.model("t0"))
+        self.assertEqual(self.writers.failed_writes, 1)
+        self.assertEqual(self.writers.counts["inserted"], 1)
+
+    def test_submit_needs_started_service(self):
+        with self.assertRaises(RuntimeError):
+            self.writers.submit("t0", lambda utils_db: None)
+
+if __name__ == "__main__":
+    unittest.main()
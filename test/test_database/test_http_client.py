@@ -0,0 +1,95 @@
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from src.data_extractor.http_client import AlphaVantageClient, TokenBucket
+from src.data_extractor.response_cache import ResponseCache
+from utils.error_handling import APIError
+
+class TestHttpClient(unittest.TestCase):
+
+    rate_limit_payload = {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."}
+    data_payload = {"Time Series FX (Daily)": {"2023-11-14": {"1. open": "1.07009"}}}
+
+    @patch("src.data_extractor.http_client.time.sleep")
+    def test_token_bucket_waits_when_empty(self, mocked_sleep):
+        bucket = TokenBucket(rate_per_minute=60)
+        bucket.acquire()
+        with patch("src.data_extractor.http_client.time.monotonic", side_effect=[bucket.last_refill, 
+                                                                                 bucket.last_refill + 1]):
+            bucket.acquire()
+        mocked_sleep.assert_called_once()
+        self.assertAlmostEqual(mocked_sleep.call_args[0][0], 1.0)
+
+    @patch("src.data_extractor.http_client.time.sleep")
+    def test_backoff_on_rate_limit(self, mocked_sleep):
+        client = AlphaVantageClient(calls_per_minute=6000, max_retries=2, backoff_seconds=10)
+        client.rate_limiter = MagicMock()
+        responses = [MagicMock(), MagicMock()]
+        responses[0].json.return_value = self.rate_limit_payload
+        responses[1].json.return_value = self.data_payload
+        client.session.get = MagicMock(side_effect=responses)
+        self.assertEqual(client.get_json("https://www.alphavantage.co/query"), self.data_payload)
+        mocked_sleep.assert_called_once_with(10)
+
+    @patch("src.data_extractor.http_client.time.sleep")
+    def test_error_after_retries(self, mocked_sleep):
+        client = AlphaVantageClient(calls_per_minute=6000, max_retries=1, backoff_seconds=10)
+        client.rate_limiter = MagicMock()
+        response = MagicMock()
+        response.json.return_value = self.rate_limit_payload
+        client.session.get = MagicMock(return_value=response)
+        with self.assertRaises(APIError):
+            client.get_json("https://www.alphavantage.co/query")
+        self.assertEqual(client.session.get.call_count, 2)
+
+
+class TestStreamTimeSeries(unittest.TestCase):
+
+    url = "https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=EUR&to_symbol=USD&apikey=demo"
+    data_payload = {"Time Series FX (Daily)": {"2023-11-14": {"1. open": "1.07009", "4. close": "1.08"}}}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name, mode="on")
+        self.client = AlphaVantageClient(calls_per_minute=6000, max_retries=1, backoff_seconds=10, cache=self.cache)
+        self.client.rate_limiter = MagicMock()
+        self.client.breaker = MagicMock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def respond(self, *payloads):
+        responses = []
+        for payload in payloads:
+            response = MagicMock()
+            response.iter_content.return_value = [json.dumps(payload).encode()]
+            responses.append(response)
+        self.client.session.get = MagicMock(side_effect=responses)
+
+    @patch("src.data_extractor.http_client.time.sleep")
+    def test_rate_limit_payload_is_retried_and_not_cached(self, mocked_sleep):
+        self.respond(TestHttpClient.rate_limit_payload, self.data_payload)
+        df = self.client.stream_time_series(self.url)
+        self.assertEqual(len(df), 1)
+        mocked_sleep.assert_called_once_with(10)
+        # The data payload is cached and served on the next call, the rate-limit one was discarded
+        self.client.session.get = MagicMock(side_effect=AssertionError("Not cached"))
+        self.assertEqual(len(self.client.stream_time_series(self.url)), 1)
+
+    @patch("src.data_extractor.http_client.time.sleep")
+    def test_rate_limit_payload_raises_after_retries(self, mocked_sleep):
+        self.respond(TestHttpClient.rate_limit_payload, TestHttpClient.rate_limit_payload)
+        with self.assertRaises(APIError):
+            self.client.stream_time_series(self.url)
+        self.assertEqual(self.client.session.get.call_count, 2)
+        self.assertIsNone(self.cache.get(ResponseCache.make_url_key(self.url)))
+
+    def test_error_message_raises_api_error(self):
+        self.respond({"Error Message": "Invalid API call."})
+        with self.assertRaises(APIError):
+            self.client.stream_time_series(self.url)
+        self.assertIsNone(self.cache.get(ResponseCache.make_url_key(self.url)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.data_extractor.json_parser import parse_time_series
+
+class TestParseTimeSeries(unittest.TestCase):
+
+    def test_missing_fields_are_nan(self):
+        json_data = {
+            "2023-11-14": {"1. open": "1.07009", "4. close": "1.08182"},
+            "2023-11-13": {"1. open": "1.06826"},
+            "2023-11-10": {"1. open": "1.06671", "4. close": "1.06718", "5. volume": "10"},
+        }
+        output = parse_time_series(json_data, from_date="2023-11-10", until_date="2023-11-13")
+        expected = pd.DataFrame(json_data).T.loc[["2023-11-13", "2023-11-10"]].apply(pd.to_numeric)
+        expected.index = pd.to_datetime(expected.index)
+        self.assertEqual(output.columns.tolist(), ["1. open", "4. close", "5. volume"])
+        pd.testing.assert_frame_equal(output, expected)
+        self.assertTrue(np.isnan(output.loc["2023-11-13", "4. close"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import unittest
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from src.data_extractor.json_stream import TimeSeriesStreamParser
+
+class TestTimeSeriesStreamParser(unittest.TestCase):
+
+    input_AAPL_5mins = \
+    {
+        "Meta Data": {"1. Information": "Intraday (5min) open, high, low, close prices and volume"},
+        "Time Series (5min)": {
+            "2023-11-09 22:40:00": {
+                "1. open": "18.89900",
+                "2. high": "18.90500",
+                "3. low": "18.89900",
+                "4. close": "18.90490",
+                "5. volume": "1234"
+            },
+            "2023-11-08 22:35:00": {
+                "1. open": "",
+                "2. high": "18.90500",
+                "3. low": "18.88270",
+                "4. close": "18.89900",
+                "5. volume": "1041"
+            },
+            "2023-11-07 22:30:00": {
+                "1. open": "18.80000",
+                "2. high": "18.90000",
+                "3. low": "18.70000",
+                "4. close": "18.85000",
+                "5. volume": "998"
+            },
+        }
+    }
+
+    expected_AAPL_5mins = pd.DataFrame(data={"1. open": [18.89900, float("nan")],
+                                             "2. high": [18.90500, 18.90500],
+                                             "3. low": [18.89900, 18.88270],
+                                             "4. close": [18.90490, 18.89900],
+                                             "5. volume": [1234.0, 1041.0],},
+                                       index=[pd.to_datetime("2023-11-09 22:40:00"),
+                                              pd.to_datetime("2023-11-08 22:35:00")],
+                                       )
+
+    def _chunks(self, payload, chunk_size):
+        body = json.dumps(payload, indent=4).encode()
+        return [body[n : n + chunk_size] for n in range(0, len(body), chunk_size)]
+
+    def test_rows_split_across_chunks(self):
+        for chunk_size in [1, 7, 64, 1 << 16]:
+            parser = TimeSeriesStreamParser(from_date="2023-11-08", until_date="2023-11-09")
+            output = parser.parse(iter(self._chunks(self.input_AAPL_5mins, chunk_size)))
+            assert_frame_equal(output, self.expected_AAPL_5mins)
+            self.assertEqual(parser.series_key, "Time Series (5min)")
+            self.assertTrue(parser.stopped_early)
+
+    def test_error_payload(self):
+        parser = TimeSeriesStreamParser()
+        output = parser.parse(self._chunks({"Note": "Thank you for using Alpha Vantage!"}, 5))
+        self.assertIsNone(output)
+        self.assertEqual(parser.payload, {"Note": "Thank you for using Alpha Vantage!"})
+
+    def test_skipped_rows_do_not_grow_the_buffer(self):
+        row = self.input_AAPL_5mins["Time Series (5min)"]["2023-11-09 22:40:00"]
+        days = pd.date_range("2023-11-09", periods=3000, freq="-1min")
+        payload = {"Time Series (5min)": {f"{day:%Y-%m-%d %H:%M:%S}": row for day in days}}
+        chunks = self._chunks(payload, 4096)
+        # Every row is newer than 'until_date' but the last ones, so almost the whole body is skipped
+        parser = TimeSeriesStreamParser(until_date="2023-11-07")
+        output = parser.parse(iter(chunks))
+        self.assertEqual(len(output), int((days < "2023-11-08").sum()))
+        self.assertGreater(sum(map(len, chunks)), 4 * TimeSeriesStreamParser.TRIM_THRESHOLD)
+        self.assertLess(parser.peak_buffer, TimeSeriesStreamParser.TRIM_THRESHOLD + 2 * 4096)
+
+if __name__ == "__main__":
+    unittest.main()
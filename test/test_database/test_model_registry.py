@@ -0,0 +1,45 @@
+import copy
+import unittest
+from unittest.mock import MagicMock, patch
+from database.model_registry import ModelRegistry
+from utils.dafault_columns import default_daily
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MagicMock()
+        self.catalog = self.engine.connect.return_value.__enter__.return_value
+        # Every test declares its models in its own schema, since they all share the same Base
+        self.schema_name = f"registry_{self._testMethodName}"
+        self.catalog.execute.return_value.all.return_value = [(self.schema_name, "aaa_daily")]
+        self.registry = ModelRegistry(db_engine=self.engine)
+
+    def get_model(self, symbol):
+        return self.registry.get_model(class_name=f"{self.schema_name}_{symbol}", model_name=f"{symbol}_daily",
+                                       schema_name=self.schema_name, column_data=copy.deepcopy(default_daily))
+
+    def test_models_are_cached(self):
+        model = self.get_model("aaa")
+        self.assertIs(self.get_model("aaa"), model)
+        self.assertEqual(model.__table__.fullname, f"{self.schema_name}.aaa_daily")
+
+    def test_existing_tables_are_loaded_once(self):
+        self.assertTrue(self.registry.exists(self.schema_name, "aaa_daily"))
+        self.assertFalse(self.registry.exists(self.schema_name, "bbb_daily"))
+        self.assertEqual(self.catalog.execute.call_count, 1)
+        self.assertEqual(self.catalog.execute.call_args.args[1], {"schemas": [self.schema_name]})
+
+    @patch("database.model_registry.Base.metadata.create_all")
+    def test_missing_tables_are_created_together(self, create_all):
+        models = [self.get_model(symbol) for symbol in ["aaa", "bbb", "ccc"]]
+        self.assertEqual(self.registry.create_missing(models), 2)
+        self.engine.begin.assert_called_once()
+        tables = create_all.call_args.kwargs["tables"]
+        self.assertEqual([table.name for table in tables], ["bbb_daily", "ccc_daily"])
+        # Tables created by the registry are known to exist afterwards
+        self.assertEqual(self.registry.create_missing(models), 0)
+        self.assertEqual(create_all.call_count, 1)
+        self.assertEqual(self.catalog.execute.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
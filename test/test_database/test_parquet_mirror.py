@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from pathlib import Path
+import pandas as pd
+from database.parquet_mirror import ParquetMirror, write_sequence
+
+class TestParquetMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mirror = ParquetMirror(self.directory.name)
+        self.df = pd.DataFrame({
+            "datetime": pd.to_datetime(["2023-11-30 15:58", "2023-11-30 15:59", "2023-12-01 09:30", "2023-11-30 15:59"]),
+            "symbol": ["AAA", "AAA", "AAA", "BBB"],
+            "close": [1.0, 2.0, 3.0, 4.0],
+            "timestamp": pd.to_datetime(["2023-11-30 15:58", "2023-11-30 15:59", "2023-12-01 09:30",
+                                         "2023-11-30 15:59"]).tz_localize("America/New_York"),
+        })
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_files_are_partitioned_by_month_and_symbol(self):
+        self.assertEqual(self.mirror.append(self.df, "1min"), 3)
+        files = sorted(str(path.relative_to(self.directory.name)) for path in Path(self.directory.name).rglob("*.parquet"))
+        self.assertEqual([file.rsplit(".", 2)[0] for file in files],
+                         ["1min/month=2023-11/AAA_202311301558_202311301559",
+                          "1min/month=2023-11/BBB_202311301559_202311301559",
+                          "1min/month=2023-12/AAA_202312010930_202312010930"])
+        self.assertEqual(len({write_sequence(file) for file in files}), 3)
+
+    def test_same_range_is_replaced(self):
+        self.mirror.append(self.df, "1min")
+        self.mirror.append(self.df.iloc[:2].assign(close=5.0), "1min")
+        self.assertEqual(len(list(Path(self.directory.name).rglob("*.parquet"))), 3)
+        self.assertEqual(self.mirror.read("1min", symbols="AAA")["close"].tolist(), [5.0, 5.0, 3.0])
+
+    def test_read_filters_and_deduplicates(self):
+        self.mirror.append(self.df, "1min")
+        self.mirror.append(self.df.iloc[[1]].assign(close=5.0), "1min")
+        output = self.mirror.read("1min", symbols="AAA", start="2023-11-30 15:59", columns=["close"])
+        self.assertEqual(output.columns.tolist(), ["datetime", "close", "symbol"])
+        self.assertEqual(output["close"].tolist(), [5.0, 3.0])
+        output = self.mirror.read("1min", end="2023-12-01")
+        self.assertEqual(output["symbol"].tolist(), ["AAA", "AAA", "BBB"])
+        self.assertEqual(str(output["timestamp"].dt.tz), "UTC")
+        self.assertTrue(self.mirror.read("daily").empty)
+
+    def test_last_write_wins_whatever_the_path_order(self):
+        # The second file sorts before the first one by path, but was written after it
+        self.mirror.append(self.df.iloc[[1]].assign(close=5.0), "1min")
+        self.mirror.append(self.df.iloc[:2], "1min")
+        self.assertEqual(self.mirror.read("1min", symbols="AAA")["close"].tolist(), [1.0, 2.0])
+        self.mirror.compact("1min")
+        self.assertEqual(self.mirror.read("1min", symbols="AAA")["close"].tolist(), [1.0, 2.0])
+
+    def test_compact_merges_partition_files(self):
+        self.mirror.append(self.df, "1min")
+        self.mirror.append(self.df.iloc[[1]].assign(close=5.0), "1min")
+        before = self.mirror.read("1min")
+        self.assertEqual(self.mirror.compact("1min"), {"month=2023-11": 3})
+        self.assertEqual(len(list(Path(self.directory.name).rglob("*.parquet"))), 2)
+        pd.testing.assert_frame_equal(self.mirror.read("1min"), before)
+        # Quotes written after a compaction win over the merged file, which is merged again
+        self.mirror.append(self.df.iloc[[0]].assign(close=6.0), "1min")
+        self.assertEqual(self.mirror.compact("1min", min_files=3), {})
+        self.assertEqual(self.mirror.compact("1min"), {"month=2023-11": 2})
+        self.assertEqual(self.mirror.read("1min", symbols="AAA")["close"].tolist(), [6.0, 5.0, 3.0])
+        self.assertEqual(len(list(Path(self.directory.name).rglob("*.parquet"))), 2)
+
+    def test_compact_merges_one_symbol_at_a_time(self):
+        # A previous merge, whose row group spans several symbols, and newer files of single symbols
+        self.mirror.append(self.df, "1min")
+        self.mirror.compact("1min")
+        self.mirror.append(self.df.iloc[[1]].assign(close=5.0), "1min")
+        self.mirror.append(self.df.iloc[[3]].assign(close=6.0), "1min")
+        partition = Path(self.directory.name) / "1min" / "month=2023-11"
+        files = sorted(partition.glob("*.parquet"), key=write_sequence)
+        tables = list(ParquetMirror._merge_by_symbol(files, self.mirror.schemas["1min"]))
+        self.assertEqual([table["symbol"].to_pylist() for table in tables], [["AAA", "AAA"], ["BBB"]])
+        self.assertEqual([table["close"].to_pylist() for table in tables], [[1.0, 5.0], [6.0]])
+        self.assertEqual(self.mirror.compact("1min"), {"month=2023-11": 3})
+        self.assertEqual(self.mirror.read("1min")["close"].tolist(), [1.0, 5.0, 3.0, 6.0])
+
+if __name__ == "__main__":
+    unittest.main()
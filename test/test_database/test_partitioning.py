@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from database.partitioning import PartitionedQuoteTable
+
+class TestPartitionedQuoteTable(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MagicMock()
+        self.connection = self.engine.begin.return_value.__enter__.return_value
+        self.daily = PartitionedQuoteTable("daily", hash_modulus=0, db_engine=self.engine)
+        self.minutes = PartitionedQuoteTable("1min", hash_modulus=2, db_engine=self.engine)
+
+    def test_parent_table_is_range_partitioned(self):
+        ddl = str(CreateTable(self.minutes.table).compile(dialect=postgresql.dialect()))
+        self.assertIn("CREATE TABLE quotes.onemin", ddl)
+        self.assertIn("PRIMARY KEY (datetime, symbol)", ddl)
+        self.assertTrue(ddl.strip().endswith("PARTITION BY RANGE (datetime)"))
+
+    def test_partitions_between(self):
+        output = self.minutes.partitions_between(datetime(2023, 11, 30, 15, 59), datetime(2024, 1, 2, 9, 30))
+        self.assertEqual(output, [("onemin_2023_11", datetime(2023, 11, 1), datetime(2023, 12, 1)),
+                                  ("onemin_2023_12", datetime(2023, 12, 1), datetime(2024, 1, 1)),
+                                  ("onemin_2024_01", datetime(2024, 1, 1), datetime(2024, 2, 1))])
+        self.assertEqual([name for name, _, _ in self.daily.partitions_between(datetime(2022, 6, 1), datetime(2023, 1, 3))],
+                         ["daily_2022", "daily_2023"])
+
+    def test_partitions_are_created_once(self):
+        self.minutes.ensure_partitions(datetime(2023, 11, 16), datetime(2023, 12, 1))
+        self.minutes.ensure_partitions(datetime(2023, 11, 17), datetime(2023, 11, 20))
+        statements = [str(call.args[0]) for call in self.connection.execute.call_args_list]
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(statements[0], "CREATE TABLE IF NOT EXISTS quotes.onemin_2023_11 PARTITION OF quotes.onemin "\
+                                        "FOR VALUES FROM ('2023-11-01') TO ('2023-12-01') PARTITION BY HASH (symbol)")
+        self.assertEqual(statements[2], "CREATE TABLE IF NOT EXISTS quotes.onemin_2023_11_h1 PARTITION OF quotes.onemin_2023_11 "\
+                                        "FOR VALUES WITH (MODULUS 2, REMAINDER 1)")
+        self.daily.ensure_partitions(datetime(2023, 11, 16), datetime(2023, 11, 16))
+        self.assertNotIn("HASH", str(self.connection.execute.call_args.args[0]))
+
+if __name__ == "__main__":
+    unittest.main()
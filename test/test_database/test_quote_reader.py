@@ -0,0 +1,86 @@
+import copy
+import unittest
+from datetime import datetime, timedelta
+import pandas as pd
+import sqlalchemy
+from database.model_registry import ModelRegistry
+from database.quote_reader import QuoteCache, get_quote_cache, stream_frame
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_daily
+
+class TestQuoteCache(unittest.TestCase):
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = QuoteCache(max_rows=5)
+        cache.put(("t", "A"), pd.DataFrame({"close": [1.0, 2.0]}))
+        cache.put(("t", "B"), pd.DataFrame({"close": [1.0, 2.0]}))
+        cache.get(("t", "A"))
+        cache.put(("u", "C"), pd.DataFrame({"close": [1.0, 2.0]}))
+        self.assertIsNone(cache.get(("t", "B")))
+        self.assertEqual(cache.get(("t", "A"))["close"].tolist(), [1.0, 2.0])
+        self.assertEqual(cache.rows, 4)
+        cache.invalidate("t")
+        self.assertEqual(list(cache.entries), [("u", "C")])
+
+    def test_cached_frames_are_copies(self):
+        cache = QuoteCache(max_rows=5)
+        df = pd.DataFrame({"close": [1.0]})
+        cache.put(("t", "A"), df)
+        df.loc[0, "close"] = 2.0
+        cache.get(("t", "A")).loc[0, "close"] = 3.0
+        self.assertEqual(cache.get(("t", "A"))["close"].tolist(), [1.0])
+
+
+class TestLoadQuotes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Models are declared once, since they all share the same Base
+        cls.registry = ModelRegistry(db_engine=None)
+        cls.registry.loaded_schemas.add("daily_quotes")
+        cls.registry.existing_tables.add(("daily_quotes", "LOADA_daily"))
+        cls.model = cls.registry.get_model("LOADA_daily", "LOADA_daily", "daily_quotes", copy.deepcopy(default_daily))
+
+    def setUp(self):
+        # SQLite stands in for the DB, with one attached database per quote schema
+        self.engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool)
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.text("ATTACH DATABASE ':memory:' AS daily_quotes"))
+        self.utils_db = UtilsDB()
+        self.utils_db.engine = self.engine
+        self.utils_db.registry = self.registry
+        get_quote_cache().clear()
+        self.model.__table__.create(self.engine)
+        start = datetime(2023, 11, 1)
+        rows = [{"datetime": start + timedelta(days=n), "symbol": "LOADA", "close": float(n), "volume": 10.0}
+                for n in range(10)]
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.insert(self.model.__table__), rows)
+
+    def test_stream_frame_types_every_chunk(self):
+        table = self.model.__table__
+        columns = [table.c.datetime, table.c.close, table.c.open]
+        with self.engine.connect() as connection:
+            df = stream_frame(connection, sqlalchemy.select(*columns).order_by(table.c.datetime), columns, chunk_size=3)
+        self.assertEqual(len(df), 10)
+        self.assertEqual(str(df["close"].dtype), "float64")
+        self.assertEqual(str(df["open"].dtype), "float64")
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["datetime"]))
+
+    def test_load_quotes_range_and_cache(self):
+        output = self.utils_db.load_quotes(["LOADA", "LOADB"], "daily", "2023-11-03", "2023-11-06", columns=["close"],
+                                           storage_layout="per_symbol", chunk_size=2)
+        self.assertEqual(output.columns.tolist(), ["datetime", "close", "symbol"])
+        self.assertEqual(output["close"].tolist(), [2.0, 3.0, 4.0])
+        # Served from the cache, until new rows are written to the table
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.delete(self.model.__table__))
+        cached = self.utils_db.load_quotes("LOADA", "daily", "2023-11-03", "2023-11-06", columns=["close"],
+                                           storage_layout="per_symbol")
+        self.assertEqual(cached["close"].tolist(), [2.0, 3.0, 4.0])
+        get_quote_cache().invalidate(self.model.__table__.fullname)
+        self.assertTrue(self.utils_db.load_quotes("LOADA", "daily", "2023-11-03", "2023-11-06",
+                                                  storage_layout="per_symbol").empty)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+from src.data_extractor.resilience import (AIMDController, CircuitBreaker, SUCCESS, THROTTLED, FAILED,
+                                           call_with_retry, get_circuit_breaker)
+from utils.error_handling import CircuitOpenError, ThrottledError
+
+class TestAIMDController(unittest.TestCase):
+
+    def test_additive_increase(self):
+        controller = AIMDController(initial=2, maximum=4)
+        for _ in range(3):
+            controller.release(controller.acquire(), SUCCESS)
+        self.assertEqual(controller.concurrency, 3)
+        for _ in range(20):
+            controller.release(controller.acquire(), SUCCESS)
+        self.assertEqual(controller.concurrency, 4)
+
+    def test_multiplicative_decrease_once_per_window(self):
+        controller = AIMDController(initial=8, maximum=8)
+        epochs = [controller.acquire() for _ in range(8)]
+        for epoch in epochs:
+            controller.release(epoch, THROTTLED)
+        self.assertEqual(controller.concurrency, 4)
+        controller.release(controller.acquire(), THROTTLED)
+        self.assertEqual(controller.concurrency, 2)
+        controller.release(controller.acquire(), FAILED)
+        self.assertEqual(controller.concurrency, 2)
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    @patch("src.data_extractor.resilience.time.monotonic")
+    def test_opens_and_probes(self, mocked_monotonic):
+        mocked_monotonic.return_value = 100
+        breaker = CircuitBreaker("example.com", failure_threshold=2, reset_timeout=30)
+        breaker.record(FAILED)
+        breaker.before_call()
+        breaker.record(THROTTLED)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        mocked_monotonic.return_value = 131
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record(FAILED)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        mocked_monotonic.return_value = 162
+        breaker.before_call()
+        breaker.record(SUCCESS)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    @patch("src.data_extractor.resilience.time.monotonic")
+    def test_probe_without_outcome_is_released(self, mocked_monotonic):
+        mocked_monotonic.return_value = 100
+        breaker = get_circuit_breaker("probe.example.com")
+        breaker.failure_threshold = 1
+        breaker.reset_timeout = 30
+        breaker.record(FAILED)
+        mocked_monotonic.return_value = 131
+        with self.assertRaises(KeyError):
+            call_with_retry(TestCallWithRetry.raise_key_error, host="probe.example.com", retry_on=(ConnectionError,))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # The next call probes the host straight away
+        self.assertEqual(call_with_retry(lambda: 1, host="probe.example.com"), 1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+class TestCallWithRetry(unittest.TestCase):
+
+    def setUp(self):
+        get_circuit_breaker("retry.example.com").record(SUCCESS)
+
+    @patch("src.data_extractor.resilience.time.sleep")
+    def test_retries_empty_payloads(self, mocked_sleep):
+        responses = iter([{}, {}, {"data": 1}])
+        controller = AIMDController(initial=4, maximum=4)
+        output = call_with_retry(lambda: next(responses), host="retry.example.com", is_throttled=lambda r: not r,
+                                 controller=controller, max_retries=3)
+        self.assertEqual(output, {"data": 1})
+        self.assertEqual(mocked_sleep.call_count, 2)
+        # Halved twice down to 1, then raised by one after the successful call
+        self.assertEqual(controller.concurrency, 2)
+        self.assertEqual(controller.in_flight, 0)
+
+    @patch("src.data_extractor.resilience.time.sleep")
+    def test_error_after_retries(self, mocked_sleep):
+        with self.assertRaises(ThrottledError):
+            call_with_retry(lambda: {}, host="retry.example.com", is_throttled=lambda r: not r, max_retries=1)
+        with self.assertRaises(ConnectionError):
+            call_with_retry(self.raise_connection_error, host="retry.example.com", max_retries=1)
+        self.assertEqual(mocked_sleep.call_count, 2)
+
+    def test_errors_not_retried(self):
+        with self.assertRaises(KeyError):
+            call_with_retry(self.raise_key_error, host="retry.example.com", retry_on=(ConnectionError,))
+        self.assertEqual(get_circuit_breaker("retry.example.com").failures, 0)
+
+    @staticmethod
+    def raise_connection_error():
+        raise ConnectionError("Could not connect")
+
+    @staticmethod
+    def raise_key_error():
+        raise KeyError("symbol")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from src.data_extractor.response_cache import ResponseCache, cache_policy
+from utils.error_handling import CacheMissError
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name, mode="on")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_ignores_api_key_and_param_order(self):
+        key_1 = ResponseCache.make_url_key("https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=EUR&apikey=A")
+        key_2 = ResponseCache.make_url_key("https://www.alphavantage.co/query?apikey=B&from_symbol=EUR&function=FX_DAILY")
+        self.assertEqual(key_1, key_2)
+
+    def test_ttl_expiration(self):
+        self.cache.put("abcd", b"payload")
+        self.assertEqual(self.cache.get("abcd", ttl_seconds=60), b"payload")
+        old_time = time.time() - 120
+        os.utime(self.cache._path("abcd"), (old_time, old_time))
+        self.assertIsNone(self.cache.get("abcd", ttl_seconds=60))
+        self.assertEqual(self.cache.get("abcd", ttl_seconds=None), b"payload")
+
+    def test_replay_mode(self):
+        self.cache.put("abcd", b"payload")
+        replay_cache = ResponseCache(self.tmp_dir.name, mode="replay")
+        self.assertEqual(replay_cache.get("abcd", ttl_seconds=0), b"payload")
+        with self.assertRaises(CacheMissError):
+            replay_cache.get("efgh")
+
+    def test_past_history_is_immutable(self):
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        ttl_seconds, not_before = cache_policy(yesterday, intraday=True)
+        self.assertIsNone(ttl_seconds)
+        self.assertEqual(not_before.date(), datetime.now().date())
+        ttl_seconds, not_before = cache_policy(datetime.now().strftime("%Y-%m-%d"), intraday=True)
+        self.assertIsNotNone(ttl_seconds)
+        self.assertIsNone(not_before)
+
+if __name__ == "__main__":
+    unittest.main()
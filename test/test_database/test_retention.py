@@ -0,0 +1,62 @@
+import copy
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import sqlalchemy
+from database.model_registry import ModelRegistry
+from database.parquet_mirror import ParquetMirror
+from database.retention import RetentionJob, load_intraday_history
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_minutes
+
+class TestRetentionJob(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Models are declared once, since they all share the same Base
+        cls.registry = ModelRegistry(db_engine=None)
+        cls.registry.loaded_schemas.add("onemin_quotes")
+        cls.registry.existing_tables.add(("onemin_quotes", "KEEPA_1min"))
+        cls.model = cls.registry.get_model("KEEPA_1min", "KEEPA_1min", "onemin_quotes", copy.deepcopy(default_minutes))
+
+    def setUp(self):
+        # SQLite stands in for the DB, with one attached database per quote schema
+        self.engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool)
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.text("ATTACH DATABASE ':memory:' AS onemin_quotes"))
+        self.model.__table__.create(self.engine)
+        start = datetime(2023, 11, 1, 9, 30)
+        rows = [{"datetime": start + timedelta(days=n), "symbol": "KEEPA", "close": float(n)} for n in range(10)]
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.insert(self.model.__table__), rows)
+        self.utils_db = UtilsDB()
+        self.utils_db.engine = self.engine
+        self.utils_db.registry = self.registry
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = ParquetMirror(self.directory.name)
+        self.job = RetentionJob(self.utils_db, max_age_days=5, archive=self.archive, storage_layout="per_symbol",
+                                chunk_size=3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_old_rows_are_archived_and_deleted(self):
+        self.assertEqual(self.job.cutoff(datetime(2023, 11, 11, 12)), datetime(2023, 11, 6))
+        self.assertEqual(self.job.run(datetime(2023, 11, 11, 12)), {"KEEPA_1min": 5})
+        with self.engine.connect() as connection:
+            remaining = connection.execute(sqlalchemy.select(self.model.__table__.c.close)).scalars().all()
+        self.assertEqual(sorted(remaining), [5.0, 6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(self.archive.read("1min", "KEEPA")["close"].tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+        # Nothing left to archive
+        self.assertEqual(self.job.run(datetime(2023, 11, 11, 12)), {})
+
+    def test_history_stitches_archive_and_db(self):
+        self.job.run(datetime(2023, 11, 11, 12))
+        output = load_intraday_history("KEEPA", start="2023-11-03", end="2023-11-08", columns=["close"],
+                                       utils_db=self.utils_db, archive=self.archive, storage_layout="per_symbol")
+        self.assertEqual(output["close"].tolist(), [2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(output.columns.tolist(), ["datetime", "close", "symbol"])
+        self.assertTrue(output["datetime"].is_monotonic_increasing)
+
+if __name__ == "__main__":
+    unittest.main()
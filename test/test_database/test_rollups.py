@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+import pandas as pd
+from database.rollups import RollupEngine, rollup_bars
+
+def minutes(start, periods, symbol="AAA"):
+    datetimes = pd.date_range(start, periods=periods, freq="1min")
+    values = [float(n) for n in range(periods)]
+    return pd.DataFrame({"datetime": datetimes, "open": values, "high": [v + 1 for v in values],
+                         "low": [v - 1 for v in values], "close": values, "volume": 1.0, "symbol": symbol})
+
+class TestRollupBars(unittest.TestCase):
+
+    def test_ohlcv_aggregation(self):
+        df = pd.concat([minutes("2023-11-16 09:30", 12), minutes("2023-11-16 09:33", 2, "BBB")])
+        output = rollup_bars(df.sample(frac=1, random_state=0), "5min")
+        self.assertEqual(output.columns.tolist(), ["symbol", "datetime", "open", "high", "low", "close", "volume", "minutes"])
+        first = output.iloc[0]
+        self.assertEqual((first["symbol"], first["datetime"]), ("AAA", pd.Timestamp("2023-11-16 09:30")))
+        self.assertEqual((first["open"], first["high"], first["low"], first["close"], first["volume"]), (0.0, 5.0, -1.0, 4.0, 5.0))
+        self.assertEqual(output["minutes"].tolist(), [5, 5, 2, 2])
+        self.assertEqual(rollup_bars(df, "1d")["minutes"].tolist(), [12, 2])
+
+
+class TestRollupEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.utils_db = MagicMock()
+        self.engine = RollupEngine(self.utils_db, resolutions=["5min", "1h"], storage_layout="per_symbol")
+        self.utils_db.insert_df_in_db.return_value = {"inserted": 1, "updated": 0, "skipped": 0}
+
+    def written(self, resolution):
+        return [call.args[0] for call in self.utils_db.insert_df_in_db.call_args_list
+                if call.args[1] is self.engine.models[resolution]]
+
+    def test_only_buckets_with_new_minutes_are_rolled_up(self):
+        self.engine.watermarks = {"AAA": datetime(2023, 11, 16, 9, 41)}
+        self.utils_db.load_quotes.return_value = minutes("2023-11-16 09:00", 45)
+        self.assertEqual(self.engine.update(["AAA"]), {"AAA": 3})
+        self.assertEqual(self.utils_db.load_quotes.call_args.kwargs["start"], pd.Timestamp("2023-11-16 09:00"))
+        bars = self.written("5min")[0]
+        self.assertEqual(bars["datetime"].tolist(), [pd.Timestamp("2023-11-16 09:40")])
+        self.assertEqual(bars["minutes"].tolist(), [5])
+        self.assertEqual(self.written("1h")[0]["minutes"].tolist(), [45])
+        self.assertEqual(self.engine.watermarks["AAA"], datetime(2023, 11, 16, 9, 44))
+        self.assertEqual(self.utils_db.insert_df_in_db.call_args.kwargs["on_conflict"], "update")
+
+    def test_nothing_new_to_roll_up(self):
+        self.engine.watermarks = {"AAA": datetime(2023, 11, 16, 9, 44)}
+        self.utils_db.load_quotes.return_value = minutes("2023-11-16 09:00", 45)
+        self.assertEqual(self.engine.update(["AAA"]), {"AAA": 0})
+        self.utils_db.insert_df_in_db.assert_not_called()
+
+    def test_watermark_kept_when_bars_are_not_written(self):
+        watermark = datetime(2023, 11, 16, 9, 41)
+        self.engine.watermarks = {"AAA": watermark}
+        self.utils_db.load_quotes.return_value = minutes("2023-11-16 09:00", 45)
+        self.utils_db.insert_df_in_db.side_effect = [{"inserted": 1, "updated": 0, "skipped": 0},
+                                                     {"inserted": 0, "updated": 0, "skipped": 1}]
+        self.assertEqual(self.engine.update(["AAA"]), {})
+        self.assertEqual(self.engine.watermarks["AAA"], watermark)
+        # The watermark row itself is never written
+        self.assertEqual(self.utils_db.insert_df_in_db.call_count, 2)
+        self.assertTrue(self.utils_db.insert_df_in_db.call_args.kwargs["raise_on_error"])
+
+if __name__ == "__main__":
+    unittest.main()
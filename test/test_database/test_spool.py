@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import patch
+import pandas as pd
+from database.db_writer import DBWriterService
+from database.spool import SpoolDrainer, WriteAheadSpool
+
+class TestWriteAheadSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        self.spool = WriteAheadSpool(self.path, segment_bytes=1024 * 1024, segment_seconds=60, fsync=False)
+        self.df = pd.DataFrame({"symbol": ["AAA"] * 3, "close": [1.0, 2.0, 3.0]})
+
+    def tearDown(self):
+        self.spool.close()
+        self.directory.cleanup()
+
+    def test_records_round_trip_in_order(self):
+        for n in range(3):
+            self.spool.append((f"S{n}", {"daily": self.df}))
+        self.assertEqual(self.spool.sealed_segments(), [])
+        self.spool.close()
+        segments = self.spool.sealed_segments()
+        self.assertEqual(len(segments), 1)
+        records = list(WriteAheadSpool.read_segment(segments[0]))
+        self.assertEqual([symbol for symbol, _ in records], ["S0", "S1", "S2"])
+        pd.testing.assert_frame_equal(records[0][1]["daily"], self.df)
+
+    def test_segments_rotate_by_size(self):
+        spool = WriteAheadSpool(self.path / "small", segment_bytes=1, segment_seconds=60, fsync=False)
+        for n in range(3):
+            spool.append(n)
+        self.assertEqual(len(spool.sealed_segments()), 3)
+
+    def test_torn_tail_ends_the_segment(self):
+        self.spool.append("first")
+        self.spool.append("second")
+        self.spool.close()
+        segment = self.spool.segments()[0]
+        segment.write_bytes(segment.read_bytes()[:-3])
+        self.assertEqual(list(WriteAheadSpool.read_segment(segment)), ["first"])
+
+    def test_leftover_segments_are_sealed_on_restart(self):
+        self.spool.append("left")
+        restarted = WriteAheadSpool(self.path, fsync=False)
+        restarted.append("new")
+        self.assertEqual(len(restarted.sealed_segments()), 1)
+        self.assertEqual(list(WriteAheadSpool.read_segment(restarted.sealed_segments()[0])), ["left"])
+
+
+class TestSpoolDrainer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = WriteAheadSpool(self.directory.name, segment_seconds=0, fsync=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @patch("database.spool.backoff_delay", return_value=0)
+    def test_failed_segment_is_retried_before_deletion(self, _):
+        attempts = []
+        def handler(record):
+            attempts.append(record)
+            future = Future()
+            if len(attempts) == 1:
+                future.set_exception(ConnectionError("DB unavailable"))
+            else:
+                future.set_result({"inserted": 1})
+            return [future]
+        with SpoolDrainer(self.spool, handler, n_drainers=2, poll_seconds=0.01) as drainer:
+            self.spool.append(("AAA", {}))
+        self.assertEqual(attempts, [("AAA", {}), ("AAA", {})])
+        self.assertEqual(drainer.drained_records, 1)
+        self.assertEqual(self.spool.segments(), [])
+
+    @patch("database.spool.backoff_delay", return_value=0)
+    def test_failing_segment_is_kept_on_disk(self, _):
+        def handler(record):
+            raise ConnectionError("DB unavailable")
+        with SpoolDrainer(self.spool, handler, poll_seconds=0.01, max_retries=2) as drainer:
+            self.spool.append(("AAA", {}))
+        self.assertEqual(drainer.drained_records, 0)
+        self.assertEqual(len(self.spool.segments()), 1)
+
+    def test_writer_futures_carry_write_errors(self):
+        def write(utils_db):
+            raise ConnectionError("DB unavailable")
+        with DBWriterService(n_writers=1, utils_db_factory=object) as writers:
+            future = writers.submit("daily_quotes.aaa_daily", write)
+            with self.assertRaises(ConnectionError):
+                future.result(timeout=5)
@@ -1,8 +1,12 @@
+import tempfile
 import unittest
+from pathlib import Path
+import numpy as np
 import pandas as pd
 from unittest.mock import patch
 from pandas.testing import assert_frame_equal
 from freezegun import freeze_time
+from src.data_extractor.response_cache import ResponseCache
 from src.data_extractor.stock_extractor import StockExtractor
 
 class TestCryptoExtractor(unittest.TestCase):
@@ -104,5 +108,32 @@ class TestCryptoExtractor(unittest.TestCase):
         output = aapl_extr.get_data(period="5min", from_date='2023-11-09', until_date='2023-11-09')
         assert_frame_equal(output, self.expected_AAPL_5mins)
 
+    def test_split_batch_download(self):
+        index = [pd.to_datetime("2023-11-09"), pd.to_datetime("2023-11-10")]
+        columns = pd.MultiIndex.from_product([["AAPL", "TSLA"], ["Open", "High", "Low", "Close", "Volume"]])
+        batch_df = pd.DataFrame(np.arange(20, dtype=float).reshape(2, 10), index=index, columns=columns)
+        batch_df.loc[index[0], "TSLA"] = np.nan
+        output = StockExtractor._split_batch_df(batch_df, ["AAPL", "TSLA", "MSFT"])
+        self.assertEqual(len(output["AAPL"]), 2)
+        self.assertEqual(output["TSLA"].index.tolist(), [index[1]])
+        self.assertEqual(output["TSLA"]["Open"].tolist(), [15.0])
+        self.assertTrue(output["MSFT"].empty)
+
+    @patch("src.data_extractor.stock_extractor.yf.download")
+    def test_downloads_are_cached_as_parquet(self, mocked_download):
+        columns = pd.MultiIndex.from_product([["Close", "Open"], ["AAPL", "TSLA"]], names=["Price", "Ticker"])
+        index = pd.DatetimeIndex([pd.to_datetime("2023-11-09"), pd.to_datetime("2023-11-10")], name="Date")
+        mocked_download.return_value = pd.DataFrame(np.arange(8, dtype=float).reshape(2, 4), index=index,
+                                                    columns=columns)
+        with tempfile.TemporaryDirectory() as directory, \
+                patch("src.data_extractor.stock_extractor.get_cache", return_value=ResponseCache(directory, mode="on")):
+            first = StockExtractor._download(["AAPL", "TSLA"], start="2023-11-09", end="2023-11-11", interval="1d")
+            second = StockExtractor._download(["AAPL", "TSLA"], start="2023-11-09", end="2023-11-11", interval="1d")
+            entries = [path for path in Path(directory).rglob("*") if path.is_file()]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0].read_bytes()[:4], b"PAR1")
+        mocked_download.assert_called_once()
+        assert_frame_equal(second, first)
+
 if __name__ == "__main__":
     unittest.main()
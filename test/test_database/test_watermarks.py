@@ -0,0 +1,43 @@
+import copy
+import unittest
+from datetime import datetime, timedelta
+import sqlalchemy
+from database.model_registry import ModelRegistry
+from database.utils_db import UtilsDB
+from utils.dafault_columns import default_minutes
+
+class TestGetWatermarks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Models are declared once, since they all share the same Base
+        registry = ModelRegistry(db_engine=None)
+        cls.full = registry.get_model("WMA_1min", "WMA_1min", "onemin_quotes", copy.deepcopy(default_minutes))
+        cls.empty = registry.get_model("WMB_1min", "WMB_1min", "onemin_quotes", copy.deepcopy(default_minutes))
+
+    def setUp(self):
+        # SQLite stands in for the DB, with one attached database per quote schema
+        self.engine = sqlalchemy.create_engine("sqlite://", poolclass=sqlalchemy.pool.StaticPool)
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.text("ATTACH DATABASE ':memory:' AS onemin_quotes"))
+        self.utils_db = UtilsDB()
+        self.utils_db.engine = self.engine
+        for model in [self.full, self.empty]:
+            model.__table__.create(self.engine)
+        self.start = datetime(2023, 11, 16, 9, 30)
+        rows = [{"datetime": self.start + timedelta(minutes=n), "symbol": "WMA", "close": 1.0} for n in range(3)]
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.insert(self.full.__table__), rows)
+
+    def test_latest_datetime_of_every_table(self):
+        watermarks = self.utils_db.get_watermarks([self.full, self.empty])
+        self.assertEqual(watermarks, {"onemin_quotes.WMA_1min": self.start + timedelta(minutes=2),
+                                      "onemin_quotes.WMB_1min": None})
+
+    def test_tables_are_queried_in_chunks(self):
+        watermarks = self.utils_db.get_watermarks([self.full, self.empty], chunk_size=1)
+        self.assertEqual(len(watermarks), 2)
+        self.assertIsNone(watermarks["onemin_quotes.WMB_1min"])
+
+if __name__ == "__main__":
+    unittest.main()
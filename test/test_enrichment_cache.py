@@ -0,0 +1,47 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from freezegun import freeze_time
+from utils.enrichment_cache import EnrichmentCache
+
+class TestEnrichmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.directory.name) / "cache" / "industries_sectors.json"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries_expire_after_ttl(self):
+        cache = EnrichmentCache(self.cache_path, ttl_days=30)
+        with freeze_time("2023-11-01"):
+            cache.set("ABCD", "Software", "Technology")
+        with freeze_time("2023-11-30"):
+            self.assertEqual(cache.get("ABCD"), ("Software", "Technology"))
+        with freeze_time("2023-12-02"):
+            self.assertIsNone(cache.get("ABCD"))
+        self.assertIsNone(cache.get("EFGH"))
+
+    def test_save_and_load_round_trip(self):
+        cache = EnrichmentCache(self.cache_path)
+        cache.set("ABCD", "Software", "Technology")
+        cache.set("EFGH", None, None)
+        cache.save()
+        self.assertFalse(self.cache_path.with_suffix(".tmp").exists())
+        reloaded = EnrichmentCache(self.cache_path)
+        self.assertEqual(reloaded.get("ABCD"), ("Software", "Technology"))
+        self.assertEqual(reloaded.get("EFGH"), (None, None))
+
+    def test_corrupt_file_is_rebuilt(self):
+        self.cache_path.parent.mkdir(parents=True)
+        self.cache_path.write_text("{not json")
+        cache = EnrichmentCache(self.cache_path)
+        self.assertEqual(cache.entries, {})
+        cache.set("ABCD", "Software", "Technology")
+        cache.save()
+        self.assertIn("ABCD", json.loads(self.cache_path.read_text()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+import pandas as pd
+from src.general_information import GeneralInformation
+from utils.enrichment_cache import EnrichmentCache
+
+class TestSymbolDirectoryDiff(unittest.TestCase):
+
+    new_directory = pd.DataFrame(
+        {
+            "symbol": ["ABCD", "EFGH", "IJKL", "QRST"],
+            "security_name": ["ABCDesigns Inc", "EpicForge Technologies Inc", "InnoJolt Labs", "QuantumRest Corp"],
+            "financial_status": ["N", "N", None, "N"],
+            "round_lot_size": [100, 100, 100, 100],
+            "is_etf": ["N", "N", "N", "N"],
+        }
+    )
+
+    latest_snapshot = pd.DataFrame(
+        {
+            "registration_date": [pd.to_datetime("2023-11-16")] * 4,
+            "symbol": ["ABCD", "EFGH", "IJKL", "MNOP"],
+            "security_name": ["ABCDesigns Inc", "EpicForge Technologies", "InnoJolt Labs", "MegaNova Organic Products Corp"],
+            "financial_status": ["N", "N", None, "D"],
+            "round_lot_size": ["100", "100", "100", "100"],
+            "is_etf": ["N", "N", "N", "N"],
+            "industry": ["Software", "Hardware", "Biotechnology", "Farm Products"],
+            "sector": ["Technology", "Technology", "Healthcare", "Consumer Defensive"],
+        }
+    )
+
+    def test_classify_changes(self):
+        output = GeneralInformation._classify_changes(self.new_directory, self.latest_snapshot)
+        self.assertEqual(output, {"added": ["QRST"], "removed": ["MNOP"], "changed": ["EFGH"],
+                                  "unchanged": ["ABCD", "IJKL"]})
+
+    def test_first_run_adds_everything(self):
+        output = GeneralInformation._classify_changes(self.new_directory, self.latest_snapshot.iloc[0:0])
+        self.assertEqual(output["added"], ["ABCD", "EFGH", "IJKL", "QRST"])
+        self.assertEqual(output["unchanged"], [])
+
+    @patch("src.general_information.UtilsDB")
+    def test_unchanged_symbols_without_industry_are_enriched(self, mocked_utils_db):
+        snapshot = self.latest_snapshot.copy()
+        snapshot.loc[snapshot["symbol"] == "IJKL", "sector"] = None
+        mocked_utils_db.return_value.read_latest_snapshot.return_value = snapshot
+        directory = self.new_directory.copy()
+        directory.metadata = {"model": None}
+        symbols_to_enrich = GeneralInformation()._diff_against_snapshots([directory])
+        self.assertEqual(symbols_to_enrich, {"QRST", "EFGH", "IJKL"})
+        # Unchanged symbols with complete information keep the snapshot's values
+        self.assertEqual(directory["industry"].tolist(), ["Software", None, "Biotechnology", None])
+
+
+class TestIndustrySectorEnrichment(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.general_information = GeneralInformation(max_workers=4)
+        self.general_information.enrichment_cache = EnrichmentCache(Path(self.directory.name) / "cache.json")
+        self.fetched = []
+        self.lock = threading.Lock()
+        self.securities = pd.DataFrame({"symbol": ["ABCD", "EFGH", "IJKL", "MNOP", "ETFS"],
+                                        "is_etf": ["N", "N", "N", "N", "Y"]})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fake_fetch(self, symbol):
+        with self.lock:
+            self.fetched.append(symbol)
+        if symbol == "MNOP":
+            return None
+        return f"{symbol} industry", f"{symbol} sector"
+
+    def test_cache_misses_are_fetched_by_the_workers(self):
+        self.general_information.enrichment_cache.set("ABCD", "Software", "Technology")
+        with patch.object(self.general_information, "_fetch_industry_sector", side_effect=self.fake_fetch):
+            output = self.general_information._extract_industries_sectors([self.securities.copy()])[0]
+        # Cached symbols and ETFs are never requested
+        self.assertEqual(sorted(self.fetched), ["EFGH", "IJKL", "MNOP"])
+        self.assertEqual(output["industry"].tolist(), ["Software", "EFGH industry", "IJKL industry", None, None])
+        # Fetched values are cached, failures are not
+        cache = EnrichmentCache(Path(self.directory.name) / "cache.json")
+        self.assertEqual(cache.get("EFGH"), ("EFGH industry", "EFGH sector"))
+        self.assertIsNone(cache.get("MNOP"))
+
+    @patch("src.general_information.yf.Ticker")
+    def test_unexpected_errors_are_isolated_and_cached_values_saved(self, mocked_ticker):
+        def ticker(symbol):
+            if symbol == "IJKL":
+                raise KeyError("quoteSummary")
+            return SimpleNamespace(info={"industry": f"{symbol} industry", "sector": f"{symbol} sector"})
+        mocked_ticker.side_effect = ticker
+        output = self.general_information._extract_industries_sectors([self.securities.copy()])[0]
+        self.assertEqual(output["industry"].tolist(), ["ABCD industry", "EFGH industry", None, "MNOP industry", None])
+        cache = EnrichmentCache(Path(self.directory.name) / "cache.json")
+        self.assertEqual(cache.get("EFGH"), ("EFGH industry", "EFGH sector"))
+        self.assertIsNone(cache.get("IJKL"))
+
+if __name__ == "__main__":
+    unittest.main()
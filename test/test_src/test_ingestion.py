@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import pandas as pd
+from src.ingestion import IngestionPipeline
+from utils.error_handling import CircuitOpenError
+
+class TestIngestionPipeline(unittest.TestCase):
+
+    symbols = [f"SYM{n}" for n in range(20)]
+
+    def setUp(self):
+        self.pipeline = IngestionPipeline(max_workers=4, batch_size=2, max_in_flight=4, max_retries=0)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        self.pipeline.fetch_batch = self.fake_fetch_batch
+
+    def fake_fetch_batch(self, batch, watermarks=None):
+        if "SYM3" in batch:
+            raise ConnectionError("Could not connect")
+        with self.lock:
+            self.in_flight += len(batch)
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return {symbol: {"daily": symbol, "1min": symbol} for symbol in batch}
+
+    def fake_sink(self, symbol, symbol_data):
+        time.sleep(0.005)
+        with self.lock:
+            self.in_flight -= 1
+        if symbol == "SYM10":
+            raise ValueError("Could not store")
+
+    def test_failures_are_isolated(self):
+        output = self.pipeline.run(self.symbols)
+        self.assertEqual(len(output), 18)
+        self.assertEqual(sorted(self.pipeline.failed_symbols), ["SYM2", "SYM3"])
+
+    def test_in_flight_symbols_are_bounded(self):
+        output = self.pipeline.run(self.symbols, sink=self.fake_sink)
+        self.assertEqual(output, {})
+        self.assertEqual(self.pipeline.written_symbols, 17)
+        self.assertEqual(sorted(self.pipeline.failed_symbols), ["SYM10", "SYM2", "SYM3"])
+        self.assertLessEqual(self.peak_in_flight, 4)
+
+    @patch("src.data_extractor.resilience.time.sleep")
+    @patch("src.ingestion.StockExtractor.get_batch_data")
+    def test_empty_batches_are_retried(self, mocked_get_batch_data, mocked_sleep):
+        pipeline = IngestionPipeline(max_workers=4, batch_size=2, max_in_flight=4, max_retries=1)
+        empty = {"SYM0": pd.DataFrame(), "SYM1": pd.DataFrame()}
+        quotes = pd.DataFrame({"datetime": [datetime(2023, 11, 16)], "close": [1.0]})
+        mocked_get_batch_data.side_effect = [empty, {"SYM0": quotes, "SYM1": quotes}, {"SYM0": quotes, "SYM1": quotes}]
+        with patch.object(IngestionPipeline, "_expects_quotes", return_value=True):
+            output = pipeline.run(["SYM0", "SYM1"])
+        self.assertEqual(sorted(output), ["SYM0", "SYM1"])
+        mocked_sleep.assert_called_once()
+        self.assertEqual(mocked_get_batch_data.call_count, 3)
+
+    @patch("src.ingestion.time.sleep")
+    @patch("src.ingestion.call_with_retry")
+    def test_batches_wait_for_open_circuit(self, mocked_call_with_retry, mocked_sleep):
+        batch_data = {"SYM0": {"daily": "SYM0", "1min": "SYM0"}, "SYM1": {"daily": "SYM1", "1min": "SYM1"}}
+        mocked_call_with_retry.side_effect = [CircuitOpenError("finance.yahoo.com", 30),
+                                              CircuitOpenError("finance.yahoo.com", 0), batch_data]
+        pipeline = IngestionPipeline(max_workers=1, batch_size=2, max_in_flight=2, max_retries=1)
+        output = pipeline.run(["SYM0", "SYM1"])
+        self.assertEqual(sorted(output), ["SYM0", "SYM1"])
+        self.assertEqual(pipeline.failed_symbols, [])
+        self.assertGreaterEqual(mocked_sleep.call_args_list[0].args[0], 30)
+
+    @patch("src.ingestion.time.sleep")
+    @patch("src.ingestion.call_with_retry")
+    def test_batches_given_up_while_circuit_stays_open(self, mocked_call_with_retry, mocked_sleep):
+        mocked_call_with_retry.side_effect = CircuitOpenError("finance.yahoo.com", 30)
+        pipeline = IngestionPipeline(max_workers=1, batch_size=2, max_in_flight=2, max_retries=1)
+        output = pipeline.run(["SYM0", "SYM1"])
+        self.assertEqual(output, {})
+        self.assertEqual(pipeline.failed_symbols, ["SYM0", "SYM1"])
+        self.assertEqual(mocked_sleep.call_count, 1)
+
+
+class TestFilterAfterWatermark(unittest.TestCase):
+
+    def setUp(self):
+        self.watermark = datetime(2023, 11, 16, 9, 31)
+        self.naive = pd.DataFrame({"datetime": pd.date_range("2023-11-16 09:30", periods=3, freq="min"),
+                                   "close": [1.0, 2.0, 3.0]})
+
+    def test_naive_rows_after_watermark(self):
+        output = IngestionPipeline._filter_after_watermark(self.naive, self.watermark)
+        # The row at the watermark is already stored
+        self.assertEqual(output["close"].tolist(), [3.0])
+
+    def test_tz_aware_rows_compared_in_wall_time(self):
+        aware = self.naive.assign(datetime=self.naive["datetime"].dt.tz_localize("America/New_York"))
+        output = IngestionPipeline._filter_after_watermark(aware, self.watermark)
+        self.assertEqual(output["close"].tolist(), [3.0])
+        self.assertIsNotNone(output["datetime"].dt.tz)
+
+    def test_tz_aware_watermark_compared_in_wall_time(self):
+        aware = self.naive.assign(datetime=self.naive["datetime"].dt.tz_localize("America/New_York"))
+        watermark = pd.Timestamp(self.watermark).tz_localize("America/New_York")
+        self.assertEqual(IngestionPipeline._filter_after_watermark(aware, watermark)["close"].tolist(), [3.0])
+        self.assertEqual(IngestionPipeline._filter_after_watermark(self.naive, watermark)["close"].tolist(), [3.0])
+
+    def test_without_watermark_or_rows(self):
+        self.assertIs(IngestionPipeline._filter_after_watermark(self.naive, None), self.naive)
+        empty = self.naive.iloc[:0]
+        self.assertTrue(IngestionPipeline._filter_after_watermark(empty, self.watermark).empty)
+
+if __name__ == "__main__":
+    unittest.main()
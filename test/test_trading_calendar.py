@@ -0,0 +1,45 @@
+import unittest
+from datetime import date
+from freezegun import freeze_time
+from utils.trading_calendar import exchange_holidays, is_trading_day, trading_days
+from src.data_extractor.stock_extractor import StockExtractor
+
+class TestTradingCalendar(unittest.TestCase):
+
+    def test_exchange_holidays(self):
+        self.assertEqual(exchange_holidays(2023), (date(2023, 1, 2), date(2023, 1, 16), date(2023, 2, 20),
+                                                   date(2023, 4, 7), date(2023, 5, 29), date(2023, 6, 19),
+                                                   date(2023, 7, 4), date(2023, 9, 4), date(2023, 11, 23),
+                                                   date(2023, 12, 25)))
+        # New Year's Day on a Saturday is not observed, Christmas on a Sunday is observed on Monday
+        self.assertNotIn(date(2021, 12, 31), exchange_holidays(2021))
+        self.assertIn(date(2022, 12, 26), exchange_holidays(2022))
+
+    def test_trading_days(self):
+        output = [str(day) for day in trading_days("2023-11-18", "2023-11-27")]
+        self.assertEqual(output, ["2023-11-20", "2023-11-21", "2023-11-22", "2023-11-24", "2023-11-27"])
+        self.assertEqual(len(trading_days("2023-11-27", "2023-11-18")), 0)
+        self.assertFalse(is_trading_day("2023-11-23"))
+        self.assertTrue(is_trading_day(date(2023, 11, 24)))
+
+class TestPlanDateChunks(unittest.TestCase):
+
+    @freeze_time("2023-11-28 00:00:00")
+    def test_minute_chunks_skip_closed_days(self):
+        start_dates, end_dates = StockExtractor.plan_date_chunks("2023-11-27", 14, "1m")
+        self.assertEqual(start_dates, ["2023-11-14", "2023-11-21"])
+        self.assertEqual(end_dates, ["2023-11-21", "2023-11-28"])
+
+    @freeze_time("2023-11-28 00:00:00")
+    def test_daily_chunks_are_coalesced(self):
+        self.assertEqual(StockExtractor.plan_date_chunks("2023-11-27", 30, "1d"), (["2023-10-30"], ["2023-11-28"]))
+        self.assertEqual(StockExtractor.plan_date_chunks("2023-11-26", 2, "1d"), ([], []))
+
+    @freeze_time("2023-11-28 00:00:00")
+    def test_history_limit(self):
+        start_dates, end_dates = StockExtractor.plan_date_chunks("2023-11-27", 45, "1m", chunk_size=30)
+        self.assertEqual(start_dates[0], "2023-10-30")
+        self.assertEqual(end_dates[-1], "2023-11-28")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from utils.windowing import sliding_windows, supervised_windows
+
+def vstack_windows(values, window):
+    # Reference implementation, as the datasets were built before
+    x = np.empty((0, window))
+    for i in range(window, len(values)):
+        x = np.vstack((x, values[i - window : i, 0]))
+    return np.reshape(x, (x.shape[0], x.shape[1], 1)), values[window:, 0]
+
+class TestWindowing(unittest.TestCase):
+
+    def test_same_datasets_as_vstack_loop(self):
+        values = np.random.default_rng(0).uniform(size=(50, 1))
+        x, y = supervised_windows(values, 7)
+        expected_x, expected_y = vstack_windows(values, 7)
+        self.assertEqual(x.shape, (43, 7, 1))
+        np.testing.assert_array_equal(x, expected_x)
+        np.testing.assert_array_equal(y, expected_y)
+
+    def test_windows_are_views(self):
+        values = np.arange(20, dtype=float)
+        x, _ = supervised_windows(values, 5)
+        self.assertTrue(np.shares_memory(x, values))
+        self.assertFalse(x.flags.writeable)
+
+    def test_several_features(self):
+        values = np.arange(30, dtype=float).reshape(10, 3)
+        x, y = supervised_windows(values, 4, target_column=2)
+        self.assertEqual(x.shape, (6, 4, 3))
+        np.testing.assert_array_equal(x[1], values[1:5])
+        np.testing.assert_array_equal(y, values[4:, 2])
+        self.assertEqual(sliding_windows(values, 4).shape, (7, 4, 3))
+
+    def test_series_shorter_than_window(self):
+        x, y = supervised_windows(np.arange(3, dtype=float), 5)
+        self.assertEqual(x.shape, (0, 5, 1))
+        self.assertEqual(len(y), 0)
+        self.assertIsNone(sliding_windows(np.arange(3), 5))
+        with self.assertRaises(ValueError):
+            sliding_windows(np.arange(3), 0)
+
+if __name__ == "__main__":
+    unittest.main()
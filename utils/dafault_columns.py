@@ -1,5 +1,5 @@
 from sqlalchemy.dialects.postgresql import TIMESTAMP
-from sqlalchemy import String, Column, Text, DateTime, Float
+from sqlalchemy import String, Column, Text, DateTime, Float, Integer
 
 default_daily = [
     Column("timestamp", TIMESTAMP(timezone=True)),
@@ -24,4 +24,20 @@ default_minutes = [
     Column("close", Float),
     Column("volume", Float),
     Column("symbol", String, primary_key=True),
-]
\ No newline at end of file
+]
+
+default_bars = [
+    Column("datetime", TIMESTAMP, nullable=False, primary_key=True),
+    Column("open", Float),
+    Column("high", Float),
+    Column("low", Float),
+    Column("close", Float),
+    Column("volume", Float),
+    Column("minutes", Integer),
+    Column("symbol", String, primary_key=True),
+]
+
+default_rollup_watermarks = [
+    Column("symbol", String, primary_key=True),
+    Column("last_minute", TIMESTAMP, nullable=False),
+]
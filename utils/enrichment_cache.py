@@ -0,0 +1,56 @@
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config.log_config import logger
+
+
+class EnrichmentCache:
+    """Persistent on-disk cache for the industry and sector of each symbol. Entries older than
+       the TTL are considered stale and must be fetched again.
+    """
+
+    def __init__(self, cache_path: str, ttl_days: int = 30) -> None:
+        """Class initializer.
+
+        Args:
+            cache_path (str): Path of the JSON file where entries are stored.
+            ttl_days (int, optional): Number of days an entry remains valid. Defaults to 30.
+        """
+        self.cache_path = Path(cache_path)
+        self.ttl = timedelta(days=ttl_days)
+        self.entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Enrichment cache at {self.cache_path} could not be read and will be rebuilt: {e}")
+            return {}
+
+    def get(self, symbol: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Return the cached (industry, sector) of a symbol, or None if missing or stale."""
+        entry = self.entries.get(symbol)
+        if entry is None:
+            return None
+        if datetime.now() - datetime.fromisoformat(entry["fetched_at"]) > self.ttl:
+            return None
+        return entry["industry"], entry["sector"]
+
+    def set(self, symbol: str, industry: Optional[str], sector: Optional[str]) -> None:
+        self.entries[symbol] = {"industry": industry, "sector": sector, "fetched_at": datetime.now().isoformat()}
+
+    def save(self) -> None:
+        """Write all entries to disk. The file is replaced atomically so that an interrupted run never
+           leaves a corrupt cache behind.
+        """
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as cache_file:
+            json.dump(self.entries, cache_file)
+        os.replace(tmp_path, self.cache_path)
@@ -29,4 +29,28 @@ class APIError(Exception):
 class DriverError(Exception):
     def __init__(self, *args: object) -> None:
         message = ("The webdriver is missing for this type of OS.")
-        super().__init__(*args)
\ No newline at end of file
+        super().__init__(*args)
+
+class CacheMissError(Exception):
+    def __init__(self, key):
+        message = (f"Response '{key}' is not cached and the response cache is in replay mode, "\
+                   "so no network call is allowed.")
+        super().__init__(message)
+
+class ThrottledError(Exception):
+    def __init__(self, host):
+        message = (f"Upstream '{host}' kept throttling requests after all retries.")
+        super().__init__(message)
+
+class CircuitOpenError(Exception):
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        message = (f"Circuit breaker for '{host}' is open after repeated failures. "\
+                   f"Calls are rejected for another {retry_in:.0f} seconds.")
+        super().__init__(message)
+
+class NoStoredQuotesError(Exception):
+    def __init__(self, symbol, interval):
+        message = (f"No {interval} quotes are stored in the DB for symbol {symbol}.")
+        super().__init__(message)
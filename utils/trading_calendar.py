@@ -0,0 +1,104 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Trading sessions of the US stock exchanges (NYSE/NASDAQ), computed from their holiday rules
+so that no request is issued for a weekend or an exchange holiday.
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Tuple, Union
+
+import numpy as np
+from dateutil.easter import easter
+
+DateLike = Union[str, date, datetime]
+
+# Unscheduled closures that do not follow from any rule
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29),  # Hurricane Sandy
+    date(2012, 10, 30),
+    date(2018, 12, 5),  # National day of mourning for George H. W. Bush
+    date(2025, 1, 9),  # National day of mourning for Jimmy Carter
+}
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """Day of the {n}-th {weekday} (0 is Monday) of a month. A negative {n} counts from the end of the month."""
+    if n > 0:
+        first_day = date(year, month, 1)
+        return first_day + timedelta(days=(weekday - first_day.weekday()) % 7 + 7 * (n - 1))
+    last_day = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last_day - timedelta(days=(last_day.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+
+def _observed(holiday: date) -> date:
+    """Holidays on a Saturday are observed on the Friday before, and those on a Sunday on the Monday after."""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=None)
+def exchange_holidays(year: int) -> Tuple[date, ...]:
+    """Weekdays of {year} on which the exchanges are closed.
+
+    Args:
+        year (int): Calendar year.
+
+    Returns:
+        Tuple[date, ...]: Sorted holidays, as observed by the exchanges.
+    """
+    holidays = {
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving Day
+        _observed(date(year, 12, 25)),  # Christmas Day
+    }
+    # New Year's Day is not observed on the Friday before when it falls on a Saturday,
+    # since that Friday closes the previous year
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 1998:
+        holidays.add(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.update(closure for closure in SPECIAL_CLOSURES if closure.year == year)
+    return tuple(sorted(holiday for holiday in holidays if holiday.weekday() < 5))
+
+
+def _to_date(day: DateLike) -> date:
+    if isinstance(day, str):
+        return datetime.strptime(day, "%Y-%m-%d").date()
+    if isinstance(day, datetime):
+        return day.date()
+    return day
+
+
+def trading_days(start: DateLike, end: DateLike) -> np.ndarray:
+    """Trading sessions between two days, both included.
+
+    Args:
+        start (DateLike): First day. Strings follow the "%Y-%m-%d" format.
+        end (DateLike): Last day. Strings follow the "%Y-%m-%d" format.
+
+    Returns:
+        np.ndarray: Ascending 'datetime64[D]' array with the trading sessions.
+    """
+    start, end = _to_date(start), _to_date(end)
+    if end < start:
+        return np.array([], dtype="datetime64[D]")
+    holidays = [holiday for year in range(start.year, end.year + 1) for holiday in exchange_holidays(year)]
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    return days[np.is_busday(days, holidays=holidays)]
+
+
+def is_trading_day(day: DateLike) -> bool:
+    """Check whether the exchanges hold a session on a given day."""
+    day = _to_date(day)
+    return day.weekday() < 5 and day not in exchange_holidays(day.year)
@@ -0,0 +1,58 @@
+"""
+OBJECTIVE OF THIS MODULE
+------------------------
+Build the rolling-window datasets the predictive models train on. Windows are strided views of
+the input series, so no window is copied and building them takes the same time whatever the
+length of the series.
+"""
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(values: np.ndarray, window: int) -> np.ndarray:
+    """Every run of {window} consecutive rows of {values}, as a read-only view on it.
+
+    Args:
+        values (np.ndarray): Series of shape (n_rows,) or (n_rows, n_features).
+        window (int): Number of consecutive rows of every window.
+
+    Returns:
+        np.ndarray: Windows of shape (n_rows - window + 1, window, n_features). None if {values} is shorter
+                    than {window}, which leaves no complete window.
+    """
+    if window < 1:
+        raise ValueError("Argument 'window' must be higher than 0.")
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    if len(values) < window:
+        return None
+    # sliding_window_view puts the window axis last, so it is swapped with the feature axis
+    return sliding_window_view(values, window, axis=0).transpose(0, 2, 1)
+
+
+def supervised_windows(values: np.ndarray, window: int, target_column: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair the {window} rows before every row of {values} with the value of {target_column} in that row.
+
+    Args:
+        values (np.ndarray): Series of shape (n_rows,) or (n_rows, n_features).
+        window (int): Number of past rows every prediction is made from.
+        target_column (int, optional): Feature to be predicted. Defaults to 0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]:
+            - x (np.ndarray): Read-only view of shape (n_rows - window, window, n_features). Models that write to
+                              their inputs need a copy, e.g. 'np.ascontiguousarray(x)'.
+            - y (np.ndarray): Targets of shape (n_rows - window,).
+    """
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    y = values[window:, target_column]
+    windows = sliding_windows(values, window)
+    if windows is None:
+        return np.empty((0, window, values.shape[1]), dtype=values.dtype), y
+    # The last window has no next row to predict
+    return windows[:-1], y